@@ -0,0 +1,308 @@
+"""
+A/B comparison of two revisions (`ab` subcommand): builds each revision in
+its own git worktree, runs the same workload against both in alternating
+rounds, and tests the differences with a permutation test.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+import contextlib
+
+from bench import DEFAULT_MAX_REGRESSION_PCT
+from common import (
+    BUILD_OUTPUT_DIR, DEFAULT_DATA_DIR, DEFAULT_TEST_FILE, PLUGIN_PROJECT, ROOT_DIR, RunnerState, TestResult,
+    TestStatus, git_output, install_signal_handlers, load_tests_from_file, log, make_log_dir, make_slot,
+    open_runner_log, phase_timer, print_summary, write_atomic, write_summary_json,
+)
+from replay import ReplayRunner, load_recording_expectations, resolve_recordings
+from runner import TestRunner, add_node_arguments, resolve_node_arguments
+
+
+# =============================================================================
+# A/B comparison of two revisions
+# =============================================================================
+
+# One git worktree (and build output) per compared revision
+AB_WORKTREE_DIR = DEFAULT_DATA_DIR / "ab-worktrees"
+# Each worktree holds a full checkout and build; keep only the most recently used ones
+AB_WORKTREE_KEEP = 4
+AB_VARIANTS = ("a", "b")
+DEFAULT_AB_ROUNDS = 5
+DEFAULT_AB_ALPHA = 0.05
+AB_PERMUTATIONS = 10_000
+# Metrics where a higher value is better; everything else is a duration
+AB_HIGHER_IS_BETTER = frozenset({"messages_per_s"})
+
+
+def permutation_p_value(a: list[float], b: list[float], permutations: int = AB_PERMUTATIONS) -> float:
+    """Two-sided permutation test on the difference of means.
+
+    Makes no normality assumption, which matters for the handful of noisy
+    timings an A/B run collects. Seeded, so reports are reproducible.
+    """
+    if len(a) < 2 or len(b) < 2:
+        return 1.0
+    observed = abs(statistics.fmean(a) - statistics.fmean(b))
+    pooled = [*a, *b]
+    rng = random.Random(0)
+    extreme = 0
+    for _ in range(permutations):
+        rng.shuffle(pooled)
+        if abs(statistics.fmean(pooled[:len(a)]) - statistics.fmean(pooled[len(a):])) >= observed - 1e-12:
+            extreme += 1
+    return (extreme + 1) / (permutations + 1)
+
+
+def ab_observations(result: TestResult) -> dict[str, float]:
+    """Comparable numbers of one run: total duration, each phase and throughput metrics."""
+    observations = {"duration_s": result.duration_s}
+    observations.update({f"phase.{name}": seconds for name, seconds in result.phases.items()})
+    observations.update({name: result.metrics[name] for name in AB_HIGHER_IS_BETTER if name in result.metrics})
+    return observations
+
+
+def compare_ab(samples: dict[str, dict[str, dict[str, list[float]]]], alpha: float,
+               max_regression_pct: float) -> tuple[list[dict], list[str]]:
+    """Per workload and metric: medians, delta of B vs A and significance.
+
+    `samples` is workload -> metric -> variant -> values. Returns the rows
+    and the significant regressions beyond `max_regression_pct`.
+    """
+    rows, regressions = [], []
+    for workload, metrics in samples.items():
+        for metric, by_variant in metrics.items():
+            a, b = by_variant.get("a", []), by_variant.get("b", [])
+            if not a or not b:
+                continue
+            median_a, median_b = statistics.median(a), statistics.median(b)
+            delta_pct = (median_b / median_a - 1) * 100 if median_a else 0.0
+            p_value = permutation_p_value(a, b)
+            worse_pct = -delta_pct if metric in AB_HIGHER_IS_BETTER else delta_pct
+            significant = p_value < alpha
+            rows.append({
+                "workload": workload, "metric": metric, "a_median": median_a, "b_median": median_b,
+                "delta_pct": round(delta_pct, 2), "p_value": round(p_value, 4), "significant": significant,
+                "runs": [len(a), len(b)],
+            })
+            if significant and worse_pct > max_regression_pct:
+                regressions.append(f"{workload} {metric}: {delta_pct:+.1f}% (p={p_value:.3f})")
+    return rows, regressions
+
+
+def prune_ab_worktrees(keep: int = AB_WORKTREE_KEEP):
+    """Remove all but the `keep` most recently used worktrees and forget them in git."""
+    if not AB_WORKTREE_DIR.is_dir():
+        return
+    entries = sorted(
+        (p for p in AB_WORKTREE_DIR.iterdir() if p.is_dir()),
+        key=lambda p: p.stat().st_mtime, reverse=True,
+    )
+    for stale in entries[keep:]:
+        # --force: the worktree has a build and initialized submodules
+        subprocess.run(["git", "worktree", "remove", "--force", str(stale)], cwd=str(ROOT_DIR),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(stale, ignore_errors=True)
+    if entries[keep:]:
+        subprocess.run(["git", "worktree", "prune"], cwd=str(ROOT_DIR),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class RevisionBuilder(TestRunner):
+    """Builds the revisions an A/B comparison runs, each in its own git worktree."""
+
+    def build_revision(self, revision: str, configuration: str) -> Path | None:
+        """Check `revision` out into its own worktree and build it; returns its Nethermind.Runner output.
+
+        Worktrees live under AB_WORKTREE_DIR keyed by commit, so each
+        revision is checked out and built once and reused by later runs;
+        prune_ab_worktrees drops the least recently used ones.
+        """
+        commit = git_output(ROOT_DIR, "rev-parse", "--verify", f"{revision}^{{commit}}").strip()
+        if not commit:
+            self._log(f"Unknown revision: {revision}")
+            log(f"Unknown revision: {revision}", "ERROR")
+            return None
+        worktree = AB_WORKTREE_DIR / commit[:12]
+        build_dir = worktree / BUILD_OUTPUT_DIR.parent.relative_to(ROOT_DIR) / configuration.lower()
+        marker = build_dir / ".run-comparison-ab-build"
+        if not self.args.force_build and marker.exists() and marker.read_text().strip() == commit:
+            self._log(f"Revision {revision} ({commit[:12]}) already built in {build_dir}")
+            os.utime(worktree)
+            return build_dir
+
+        commands = [
+            ["git", "worktree", "add", "--force", "--detach", str(worktree), commit],
+            ["git", "-C", str(worktree), "submodule", "update", "--init", "--recursive"],
+            ["dotnet", "build", str(worktree / PLUGIN_PROJECT.relative_to(ROOT_DIR)), "-c", configuration],
+        ]
+        if (worktree / ".git").exists():
+            commands = commands[1:]
+        log(f"Building {revision} ({commit[:12]}, {configuration})...")
+        for cmd in commands:
+            self._log(f"Running: {' '.join(cmd)}")
+            proc = subprocess.run(cmd, cwd=str(ROOT_DIR), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            self.runner_log.write(proc.stdout or "")
+            self.runner_log.flush()
+            if proc.returncode != 0:
+                self._log(f"{cmd[0]} failed with exit code {proc.returncode}")
+                log(f"Building {revision} FAILED", "ERROR")
+                return None
+        with contextlib.suppress(OSError):
+            write_atomic(marker, commit.encode())
+        os.utime(worktree)
+        return build_dir
+
+
+def ab_main(argv: list[str]) -> int:
+    """`ab` subcommand: alternate the same workload between two built revisions."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} ab",
+        description="Build two revisions into separate worktrees, run the same workload against each, "
+                    "alternating between them, and report per-workload and per-phase deltas of B vs A "
+                    "with a permutation test.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s main HEAD 5__stylus                       # Replay one recording, 5 rounds
+  %(prog)s main HEAD --workload tests --test-filter TestTransfer --rounds 10
+  %(prog)s v1.2.0 main --max-regression 3            # Fail on a significant >3%% slowdown
+        """,
+    )
+    parser.add_argument("revision_a", help="Baseline revision (any git rev)")
+    parser.add_argument("revision_b", help="Candidate revision")
+    parser.add_argument("workloads", nargs="*",
+                        help="Recordings for --workload replay (default: all), or test names for tests")
+    parser.add_argument("--workload", choices=("replay", "tests"), default="replay",
+                        help="Recording replay (digest throughput), or comparison tests (needs Nitro)")
+    parser.add_argument("--test-filter", default="", help="Single comparison test for --workload tests")
+    parser.add_argument("--test-file", type=Path, default=DEFAULT_TEST_FILE,
+                        help=f"Comparison test list for --workload tests (default: {DEFAULT_TEST_FILE})")
+    parser.add_argument("--messages", type=int, default=0,
+                        help="Digest at most this many messages per recording (default: all)")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_AB_ROUNDS,
+                        help=f"Runs of each workload per revision (default: {DEFAULT_AB_ROUNDS})")
+    parser.add_argument("--configuration", choices=("Release", "Debug"), default="Release",
+                        help="dotnet build configuration for both revisions (default: Release)")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_AB_ALPHA,
+                        help=f"Significance level (default: {DEFAULT_AB_ALPHA:g})")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION_PCT,
+                        help="Fail if B is significantly slower than A by more than this percentage "
+                             f"(default: {DEFAULT_MAX_REGRESSION_PCT:g})")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Write the comparison JSON here (default: ab.json in the log directory)")
+    parser.add_argument("--nitro-path", default=os.environ.get("NITRO_PATH", ""), help="Override NITRO_PATH")
+    add_node_arguments(parser)
+    args = parser.parse_args(argv)
+    resolve_node_arguments(parser, args)
+
+    if args.rounds < 1:
+        print("Error: --rounds must be at least 1", file=sys.stderr)
+        return 1
+    if args.workload == "replay":
+        try:
+            workloads = resolve_recordings(args.workloads)
+        except FileNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    elif args.workloads or args.test_filter:
+        workloads = args.workloads or [args.test_filter]
+    elif args.test_file.exists():
+        workloads = load_tests_from_file(args.test_file)
+    else:
+        print(f"Error: Test file not found: {args.test_file}", file=sys.stderr)
+        return 1
+    if not workloads:
+        print("Error: Nothing to run", file=sys.stderr)
+        return 1
+    names = [w.name if isinstance(w, Path) else w for w in workloads]
+
+    # ABBA order per workload and round, so drift over the run hits both revisions alike
+    schedule = []
+    for round_index in range(args.rounds):
+        for workload_index, (workload, name) in enumerate(zip(workloads, names)):
+            order = AB_VARIANTS if (round_index + workload_index) % 2 == 0 else AB_VARIANTS[::-1]
+            schedule += [(variant, workload, name, round_index) for variant in order]
+
+    log_dir = None if args.no_logs else make_log_dir("nm-nitro-ab")
+    state = RunnerState()
+    for variant, _, name, round_index in schedule:
+        state.results.append(TestResult(name=f"{variant}:{name}#{round_index + 1}"))
+    install_signal_handlers(state)
+
+    samples: dict[str, dict[str, dict[str, list[float]]]] = {}
+    with open_runner_log(log_dir) as runner_log:
+        builder = RevisionBuilder(args, state, runner_log)
+        revisions = {"a": args.revision_a, "b": args.revision_b}
+        with phase_timer(state.phases, "build"):
+            build_dirs = {variant: builder.build_revision(rev, args.configuration)
+                          for variant, rev in revisions.items()}
+        if not all(build_dirs.values()):
+            return 1
+        # Both revisions were just used, so they are the newest and survive
+        prune_ab_worktrees()
+        runners = {variant: ReplayRunner(args, state, runner_log, make_slot(0, args.nethermind_port, build_dir))
+                   for variant, build_dir in build_dirs.items()}
+        expectations = {w: load_recording_expectations(w) for w in workloads if isinstance(w, Path)}
+
+        log(f"A/B: {len(workloads)} workload(s) x {args.rounds} round(s), "
+            f"a={args.revision_a} b={args.revision_b}")
+        print("-" * 60)
+        for (variant, workload, name, round_index), result in zip(schedule, state.results):
+            if state.interrupted:
+                result.status = TestStatus.SKIPPED
+                continue
+            run_dir = None
+            if log_dir:
+                run_dir = log_dir / f"{variant}-{round_index + 1}"
+                run_dir.mkdir(exist_ok=True)
+            runner = runners[variant]
+            if isinstance(workload, Path):
+                runner.replay(result, workload, expectations[workload], run_dir, args.messages)
+            else:
+                result.name = workload
+                runner.execute(result, run_dir)
+                result.name = f"{variant}:{name}#{round_index + 1}"
+            if result.status == TestStatus.PASSED:
+                for metric, value in ab_observations(result).items():
+                    samples.setdefault(name, {}).setdefault(metric, {}).setdefault(variant, []).append(value)
+
+        print_summary(state)
+        if log_dir:
+            write_summary_json(state, log_dir / "summary.json")
+
+    rows, regressions = compare_ab(samples, args.alpha, args.max_regression)
+    print(f"\n{'workload':<28} {'metric':<24} {'a':>10} {'b':>10} {'delta':>8} {'p':>7}")
+    for row in rows:
+        marker = " *" if row["significant"] else ""
+        print(f"{row['workload']:<28} {row['metric']:<24} {row['a_median']:>10.3f} {row['b_median']:>10.3f} "
+              f"{row['delta_pct']:>+7.1f}% {row['p_value']:>7.3f}{marker}")
+    print(f"(* significant at alpha={args.alpha:g}; durations in seconds)")
+
+    output = args.output or (log_dir / "ab.json" if log_dir else None)
+    if output:
+        output.write_text(json.dumps({
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "revisions": {variant: {"rev": rev, "commit": git_output(ROOT_DIR, "rev-parse", rev).strip()}
+                          for variant, rev in revisions.items()},
+            "configuration": args.configuration,
+            "workload": args.workload,
+            "rounds": args.rounds,
+            "alpha": args.alpha,
+            "rows": rows,
+        }, indent=2) + "\n")
+        print(f"\nResults: {output}")
+
+    for regression in regressions:
+        log(f"Regression: {regression}", "ERROR")
+    failed = sum(1 for r in state.results if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT))
+    return 1 if failed or regressions or state.interrupted else 0
@@ -0,0 +1,173 @@
+"""
+Digest throughput benchmark (`bench` subcommand): replays recordings,
+summarizes per-message latency and gas throughput, and compares the result
+with a stored baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import sys
+from pathlib import Path
+
+from common import (
+    ROOT_DIR, RunnerState, TestResult, TestStatus, compute_build_fingerprint, git_output, install_signal_handlers,
+    log, make_log_dir, open_runner_log, percentile, phase_timer, print_summary, write_summary_json,
+)
+from replay import DigestSample, ReplayRunner, load_recording_expectations, resolve_recordings
+from runner import add_node_arguments, resolve_node_arguments
+
+
+# =============================================================================
+# Digest throughput benchmark
+# =============================================================================
+
+BENCH_RESULTS_VERSION = 1
+DEFAULT_MAX_REGRESSION_PCT = 10.0
+
+
+def summarize_digest_samples(samples: list[DigestSample]) -> dict:
+    """Throughput and latency figures for a set of digest calls.
+
+    Rates are over the time spent inside digestMessage only, so they measure
+    the execution layer rather than the benchmark's own bookkeeping.
+    """
+    latencies = sorted(sample.latency_s for sample in samples)
+    digest_s = sum(latencies)
+    gas = sum(sample.gas_used for sample in samples)
+    return {
+        "messages": len(samples),
+        "digest_s": round(digest_s, 6),
+        "msgs_per_s": round(len(samples) / digest_s, 2) if digest_s else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "gas": gas,
+        "gas_per_s": round(gas / digest_s) if digest_s else 0,
+    }
+
+
+def compare_bench_results(current: dict, baseline: dict, max_regression_pct: float) -> list[str]:
+    """Print per-workload deltas against a baseline and return the regressions beyond the budget."""
+    regressions = []
+    print(f"\nvs baseline {baseline.get('commit', '?')[:12]} ({baseline.get('timestamp', '?')}):")
+    rows = [("total", current["total"], baseline.get("total"))]
+    rows += [(name, stats, baseline.get("workloads", {}).get(name)) for name, stats in current["workloads"].items()]
+    for name, stats, base in rows:
+        if not base or not base.get("msgs_per_s"):
+            print(f"  {name:<36} (no baseline)")
+            continue
+        throughput = (stats["msgs_per_s"] / base["msgs_per_s"] - 1) * 100
+        p99 = (stats["p99_ms"] / base["p99_ms"] - 1) * 100 if base.get("p99_ms") else 0.0
+        print(f"  {name:<36} msgs/s {throughput:+6.1f}%   p99 {p99:+6.1f}%")
+        if throughput < -max_regression_pct:
+            regressions.append(f"{name}: msgs/s {throughput:+.1f}% (budget -{max_regression_pct:g}%)")
+    return regressions
+
+
+def bench_main(argv: list[str]) -> int:
+    """`bench` subcommand: measure digestMessage throughput on the recordings."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} bench",
+        description="Benchmark nitroexecution_digestMessage on recorded transfers, deploys and Stylus "
+                    "calls. Each run replays a recording into a fresh Nethermind (block hashes are "
+                    "still checked) and times every digest call.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --iterations 5 --output main.json        # Record a baseline
+  %(prog)s --iterations 5 --baseline main.json      # Compare a branch against it
+  %(prog)s 5__stylus --warmup 10                    # One workload, skip setup messages
+        """,
+    )
+    parser.add_argument("recordings", nargs="*",
+                        help="Recording files or names to use as workloads (default: all recordings)")
+    parser.add_argument("--iterations", type=int, default=3,
+                        help="Runs per recording, each on a fresh DB (default: 3)")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="Leading messages of each run left out of the statistics (default: 0)")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Write results JSON here (default: bench.json in the log directory)")
+    parser.add_argument("--baseline", type=Path, default=None,
+                        help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION_PCT,
+                        help="Fail if msgs/s drops more than this percentage below --baseline "
+                             f"(default: {DEFAULT_MAX_REGRESSION_PCT:g})")
+    add_node_arguments(parser)
+    args = parser.parse_args(argv)
+    resolve_node_arguments(parser, args)
+
+    if args.iterations < 1:
+        print("Error: --iterations must be at least 1", file=sys.stderr)
+        return 1
+    try:
+        recordings = resolve_recordings(args.recordings)
+        baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    log_dir = None if args.no_logs else make_log_dir("nm-nitro-bench")
+    state = RunnerState()
+    runs = [(recording, i) for recording in recordings for i in range(args.iterations)]
+    for recording, i in runs:
+        state.results.append(TestResult(name=f"{recording.name}#{i + 1}"))
+    install_signal_handlers(state)
+
+    workload_samples: dict[str, list[DigestSample]] = {recording.name: [] for recording in recordings}
+    with open_runner_log(log_dir) as runner_log:
+        runner = ReplayRunner(args, state, runner_log)
+        with phase_timer(state.phases, "build"):
+            build_succeeded = runner.build_nethermind()
+        if not build_succeeded:
+            return 1
+
+        log(f"Benchmarking {len(recordings)} workload(s) x {args.iterations} iteration(s)...")
+        print("-" * 60)
+        expectations = {recording: load_recording_expectations(recording) for recording in recordings}
+        for (recording, _), result in zip(runs, state.results):
+            if state.interrupted:
+                result.status = TestStatus.SKIPPED
+                continue
+            samples: list[DigestSample] = []
+            runner.replay(result, recording, expectations[recording], log_dir, samples=samples)
+            if result.status == TestStatus.PASSED:
+                workload_samples[recording.name] += samples[args.warmup:]
+
+        print_summary(state)
+        if log_dir:
+            write_summary_json(state, log_dir / "summary.json")
+
+    results = {
+        "version": BENCH_RESULTS_VERSION,
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "commit": git_output(ROOT_DIR, "rev-parse", "HEAD").strip(),
+        "build_fingerprint": compute_build_fingerprint(),
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "workloads": {name: summarize_digest_samples(samples) for name, samples in workload_samples.items()},
+        "total": summarize_digest_samples([s for samples in workload_samples.values() for s in samples]),
+    }
+
+    print(f"\n{'workload':<36} {'msgs':>6} {'msgs/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'Mgas/s':>8}")
+    for name, stats in [*results["workloads"].items(), ("total", results["total"])]:
+        print(f"{name:<36} {stats['messages']:>6} {stats['msgs_per_s']:>9.1f} {stats['p50_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f} {stats['gas_per_s'] / 1e6:>8.2f}")
+
+    output = args.output or (log_dir / "bench.json" if log_dir else None)
+    if output:
+        output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nResults: {output}")
+
+    regressions = compare_bench_results(results, baseline, args.max_regression) if baseline else []
+    for regression in regressions:
+        log(f"Throughput regression: {regression}", "ERROR")
+
+    failed = sum(1 for r in state.results if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT))
+    return 1 if failed or regressions or state.interrupted else 0
@@ -0,0 +1,289 @@
+"""
+Per-block processing metrics parsed from nethermind.log, stored as a
+column file (blocks.col) next to each test's log, and the `blocks`
+subcommand that reports on them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import sys
+from array import array
+from pathlib import Path
+import contextlib
+import re
+
+from common import LOG_READ_CHUNK, LogStream, percentile, write_atomic
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# =============================================================================
+# Block processing metrics from Nethermind logs
+# =============================================================================
+
+# Per-block processing reports extracted from nethermind.log, one column file per test
+BLOCK_METRICS_FILE = "blocks.col"
+BLOCK_METRICS_MAGIC = b"NMBLKCOL1\n"
+BLOCK_METRICS_COLUMNS = (
+    ("first", "q"), ("last", "q"), ("processing_ms", "d"), ("mgas", "d"), ("txs", "q"), ("stylus_calls", "q"),
+)
+
+
+_ANSI = rb"(?:\x1b\[[\d;]*m)*"
+# The two lines ArbitrumProcessingStats logs per report (per block at --log debug):
+#   Processed          1234         |       25.3 ms  | elapsed ...
+#    Block                  1.23 MGas    |        5   txs | 🦀 stylus   2 (...)
+# A report covering several blocks reads "Processed  1230...1234" and " Blocks  x5".
+BLOCK_REPORT_LINE = re.compile(
+    rb"Processed\s+(\d+)(?:\.\.\.\s*(\d+))?\s*\|\s*" + _ANSI + rb"\s*([\d,]+\.?\d*)" + _ANSI + rb"\s*ms"
+    rb"|\sBlocks?\s+(?:x[\d,]+\s+)?" + _ANSI + rb"\s*(\d+\.?\d*)" + _ANSI + rb"\s*MGas\s*\|\s*([\d,]+)\s+txs"
+    rb"(?:\s*\|\s*" + _ANSI + rb"\S*\s*stylus\s+([\d,]+))?"
+)
+
+
+class BlockLogParser:
+    """Collects block processing reports from Nethermind output into columns.
+
+    Fed complete lines, either live from the log stream or from a finished
+    log file. Chunks without a report are skipped with two substring checks,
+    so the parser costs next to nothing on the bulk of debug output. Gas is
+    as logged: MGas with two decimals.
+    """
+
+    def __init__(self):
+        self.columns = {name: array(code) for name, code in BLOCK_METRICS_COLUMNS}
+        self._pending: tuple[int, int, float] | None = None
+
+    def __len__(self) -> int:
+        return len(self.columns["last"])
+
+    def feed(self, chunk: bytes):
+        if b"Processed" not in chunk and b"MGas" not in chunk:
+            return
+        for match in BLOCK_REPORT_LINE.finditer(chunk):
+            first, last, ms, mgas, txs, stylus = match.groups()
+            if first:
+                self._pending = (int(first), int(last or first), float(ms.replace(b",", b"")))
+            elif self._pending:
+                # A Block line belongs to the Processed line right before it
+                columns = self.columns
+                first_block, last_block, processing_ms = self._pending
+                self._pending = None
+                columns["first"].append(first_block)
+                columns["last"].append(last_block)
+                columns["processing_ms"].append(processing_ms)
+                columns["mgas"].append(float(mgas))
+                columns["txs"].append(int(txs.replace(b",", b"")))
+                columns["stylus_calls"].append(int(stylus.replace(b",", b"")) if stylus else 0)
+
+
+def open_log_file(path: Path):
+    """Binary reader of a (possibly zstd or gzip compressed) log written by LogStream."""
+    if path.suffix == ".zst":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(f"{path.name}: reading .zst logs needs the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(path.open("rb"), closefd=True)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    return path.open("rb")
+
+
+def parse_block_log(path: Path) -> BlockLogParser:
+    """Stream a Nethermind log file through a BlockLogParser, in LOG_READ_CHUNK pieces."""
+    parser = BlockLogParser()
+    partial = b""
+    with open_log_file(path) as f:
+        while data := f.read(LOG_READ_CHUNK):
+            data = partial + data
+            cut = data.rfind(b"\n") + 1
+            partial = data[cut:]
+            parser.feed(data[:cut])
+    parser.feed(partial)
+    return parser
+
+
+def write_block_metrics(path: Path, columns: dict[str, array]):
+    """Write columns as BLOCK_METRICS_MAGIC, a JSON header line, then each column's raw values."""
+    header = {
+        "rows": len(columns["last"]),
+        "byteorder": sys.byteorder,
+        "columns": [[name, code] for name, code in BLOCK_METRICS_COLUMNS],
+    }
+    write_atomic(path, b"".join([
+        BLOCK_METRICS_MAGIC, json.dumps(header).encode(), b"\n",
+        *(columns[name].tobytes() for name, _ in BLOCK_METRICS_COLUMNS),
+    ]))
+
+
+def read_block_metrics(path: Path) -> dict[str, array]:
+    with path.open("rb") as f:
+        if f.read(len(BLOCK_METRICS_MAGIC)) != BLOCK_METRICS_MAGIC:
+            raise ValueError(f"{path}: not a block metrics file")
+        header = json.loads(f.readline())
+        columns = {}
+        for name, code in header["columns"]:
+            column = array(code)
+            column.fromfile(f, header["rows"])
+            if header["byteorder"] != sys.byteorder:
+                column.byteswap()
+            columns[name] = column
+    return columns
+
+
+def load_block_metrics(test_dir: Path) -> dict[str, array] | None:
+    """Block metrics of one test directory, indexing its nethermind.log on first use.
+
+    The index is rebuilt when the log is newer. Returns None when the
+    directory holds neither an index nor a log.
+    """
+    index = test_dir / BLOCK_METRICS_FILE
+    logs = [path for suffix in LogStream.SUFFIXES.values() if (path := test_dir / f"nethermind.log{suffix}").exists()]
+    if index.exists() and (not logs or index.stat().st_mtime >= logs[0].stat().st_mtime):
+        return read_block_metrics(index)
+    if not logs:
+        return None
+    columns = parse_block_log(logs[0]).columns
+    if len(columns["last"]):
+        with contextlib.suppress(OSError):
+            write_block_metrics(index, columns)
+    return columns
+
+
+def summarize_block_metrics(columns: dict[str, array]) -> dict:
+    """Totals and per-report latency percentiles of one run."""
+    latencies = sorted(columns["processing_ms"])
+    total_ms = sum(latencies)
+    mgas = sum(columns["mgas"])
+    return {
+        "reports": len(latencies),
+        "blocks": sum(last - first + 1 for first, last in zip(columns["first"], columns["last"])),
+        "mgas": round(mgas, 2),
+        "txs": sum(columns["txs"]),
+        "processing_ms": round(total_ms, 1),
+        "mgas_per_s": round(mgas / total_ms * 1000, 2) if total_ms else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": latencies[-1] if latencies else 0.0,
+    }
+
+
+def block_throughput_curve(columns: dict[str, array], bucket: int) -> dict[int, float]:
+    """MGas/s of processing time per `bucket` blocks, keyed by the bucket's first block."""
+    mgas: dict[int, float] = {}
+    ms: dict[int, float] = {}
+    for last, report_mgas, report_ms in zip(columns["last"], columns["mgas"], columns["processing_ms"]):
+        start = last // bucket * bucket
+        mgas[start] = mgas.get(start, 0.0) + report_mgas
+        ms[start] = ms.get(start, 0.0) + report_ms
+    return {start: mgas[start] / ms[start] * 1000 if ms[start] else 0.0 for start in sorted(ms)}
+
+
+def blocks_main(argv: list[str]) -> int:
+    """`blocks` subcommand: query per-block processing metrics of past runs."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} blocks",
+        description="Report slowest blocks and block throughput from the nethermind.log of past runs. "
+                    f"Each test's log is parsed once into {BLOCK_METRICS_FILE} next to it; runs made with "
+                    "this script write that file as they go.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                         # Latest run in /tmp
+  %(prog)s /tmp/nm-nitro-20250101-* --top 20       # Several runs side by side
+  %(prog)s /tmp/nm-nitro-replay-* --filter stylus --bucket 500 --output blocks.json
+        """,
+    )
+    parser.add_argument("paths", nargs="*", type=Path,
+                        help="Run log directories or test directories (default: the latest /tmp/nm-nitro-* run)")
+    parser.add_argument("--filter", default="", metavar="REGEX", help="Only tests whose directory matches")
+    parser.add_argument("--top", type=int, default=10, help="Slowest block reports to list (default: 10)")
+    parser.add_argument("--bucket", type=int, default=100,
+                        help="Blocks per point of the throughput curve (default: 100)")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    paths = args.paths
+    if not paths:
+        runs = sorted(Path("/tmp").glob("nm-nitro-*"), key=lambda p: p.stat().st_mtime)
+        if not runs:
+            print("Error: No runs found in /tmp; pass a log directory", file=sys.stderr)
+            return 1
+        paths = runs[-1:]
+    if args.bucket < 1:
+        print("Error: --bucket must be at least 1", file=sys.stderr)
+        return 1
+    name_filter = re.compile(args.filter)
+
+    runs: dict[str, dict[str, array]] = {}
+    for root in paths:
+        if not root.is_dir():
+            print(f"Error: Not a directory: {root}", file=sys.stderr)
+            return 1
+        test_dirs = {p.parent for pattern in ("nethermind.log*", BLOCK_METRICS_FILE) for p in root.rglob(pattern)}
+        for test_dir in sorted(test_dirs):
+            label = str(Path(root.name) / test_dir.relative_to(root)) if test_dir != root else root.name
+            if not name_filter.search(label):
+                continue
+            try:
+                columns = load_block_metrics(test_dir)
+            except (OSError, RuntimeError, ValueError, EOFError) as e:
+                print(f"Warning: {label}: {e}", file=sys.stderr)
+                continue
+            if columns and len(columns["last"]):
+                runs[label] = columns
+    if not runs:
+        print("Error: No block processing reports found (Nethermind logs them at --log debug)", file=sys.stderr)
+        return 1
+
+    summaries = {label: summarize_block_metrics(columns) for label, columns in runs.items()}
+    width = max(len(label) for label in runs) + 2
+    print(f"{'run':<{width}} {'blocks':>7} {'MGas':>10} {'MGas/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>9}")
+    for label, summary in summaries.items():
+        print(f"{label:<{width}} {summary['blocks']:>7} {summary['mgas']:>10.2f} {summary['mgas_per_s']:>9.2f} "
+              f"{summary['p50_ms']:>8.2f} {summary['p99_ms']:>8.2f} {summary['max_ms']:>9.2f}")
+
+    slowest = sorted(
+        ((columns["processing_ms"][i], label, i) for label, columns in runs.items() for i in range(len(columns["last"]))),
+        reverse=True,
+    )[:args.top]
+    print(f"\nSlowest {len(slowest)} block report(s):")
+    print(f"{'run':<{width}} {'block':>15} {'ms':>9} {'MGas':>8} {'txs':>6} {'stylus':>7}")
+    slowest_rows = []
+    for ms, label, i in slowest:
+        columns = runs[label]
+        first, last = columns["first"][i], columns["last"][i]
+        blocks = str(last) if first == last else f"{first}...{last}"
+        print(f"{label:<{width}} {blocks:>15} {ms:>9.1f} {columns['mgas'][i]:>8.2f} "
+              f"{columns['txs'][i]:>6} {columns['stylus_calls'][i]:>7}")
+        slowest_rows.append({
+            "run": label, "first": first, "last": last, "processing_ms": ms, "mgas": columns["mgas"][i],
+            "txs": columns["txs"][i], "stylus_calls": columns["stylus_calls"][i],
+        })
+
+    curves = {label: block_throughput_curve(columns, args.bucket) for label, columns in runs.items()}
+    labels = list(curves)
+    print(f"\nThroughput (MGas/s) per {args.bucket} blocks:")
+    for index, label in enumerate(labels, 1):
+        print(f"  [{index}] {label}")
+    print(f"{'blocks':>15} " + " ".join(f"{f'[{index}]':>9}" for index in range(1, len(labels) + 1)))
+    for start in sorted({start for curve in curves.values() for start in curve}):
+        cells = [f"{curves[label][start]:>9.2f}" if start in curves[label] else f"{'-':>9}" for label in labels]
+        print(f"{f'{start}-{start + args.bucket - 1}':>15} " + " ".join(cells))
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "bucket": args.bucket,
+            "runs": summaries,
+            "slowest": slowest_rows,
+            "throughput": {label: {str(start): round(value, 2) for start, value in curve.items()}
+                           for label, curve in curves.items()},
+        }, indent=2) + "\n")
+        print(f"\nResults: {args.output}")
+    return 0
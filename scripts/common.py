@@ -0,0 +1,859 @@
+"""
+Shared pieces of the comparison harness: paths and defaults, test results,
+Nethermind config generation, build fingerprints, log streaming and the
+summary/metrics reports every subcommand writes.
+"""
+
+from __future__ import annotations
+
+import base64
+import concurrent.futures
+import datetime as dt
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+import urllib.request
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Iterable
+import contextlib
+import re
+
+
+try:
+    from eth_keys import keys
+    from eth_hash.auto import keccak
+    ETH_KEYS_AVAILABLE = True
+except ImportError:
+    ETH_KEYS_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# =============================================================================
+# Generative Config: Compute test accounts dynamically
+# =============================================================================
+
+PRECOMPUTED_ADDRESSES = {
+    "Owner": "0x26E554a8acF9003b83495c7f45F06edCB803d4e3",
+    "Faucet": "0xaF24Ca6c2831f4d4F629418b50C227DF0885613A",
+}
+
+DEFAULT_TEST_BALANCE = "0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF7"
+
+
+# Below this many cache misses a process pool costs more than it saves
+PARALLEL_DERIVATION_THRESHOLD = 256
+
+# name -> checksum address, loaded lazily from ACCOUNT_CACHE_PATH
+_address_cache: dict[str, str] | None = None
+_address_cache_lock = threading.Lock()
+
+
+def _derive_test_address(name: str) -> str:
+    """Derive a test account address using the same algorithm as Nitro."""
+    key_bytes = bytearray(keccak(name.encode('utf-8')))
+    key_bytes[0] = 0
+    private_key = keys.PrivateKey(bytes(key_bytes))
+    return private_key.public_key.to_checksum_address()
+
+
+def _load_address_cache() -> dict[str, str]:
+    global _address_cache
+    if _address_cache is None:
+        _address_cache = dict(PRECOMPUTED_ADDRESSES)
+        try:
+            with ACCOUNT_CACHE_PATH.open() as f:
+                addresses = json.load(f)["addresses"]
+            if isinstance(addresses, dict) and all(
+                    isinstance(k, str) and isinstance(v, str) for k, v in addresses.items()):
+                _address_cache.update(addresses)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing or corrupt cache: derive again and overwrite it
+            pass
+    return _address_cache
+
+
+def compute_test_addresses(names: Iterable[str], processes: int = 1) -> dict[str, str]:
+    """Compute addresses for many test accounts at once.
+
+    Results are memoized in memory and persisted to ACCOUNT_CACHE_PATH, so each
+    name is derived once per machine. Misses are derived in a process pool
+    when `processes` > 1 and there are enough of them to be worth it.
+    """
+    names = list(dict.fromkeys(names))
+    with _address_cache_lock:
+        cache = _load_address_cache()
+        missing = [name for name in names if name not in cache]
+        if missing:
+            if not ETH_KEYS_AVAILABLE:
+                raise RuntimeError(
+                    f"Cannot compute address for '{missing[0]}': eth_keys not installed. "
+                    f"Install with: pip install eth-keys eth-hash[pycryptodome]"
+                )
+            if processes > 1 and len(missing) >= PARALLEL_DERIVATION_THRESHOLD:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+                    derived = pool.map(_derive_test_address, missing, chunksize=64)
+                    cache.update(zip(missing, derived))
+            else:
+                cache.update((name, _derive_test_address(name)) for name in missing)
+            try:
+                write_atomic(ACCOUNT_CACHE_PATH, json.dumps({"addresses": cache}, indent=0).encode())
+            except OSError:
+                # Read-only checkout: the in-memory memo still applies
+                pass
+        return {name: cache[name] for name in names}
+
+
+def compute_test_address(name: str) -> str:
+    """Compute test account address using the same algorithm as Nitro."""
+    return compute_test_addresses([name])[name]
+
+
+def build_funded_accounts(names: Iterable[str], balance: str = DEFAULT_TEST_BALANCE,
+                          processes: int = 1) -> dict[str, dict]:
+    """Build a chainspec `accounts` map funding every named test account."""
+    accounts = {}
+    for address in compute_test_addresses(names, processes).values():
+        address_no_prefix = address[2:] if address.startswith("0x") else address
+        accounts[address_no_prefix] = {"balance": balance}
+    return accounts
+
+
+def account_names_for_test(test_name: str) -> list[str]:
+    """Names of the accounts a test (or an `A|B` group) funds in its chainspec."""
+    standard_accounts = ["Owner", "Faucet"]
+    test_account_overrides: dict[str, list[str]] = {}
+    # An `A|B` group shares one chain, so it needs every member's accounts
+    account_names: list[str] = []
+    for name in test_name.split("|"):
+        for account in test_account_overrides.get(name, standard_accounts):
+            if account not in account_names:
+                account_names.append(account)
+    return account_names
+
+
+def get_test_accounts(test_name: str) -> dict[str, dict]:
+    """Get the accounts required for a specific test."""
+    return build_funded_accounts(account_names_for_test(test_name))
+
+
+def generate_accounts_json(test_name: str, output_path: Path) -> Path:
+    """Generate accounts JSON file for a specific test."""
+    accounts = get_test_accounts(test_name)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w") as f:
+        json.dump(accounts, f, indent=2)
+    return output_path
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_HOST = os.environ.get("NETHERMIND_EL_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.environ.get("NETHERMIND_EL_PORT", "20551"))
+DEFAULT_TEST_FILE = ROOT_DIR / "scripts" / "comparison_tests.txt"
+DEFAULT_NITRO_PATH = Path.home() / "GolandProjects" / "arbitrum-nitro"
+DEFAULT_CONFIG_NAME = "arbitrum-system-test"
+DEFAULT_DATA_DIR = ROOT_DIR / ".data"
+DEFAULT_P2P_PORT = 30303
+BUILD_OUTPUT_DIR = ROOT_DIR / "src/Nethermind/src/Nethermind/artifacts/bin/Nethermind.Runner/debug"
+CONFIG_CACHE_DIR = DEFAULT_DATA_DIR / "config-cache"
+ACCOUNT_CACHE_PATH = DEFAULT_DATA_DIR / "test-accounts.json"
+PLUGIN_PROJECT = ROOT_DIR / "src/Nethermind.Arbitrum/Nethermind.Arbitrum.csproj"
+NETHERMIND_SUBMODULE = ROOT_DIR / "src/Nethermind"
+BUILD_FINGERPRINT_PATH = BUILD_OUTPUT_DIR / ".run-comparison-build-fingerprint"
+CHAINSPEC_TEMPLATE = ROOT_DIR / "src/Nethermind.Arbitrum/Properties/chainspec/system-test-chainspec.template"
+
+# Log streaming: bytes per pipe read, default failure tail, and lines always dropped from Go output
+LOG_READ_CHUNK = 1 << 20
+DEFAULT_LOG_TAIL_LINES = 200
+GO_LOG_NOISE = [r"ld: warning"]
+
+
+class TestStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    PASSED = "passed"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    SKIPPED = "skipped"
+
+
+@contextlib.contextmanager
+def phase_timer(phases: dict[str, float], name: str):
+    """Accumulate the wall time spent inside the block into phases[name]."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.monotonic() - start
+
+
+@dataclass
+class TestResult:
+    name: str
+    status: TestStatus = TestStatus.PENDING
+    exit_code: int | None = None
+    duration_s: float = 0.0
+    error_msg: str = ""
+    log_dir: Path | None = None
+    # Seconds per phase: config, db_reset, nethermind_start, ready_wait, go_build, go_test, teardown
+    phases: dict[str, float] = field(default_factory=dict)
+    # Go test name -> "pass"/"fail"/"skip", parsed from `--- PASS:` style lines
+    subtests: dict[str, str] = field(default_factory=dict)
+    # Last lines of each output stream ("nitro-test", "nethermind"), kept for failed tests only
+    log_tail: dict[str, list[str]] = field(default_factory=dict)
+    # Mode-specific measurements, e.g. messages digested and rate for recording replay
+    metrics: dict[str, float] = field(default_factory=dict)
+    # Peak usage of the Nethermind process group while the test ran, see ResourceSampler
+    resources: dict[str, float] = field(default_factory=dict)
+    # Trace/counter files captured with --profile, see Profiler
+    profile: dict = field(default_factory=dict)
+    # First block that differs from `replay --reference-rpc` after a failure, see locate_divergence
+    divergence: dict = field(default_factory=dict)
+    # 1-based attempt this result describes; earlier attempts are kept in `attempts`
+    attempt: int = 1
+    attempts: list[dict] = field(default_factory=list)
+    # Share of recent runs whose outcome flipped from the run before, from run history
+    flake_rate: float | None = None
+    # Failed, but flaky enough (--quarantine-threshold) not to fail the run
+    quarantined: bool = False
+
+    @property
+    def flaky(self) -> bool:
+        """Passed on a retry after failing earlier in this run."""
+        return self.status == TestStatus.PASSED and bool(self.attempts)
+
+    def attempt_record(self) -> dict:
+        return {
+            "attempt": self.attempt,
+            "status": self.status.value,
+            "exit_code": self.exit_code,
+            "duration_s": self.duration_s,
+            "error": self.error_msg,
+            "log_dir": str(self.log_dir) if self.log_dir else None,
+            "phases": self.phases,
+        }
+
+
+@dataclass
+class RunnerState:
+    """Shared state for the test runner."""
+    results: list[TestResult] = field(default_factory=list)
+    current_test: str = ""
+    current_start: float = 0.0
+    build_done: bool = False
+    interrupted: bool = False
+    stop_requested: bool = False
+    # Run-level phases (build, prepare_inputs, total)
+    phases: dict[str, float] = field(default_factory=dict)
+    # Part of the test list this run covers ("i/N"), see --shard
+    shard: str = ""
+
+
+@dataclass
+class InstanceSlot:
+    """Resources owned by a single Nethermind instance (one per worker)."""
+    index: int
+    port: int
+    p2p_port: int
+    config_name: str
+    data_dir: Path
+    # Nethermind.Runner output the instance runs from; A/B runs use one per revision
+    build_dir: Path = BUILD_OUTPUT_DIR
+
+    @property
+    def db_path(self) -> Path:
+        # The generated config always uses this BaseDbPath, relative to the data dir
+        return self.data_dir / "nethermind_db" / DEFAULT_CONFIG_NAME
+
+    @property
+    def chainspec_path(self) -> Path:
+        return self.build_dir / "chainspec" / f"{self.config_name}.json"
+
+    @property
+    def config_path(self) -> Path:
+        return self.build_dir / "configs" / f"{self.config_name}.json"
+
+    @property
+    def tag(self) -> str:
+        return f"w{self.index}"
+
+
+def make_slot(index: int, base_port: int, build_dir: Path = BUILD_OUTPUT_DIR) -> InstanceSlot:
+    """Allocate port, data dir and config name for worker `index`.
+
+    Worker 0 keeps the historical single-instance layout so sequential runs
+    behave exactly as before.
+    """
+    if index == 0:
+        return InstanceSlot(
+            index=0, port=base_port, p2p_port=DEFAULT_P2P_PORT,
+            config_name=DEFAULT_CONFIG_NAME, data_dir=DEFAULT_DATA_DIR, build_dir=build_dir,
+        )
+    return InstanceSlot(
+        index=index,
+        port=base_port + index,
+        p2p_port=DEFAULT_P2P_PORT + index,
+        config_name=f"{DEFAULT_CONFIG_NAME}-w{index}",
+        data_dir=DEFAULT_DATA_DIR / "workers" / f"w{index}",
+        build_dir=build_dir,
+    )
+
+
+# =============================================================================
+# System test config: in-process port of generate-system-test-config.sh
+# =============================================================================
+
+SYSTEM_TEST_CHAIN_ID = 412346
+DEFAULT_ARBOS_VERSION = 51
+DEFAULT_MAX_CODE_SIZE = "0x6000"
+
+# Must stay byte-identical to the script: the serialized config is stored in ArbOS state
+SERIALIZED_CHAIN_CONFIG_TEMPLATE = (
+    '{{"chainId":{chain_id},"homesteadBlock":0,"daoForkSupport":true,"eip150Block":0,"eip155Block":0,'
+    '"eip158Block":0,"byzantiumBlock":0,"constantinopleBlock":0,"petersburgBlock":0,"istanbulBlock":0,'
+    '"muirGlacierBlock":0,"berlinBlock":0,"londonBlock":0,'
+    '"depositContractAddress":"0x0000000000000000000000000000000000000000","clique":{{"period":0,"epoch":0}},'
+    '"arbitrum":{{"EnableArbOS":true,"AllowDebugPrecompiles":true,"DataAvailabilityCommittee":false,'
+    '"InitialArbOSVersion":{arbos_version},"InitialChainOwner":"0x0000000000000000000000000000000000000000",'
+    '"GenesisBlockNum":0}}}}'
+)
+
+# In-memory layer over CONFIG_CACHE_DIR, shared by all workers
+_chainspec_cache: dict[str, bytes] = {}
+
+
+def chainspec_cache_key(accounts: dict[str, dict], arbos_version: int, max_code_size: str) -> str:
+    """Content address of a rendered chainspec."""
+    digest = hashlib.sha256(CHAINSPEC_TEMPLATE.read_bytes())
+    params = {"arbos_version": arbos_version, "max_code_size": max_code_size, "accounts": accounts}
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def render_chainspec(accounts: dict[str, dict], arbos_version: int, max_code_size: str) -> bytes:
+    """Render system-test-chainspec.template the same way the bash script does."""
+    if not re.fullmatch(r"0x[0-9a-fA-F]+", max_code_size):
+        raise ValueError(f"max code size must be in hex format (e.g. 0x6000), got {max_code_size}")
+
+    chain_config = SERIALIZED_CHAIN_CONFIG_TEMPLATE.format(chain_id=SYSTEM_TEST_CHAIN_ID, arbos_version=arbos_version)
+    mix_hash = f"0x0000000000000000000000000000000000000000000000{arbos_version:02X}0000000000000000"
+    text = (
+        CHAINSPEC_TEMPLATE.read_text()
+        .replace("{{ARBOS_VERSION}}", str(arbos_version))
+        .replace("{{SERIALIZED_CHAIN_CONFIG}}", base64.b64encode(chain_config.encode()).decode())
+        .replace("{{MIX_HASH}}", mix_hash)
+        .replace("{{MAX_CODE_SIZE}}", max_code_size)
+        .replace("{{ACCOUNTS}}", "{}")
+    )
+    chainspec = json.loads(text)
+    chainspec["accounts"] = accounts
+    return (json.dumps(chainspec, indent=2, ensure_ascii=False) + "\n").encode()
+
+
+def render_node_config(config_name: str) -> bytes:
+    """Render the Nethermind config that points at the generated chainspec."""
+    config = {
+        "$schema": "https://raw.githubusercontent.com/NethermindEth/core-scripts/refs/heads/main/schemas/config.json",
+        "Init": {
+            "ChainSpecPath": f"chainspec/{config_name}.json",
+            "BaseDbPath": f"nethermind_db/{DEFAULT_CONFIG_NAME}",
+            "LogFileName": f"{DEFAULT_CONFIG_NAME}.log",
+        },
+        "TxPool": {"BlobsSupport": "Disabled"},
+        "Sync": {
+            "NetworkingEnabled": False,
+            "FastSync": False,
+            "SnapSync": False,
+            "FastSyncCatchUpHeightDelta": "10000000000",
+        },
+        "Discovery": {"DiscoveryVersion": "V5"},
+        "JsonRpc": {
+            "Enabled": True,
+            "Port": 20545,
+            "EnginePort": 20551,
+            "UnsecureDevNoRpcAuthentication": True,
+            "AdditionalRpcUrls": ["http://localhost:28551|http;ws|net;eth;subscribe;web3;client;debug"],
+            "EnabledModules": [
+                "Admin", "Clique", "Consensus", "Db", "Debug", "Deposit", "Erc20", "Eth", "Evm", "Net",
+                "Nft", "Parity", "Personal", "Proof", "Subscribe", "Trace", "TxPool", "Vault", "Web3",
+                "Arbitrum",
+            ],
+        },
+        "Pruning": {"PruningBoundary": 192},
+        "Blocks": {"SecondsPerSlot": 2},
+        "Merge": {"Enabled": True},
+    }
+    return (json.dumps(config, indent=2) + "\n").encode()
+
+
+def get_cached_chainspec(accounts: dict[str, dict], arbos_version: int = DEFAULT_ARBOS_VERSION,
+                         max_code_size: str = DEFAULT_MAX_CODE_SIZE) -> tuple[str, bytes]:
+    """Return (key, chainspec bytes), rendering only on a cache miss."""
+    key = chainspec_cache_key(accounts, arbos_version, max_code_size)
+    cached = _chainspec_cache.get(key)
+    if cached is not None:
+        return key, cached
+
+    cache_path = CONFIG_CACHE_DIR / f"{key}.json"
+    if cache_path.exists():
+        content = cache_path.read_bytes()
+    else:
+        content = render_chainspec(accounts, arbos_version, max_code_size)
+        write_atomic(cache_path, content)
+    _chainspec_cache[key] = content
+    return key, content
+
+
+def write_atomic(path: Path, content: bytes):
+    """Write via a temp file + rename so concurrent readers never see partial files."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(content)
+    tmp_path.replace(path)
+
+
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """Write `content` unless the file already holds it. Returns True if written."""
+    try:
+        if path.read_bytes() == content:
+            return False
+    except FileNotFoundError:
+        pass
+    write_atomic(path, content)
+    return True
+
+
+# =============================================================================
+# Build fingerprint: skip dotnet build when nothing changed
+# =============================================================================
+
+def git_output(repo: Path, *args: str) -> str:
+    try:
+        result = subprocess.run(["git", "-C", str(repo), *args], capture_output=True, text=True)
+    except OSError:
+        return ""
+    return result.stdout if result.returncode == 0 else ""
+
+
+def _hash_git_state(digest, repo: Path, untracked: str = "no"):
+    """Hash a checkout's HEAD plus the stats of its locally modified files.
+
+    Untouched files are covered by the commit, so large trees are never
+    walked. Dirty submodules are hashed the same way, recursively.
+    """
+    digest.update(git_output(repo, "rev-parse", "HEAD").encode())
+    dirty = git_output(repo, "status", "--porcelain", f"--untracked-files={untracked}")
+    for line in sorted(dirty.splitlines()):
+        path = repo / line[3:].split(" -> ")[-1]
+        if (path / ".git").exists():
+            _hash_git_state(digest, path, untracked)
+            continue
+        with contextlib.suppress(OSError):
+            st = path.stat()
+            digest.update(f"{line}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+
+
+def _hash_tree_stats(digest, root: Path, skip_dirs: frozenset[str] = frozenset({"bin", "obj"})):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in skip_dirs and not d.startswith("."))
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            st = path.stat()
+            digest.update(f"{path.relative_to(ROOT_DIR)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+
+
+def compute_build_fingerprint() -> str:
+    """Fingerprint every input of the plugin build.
+
+    Covers size/mtime of the plugin tree and the shared src/ build props, plus
+    the Nethermind submodule commit and its locally modified files.
+    """
+    digest = hashlib.sha256()
+    _hash_tree_stats(digest, PLUGIN_PROJECT.parent)
+    for path in sorted(ROOT_DIR.glob("src/*.props")) + sorted(ROOT_DIR.glob("src/*.config")):
+        st = path.stat()
+        digest.update(f"{path.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+
+    _hash_git_state(digest, NETHERMIND_SUBMODULE)
+    return digest.hexdigest()
+
+
+def compute_nitro_fingerprint(nitro_path: Path, env: dict) -> str:
+    """Fingerprint the Nitro checkout and toolchain a system_tests binary was built from."""
+    digest = hashlib.sha256()
+    _hash_git_state(digest, nitro_path, untracked="all")
+    digest.update(git_output(nitro_path, "submodule", "status", "--recursive").encode())
+    try:
+        go_version = subprocess.run(["go", "env", "GOVERSION", "GOOS", "GOARCH"], capture_output=True,
+                                    text=True, env=env).stdout
+    except OSError:
+        go_version = ""
+    digest.update(go_version.encode())
+    digest.update(env.get("CGO_LDFLAGS", "").encode())
+    return digest.hexdigest()[:16]
+
+
+# =============================================================================
+# Log streaming
+# =============================================================================
+
+def resolve_log_compression(name: str) -> str:
+    """Map --log-compression to a concrete codec: zstd if installed, else gzip."""
+    if name == "auto":
+        return "zstd" if ZSTD_AVAILABLE else "gzip"
+    if name == "zstd" and not ZSTD_AVAILABLE:
+        raise RuntimeError("zstandard not installed. Run: pip install zstandard")
+    return name
+
+
+def compile_noise_filter(patterns: Iterable[str]) -> re.Pattern[bytes] | None:
+    """Compile line patterns into one regex matching whole lines, newline included."""
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    alternatives = "|".join(f"(?:{p})" for p in patterns)
+    return re.compile(f"^[^\n]*(?:{alternatives})[^\n]*\n".encode(), re.MULTILINE)
+
+
+class LogStream:
+    """Streams a child's output into a compressed log file in large chunks.
+
+    Only complete lines are processed: each chunk has noisy lines stripped
+    with a single regex pass, is handed to `on_chunk`, written to the file and
+    its last lines are kept in a bounded ring for failure reports. Memory use
+    is bounded by LOG_READ_CHUNK plus the ring, however long the log gets.
+    """
+
+    SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+
+    def __init__(self, path: Path | None, compression: str, noise: re.Pattern[bytes] | None = None,
+                 tail_lines: int = DEFAULT_LOG_TAIL_LINES, on_chunk=None):
+        self.path = path.with_name(path.name + self.SUFFIXES[compression]) if path else None
+        self.tail: deque[bytes] = deque(maxlen=tail_lines)
+        self.suppressed = 0
+        self._noise = noise
+        self._on_chunk = on_chunk
+        self._partial = b""
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._sink = None
+        if self.path is None:
+            return
+        if compression == "zstd":
+            self._sink = zstandard.ZstdCompressor(level=3).stream_writer(self.path.open("wb"))
+        elif compression == "gzip":
+            self._sink = gzip.open(self.path, "wb", compresslevel=3)
+        else:
+            self._sink = self.path.open("wb")
+
+    def feed(self, data: bytes):
+        with self._lock:
+            if self._closed:
+                return
+            data = self._partial + data
+            cut = data.rfind(b"\n") + 1
+            self._partial = data[cut:]
+            if cut:
+                self._process(data[:cut])
+            if len(self._partial) > LOG_READ_CHUNK:
+                # A single enormous line: pass it through unfiltered rather than buffer it
+                self._process(self._partial, complete=False)
+                self._partial = b""
+
+    def _process(self, chunk: bytes, complete: bool = True):
+        if complete and self._noise:
+            chunk, removed = self._noise.subn(b"", chunk)
+            self.suppressed += removed
+            if not chunk:
+                return
+        if self._on_chunk:
+            self._on_chunk(chunk)
+        if self._sink:
+            self._sink.write(chunk)
+        maxlen = self.tail.maxlen or 0
+        if maxlen:
+            # rsplit with a limit only scans the end of the chunk
+            lines = chunk.rstrip(b"\n").rsplit(b"\n", maxlen)
+            self.tail.extend(lines[1:] if len(lines) > maxlen else lines)
+
+    def pump(self, pipe):
+        """Copy `pipe` into the log until EOF, then close the log."""
+        fd = pipe.fileno()
+        try:
+            while data := os.read(fd, LOG_READ_CHUNK):
+                self.feed(data)
+        except OSError:
+            pass
+        finally:
+            pipe.close()
+            self.close()
+
+    def start(self, pipe):
+        """Pump `pipe` on a background thread."""
+        self._thread = threading.Thread(target=self.pump, args=(pipe,), daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: float = 5.0):
+        if self._thread:
+            self._thread.join(timeout)
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            if self._partial:
+                self._process(self._partial + b"\n")
+                self._partial = b""
+            self._closed = True
+            if self._sink:
+                self._sink.close()
+
+    def tail_lines(self) -> list[str]:
+        return [line.decode("utf-8", errors="replace") for line in self.tail]
+
+
+# =============================================================================
+# Reporting: console output, summary.json and Pushgateway metrics
+# =============================================================================
+
+def log(msg: str, level: str = "INFO"):
+    """Print a timestamped log message."""
+    ts = dt.datetime.now(dt.timezone.utc).strftime("%H:%M:%S")
+    print(f"[{ts}] [{level}] {msg}")
+
+
+def log_test_status(test_name: str, status: TestStatus, duration: float = 0.0, error: str = ""):
+    """Print test status in a consistent format."""
+    status_icons = {
+        TestStatus.PASSED: "✓ PASS",
+        TestStatus.FAILED: "✗ FAIL",
+        TestStatus.TIMEOUT: "⏱ TIMEOUT",
+        TestStatus.SKIPPED: "○ SKIP",
+        TestStatus.RUNNING: "▶ RUN",
+        TestStatus.PENDING: "○ PEND",
+    }
+    icon = status_icons.get(status, "?")
+    duration_str = f" ({duration:.1f}s)" if duration > 0 else ""
+    error_str = f" - {error}" if error else ""
+    log(f"{icon}: {test_name}{duration_str}{error_str}")
+
+
+def load_tests_from_file(path: Path) -> list[str]:
+    """Load test names from a file, ignoring comments and blank lines."""
+    tests = []
+    with path.open() as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                tests.append(line)
+    return tests
+
+
+def write_summary_json(state: RunnerState, path: Path, extra: dict | None = None):
+    """Write machine-readable summary; `extra` adds top-level keys."""
+    summary = {
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "shard": state.shard or None,
+        "total": len(state.results),
+        "passed": sum(1 for r in state.results if r.status == TestStatus.PASSED),
+        "failed": sum(1 for r in state.results if r.status == TestStatus.FAILED),
+        "timeout": sum(1 for r in state.results if r.status == TestStatus.TIMEOUT),
+        "skipped": sum(1 for r in state.results if r.status == TestStatus.SKIPPED),
+        "quarantined": [r.name for r in state.results if r.quarantined],
+        "flaky": [r.name for r in state.results if r.flaky],
+        "phases": {name: round(seconds, 3) for name, seconds in state.phases.items()},
+        "tests": [
+            {
+                "name": r.name,
+                "status": r.status.value,
+                "exit_code": r.exit_code,
+                "duration_s": r.duration_s,
+                "error": r.error_msg,
+                "log_dir": str(r.log_dir) if r.log_dir else None,
+                "phases": {name: round(seconds, 3) for name, seconds in r.phases.items()},
+                "subtests": r.subtests,
+                "log_tail": r.log_tail,
+                "metrics": r.metrics,
+                "resources": r.resources,
+                "profile": r.profile,
+                "divergence": r.divergence,
+                "attempts": [*r.attempts, r.attempt_record()],
+                "flake_rate": r.flake_rate,
+                "quarantined": r.quarantined,
+            }
+            for r in state.results
+        ],
+        **(extra or {}),
+    }
+    with path.open("w") as f:
+        json.dump(summary, f, indent=2)
+
+
+PUSHGATEWAY_JOB = "nethermind_comparison"
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus_metrics(state: RunnerState) -> str:
+    """Render run results in the Prometheus text exposition format."""
+    lines = [
+        "# HELP nethermind_comparison_tests Number of comparison tests by final status; "
+        "quarantined failures do not fail the run and are not counted as failed or timeout.",
+        "# TYPE nethermind_comparison_tests gauge",
+    ]
+    for status in (TestStatus.PASSED, TestStatus.FAILED, TestStatus.TIMEOUT, TestStatus.SKIPPED):
+        count = sum(1 for r in state.results if r.status == status and not r.quarantined)
+        lines.append(f'nethermind_comparison_tests{{status="{status.value}"}} {count}')
+    quarantined = sum(1 for r in state.results if r.quarantined)
+    lines.append(f'nethermind_comparison_tests{{status="quarantined"}} {quarantined}')
+
+    lines += [
+        "# HELP nethermind_comparison_run_phase_seconds Run-level phase durations.",
+        "# TYPE nethermind_comparison_run_phase_seconds gauge",
+    ]
+    for phase, seconds in state.phases.items():
+        lines.append(f'nethermind_comparison_run_phase_seconds{{phase="{_prom_label(phase)}"}} {seconds:.3f}')
+
+    lines += [
+        "# HELP nethermind_comparison_test_duration_seconds Duration of each comparison test.",
+        "# TYPE nethermind_comparison_test_duration_seconds gauge",
+    ]
+    for r in state.results:
+        if r.status in (TestStatus.PENDING, TestStatus.SKIPPED):
+            continue
+        lines.append(
+            f'nethermind_comparison_test_duration_seconds{{test="{_prom_label(r.name)}",'
+            f'status="{r.status.value}"}} {r.duration_s:.3f}'
+        )
+
+    lines += [
+        "# HELP nethermind_comparison_test_phase_seconds Duration of each phase of a comparison test.",
+        "# TYPE nethermind_comparison_test_phase_seconds gauge",
+    ]
+    for r in state.results:
+        for phase, seconds in r.phases.items():
+            lines.append(
+                f'nethermind_comparison_test_phase_seconds{{test="{_prom_label(r.name)}",'
+                f'phase="{_prom_label(phase)}"}} {seconds:.3f}'
+            )
+
+    lines += [
+        "# HELP nethermind_comparison_last_run_timestamp_seconds Unix time the run finished.",
+        "# TYPE nethermind_comparison_last_run_timestamp_seconds gauge",
+        f"nethermind_comparison_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def push_metrics(pushgateway_url: str, state: RunnerState) -> bool:
+    """Replace this job's metric group on the Pushgateway. Failures are logged, not fatal.
+
+    A --shard run groups under shard="i_of_N" as well, so shards do not
+    overwrite each other's metrics.
+    """
+    url = f"{pushgateway_url.rstrip('/')}/metrics/job/{PUSHGATEWAY_JOB}"
+    if state.shard:
+        url += f"/shard/{state.shard.replace('/', '_of_')}"
+    request = urllib.request.Request(
+        url, data=format_prometheus_metrics(state).encode(), method="PUT",
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+    except (OSError, http.client.HTTPException) as e:
+        log(f"Failed to push metrics to {url}: {e}", "WARN")
+        return False
+    log(f"Pushed metrics to {url}")
+    return True
+
+
+def print_summary(state: RunnerState):
+    """Print test summary."""
+    print("\n" + "=" * 60)
+    print("TEST SUMMARY")
+    print("=" * 60)
+
+    passed = sum(1 for r in state.results if r.status == TestStatus.PASSED)
+    failed = sum(1 for r in state.results if r.status == TestStatus.FAILED)
+    timeout = sum(1 for r in state.results if r.status == TestStatus.TIMEOUT)
+    skipped = sum(1 for r in state.results if r.status == TestStatus.SKIPPED)
+    total = len(state.results)
+
+    print(f"Total: {total} | Passed: {passed} | Failed: {failed} | Timeout: {timeout} | Skipped: {skipped}")
+
+    failed_tests = [r for r in state.results if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT)]
+    if any(not r.quarantined for r in failed_tests):
+        print("\nFAILED TESTS:")
+        for r in failed_tests:
+            if not r.quarantined:
+                reason = f"exit code {r.exit_code}" if r.exit_code else r.error_msg or r.status.value
+                print(f"  - {r.name}: {reason}")
+
+    quarantined = [r for r in failed_tests if r.quarantined]
+    if quarantined:
+        print("\nQUARANTINED (known flaky, not failing the run):")
+        for r in quarantined:
+            print(f"  - {r.name}: {r.status.value}, flake rate {r.flake_rate:.0%}")
+
+    flaky = [r for r in state.results if r.flaky]
+    if flaky:
+        print("\nPASSED ON RETRY:")
+        for r in flaky:
+            print(f"  - {r.name}: {len(r.attempts) + 1} attempts")
+
+    print("=" * 60)
+
+
+class NullWriter:
+    def write(self, *args, **kwargs): pass
+    def flush(self): pass
+
+
+def make_log_dir(prefix: str) -> Path:
+    ts = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%d-%H%M%S")
+    log_dir = Path("/tmp") / f"{prefix}-{ts}"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return log_dir
+
+
+def install_signal_handlers(state: RunnerState):
+    """Turn SIGINT/SIGTERM into a cooperative stop of the run."""
+    def signal_handler(sig, frame):
+        state.interrupted = True
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+
+def open_runner_log(log_dir: Path | None):
+    if log_dir:
+        return (log_dir / "runner.log").open("w", encoding="utf-8")
+    return contextlib.nullcontext(NullWriter())
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
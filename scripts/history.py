@@ -0,0 +1,145 @@
+"""
+Run history for --history: per-test durations and outcomes kept in a local
+SQLite DB, used to schedule slow tests first (--order history) and to
+estimate how flaky each test is.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import sqlite3
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+
+from common import DEFAULT_DATA_DIR, TestResult, TestStatus
+
+
+# =============================================================================
+# Run history: per-test durations/outcomes and history-based scheduling
+# =============================================================================
+
+HISTORY_DB_PATH = DEFAULT_DATA_DIR / "comparison-history.sqlite"
+# Number of most recent attempts used to estimate a test's duration
+HISTORY_WINDOW = 5
+# Runs used for flake rates, and the fewest runs a rate is reported for
+FLAKE_WINDOW = 20
+FLAKE_MIN_RUNS = 5
+
+
+@dataclass
+class TestHistoryStats:
+    expected_duration_s: float
+    last_status: str
+    runs: int
+
+
+class TestHistory:
+    """Append-only SQLite log of test outcomes, shared by all runs on this machine."""
+
+    def __init__(self, path: Path = HISTORY_DB_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS test_runs (
+                run_id TEXT NOT NULL,
+                test TEXT NOT NULL,
+                status TEXT NOT NULL,
+                duration_s REAL NOT NULL,
+                finished_at TEXT NOT NULL,
+                phases TEXT NOT NULL DEFAULT '{}',
+                attempt INTEGER NOT NULL DEFAULT 1
+            )"""
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(test_runs)")}
+        if "attempt" not in columns:
+            # Databases from before retries: every row was the only attempt
+            self.conn.execute("ALTER TABLE test_runs ADD COLUMN attempt INTEGER NOT NULL DEFAULT 1")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS test_runs_by_test ON test_runs (test, finished_at)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, run_id: str, results: list[TestResult]):
+        """Append every attempt of every test that actually ran, last attempt last."""
+        finished_at = dt.datetime.now(dt.timezone.utc).isoformat()
+        rows = []
+        for r in results:
+            if r.status in (TestStatus.PENDING, TestStatus.RUNNING, TestStatus.SKIPPED):
+                continue
+            for a in r.attempts:
+                rows.append((run_id, r.name, a["status"], a["duration_s"], finished_at,
+                             json.dumps(a["phases"]), a["attempt"]))
+            rows.append((run_id, r.name, r.status.value, r.duration_s, finished_at, json.dumps(r.phases), r.attempt))
+        self.conn.executemany(
+            "INSERT INTO test_runs (run_id, test, status, duration_s, finished_at, phases, attempt) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.commit()
+
+    def stats(self, tests: list[str]) -> dict[str, TestHistoryStats]:
+        """Median duration of the last HISTORY_WINDOW attempts and the latest status per test."""
+        stats = {}
+        for test in tests:
+            rows = self.conn.execute(
+                "SELECT status, duration_s FROM test_runs WHERE test = ? ORDER BY finished_at DESC, rowid DESC LIMIT ?",
+                (test, HISTORY_WINDOW),
+            ).fetchall()
+            if rows:
+                stats[test] = TestHistoryStats(
+                    expected_duration_s=statistics.median(duration for _, duration in rows),
+                    last_status=rows[0][0],
+                    runs=len(rows),
+                )
+        return stats
+
+    def flake_rates(self, tests: list[str]) -> dict[str, float]:
+        """Share of outcome changes across a test's last FLAKE_WINDOW runs.
+
+        A run's outcome is its final attempt. Each pass/fail flip between consecutive runs counts as
+        a change, as does a run whose failed attempt passed on retry; the count is divided by the
+        number of transitions in the window. Tests with fewer than FLAKE_MIN_RUNS runs are left out.
+        """
+        rates = {}
+        for test in tests:
+            rows = self.conn.execute(
+                """SELECT run_id, status = 'passed' FROM test_runs
+                   WHERE test = ? AND run_id IN (
+                       SELECT run_id FROM test_runs WHERE test = ?
+                       GROUP BY run_id ORDER BY MAX(finished_at) DESC, MAX(rowid) DESC LIMIT ?)
+                   ORDER BY finished_at, rowid""",
+                (test, test, FLAKE_WINDOW),
+            ).fetchall()
+            runs: dict[str, list[bool]] = {}
+            for run_id, passed in rows:
+                runs.setdefault(run_id, []).append(bool(passed))
+            if len(runs) < FLAKE_MIN_RUNS:
+                continue
+            outcomes = [attempts[-1] for attempts in runs.values()]
+            changes = sum(1 for prev, cur in zip(outcomes, outcomes[1:]) if prev != cur)
+            changes += sum(1 for attempts in runs.values() if len(set(attempts)) > 1)
+            rates[test] = min(1.0, changes / (len(runs) - 1))
+        return rates
+
+
+def order_by_history(tests: list[str], stats: dict[str, TestHistoryStats]) -> list[str]:
+    """Order tests for fast feedback and short wall-clock time.
+
+    Tests that failed last time go first, then everything else
+    longest-processing-time-first. Tests without history are estimated at
+    the mean known duration; ties keep file order.
+    """
+    known = [s.expected_duration_s for s in stats.values()]
+    default_estimate = statistics.mean(known) if known else 0.0
+
+    def sort_key(item: tuple[int, str]):
+        index, test = item
+        test_stats = stats.get(test)
+        failed_last = test_stats is not None and test_stats.last_status != TestStatus.PASSED.value
+        estimate = test_stats.expected_duration_s if test_stats else default_estimate
+        return (not failed_last, -estimate, index)
+
+    return [test for _, test in sorted(enumerate(tests), key=sort_key)]
@@ -0,0 +1,334 @@
+"""
+Concurrent read load during ingestion (`load` subcommand): fires a mix of
+eth_* reads at a target rate while a recording is digested and reports
+read latency alongside digest throughput.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import datetime as dt
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+import contextlib
+
+from bench import summarize_digest_samples
+from common import (
+    ROOT_DIR, RunnerState, TestResult, TestStatus, git_output, install_signal_handlers, log, make_log_dir,
+    open_runner_log, percentile, phase_timer, print_summary, write_summary_json,
+)
+from nitro_rpc import AsyncRpcClient, RpcError
+from replay import (
+    RECORDINGS_DIR, DigestSample, ReplayRunner, load_recording_expectations, parse_quantity, resolve_recordings,
+)
+from runner import add_node_arguments, resolve_node_arguments
+
+
+# =============================================================================
+# Concurrent read load during ingestion
+# =============================================================================
+
+READ_LOAD_KINDS = ("resultAtMessageIndex", "headMessageIndex", "messageIndexToBlockNumber", "eth_call",
+                   "eth_getBalance")
+DEFAULT_READ_MIX = "resultAtMessageIndex=3,headMessageIndex=2,messageIndexToBlockNumber=2,eth_call=2,eth_getBalance=1"
+DEFAULT_READ_RATE = 200.0
+DEFAULT_READ_WORKERS = 32
+# How often the load generator learns the head it picks message indexes below
+READ_HEAD_REFRESH_S = 0.25
+# Inclusive upper bounds in ms of the read latency histogram buckets; one more bucket holds the rest
+READ_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+# Scheduled reads allowed to queue per worker before further ones are dropped
+READ_BACKLOG_PER_WORKER = 100
+# ArbSys.arbBlockNumber(): a precompile call every Arbitrum chain answers
+ARBSYS_ADDRESS = "0x0000000000000000000000000000000000000064"
+ARBSYS_ARB_BLOCK_NUMBER = "0xa3b1b31d"
+
+
+def parse_read_mix(value: str) -> dict[str, float]:
+    """argparse type for --mix: comma-separated kind=weight from READ_LOAD_KINDS."""
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.strip().partition("=")
+        if kind not in READ_LOAD_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown read {kind!r}; choose from {', '.join(READ_LOAD_KINDS)}")
+        try:
+            mix[kind] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight in {item!r}") from None
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return {kind: weight for kind, weight in mix.items() if weight > 0}
+
+
+def read_call(kind: str, head: int, rng: random.Random) -> tuple[str, list]:
+    """JSON-RPC method and params of one read of `kind`, for a chain whose head message is `head`."""
+    index = rng.randint(0, head)
+    if kind == "resultAtMessageIndex":
+        return "nitroexecution_resultAtMessageIndex", [index]
+    if kind == "headMessageIndex":
+        return "nitroexecution_headMessageIndex", []
+    if kind == "messageIndexToBlockNumber":
+        return "arbitrum_messageIndexToBlockNumber", [index]
+    if kind == "eth_call":
+        return "eth_call", [{"to": ARBSYS_ADDRESS, "data": ARBSYS_ARB_BLOCK_NUMBER}, "latest"]
+    # Mostly absent accounts, so reads walk the state trie instead of hitting one cached leaf
+    return "eth_getBalance", ["0x" + rng.randbytes(20).hex(), "latest"]
+
+
+class ReadLoad:
+    """Drives a weighted mix of read RPCs at a target rate from many concurrent workers.
+
+    Runs its own event loop on a background thread while the caller digests
+    messages. Arrivals are open-loop: reads are scheduled at `rate` per
+    second and their latency counts from the scheduled time, so a stalled
+    node shows up as queueing delay instead of quietly lowering the offered
+    load. With rate 0 every worker issues reads back to back.
+    """
+
+    def __init__(self, url: str, mix: dict[str, float], rate: float, workers: int):
+        self.url = url
+        self.rate = rate
+        self.workers = workers
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+        self.latencies: dict[str, list[float]] = {kind: [] for kind in mix}
+        self.errors = dict.fromkeys(mix, 0)
+        self.dropped = 0
+        self.elapsed_s = 0.0
+        self._head = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="read-load", daemon=True)
+
+    def __enter__(self) -> ReadLoad:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    async def _run(self):
+        rng = random.Random(0)
+        backlog = asyncio.Queue(maxsize=self.workers * READ_BACKLOG_PER_WORKER) if self.rate > 0 else None
+        start = time.perf_counter()
+        async with AsyncRpcClient(self.url, max_connections=self.workers + 1) as client:
+            tasks = [asyncio.create_task(self._follow_head(client))]
+            tasks += [asyncio.create_task(self._worker(client, backlog, rng)) for _ in range(self.workers)]
+            if backlog:
+                tasks.append(asyncio.create_task(self._schedule(backlog)))
+            while not self._stop.is_set():
+                await asyncio.sleep(0.05)
+            # Loops also check _stop: wait_for can swallow a cancel that races a completing read
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.elapsed_s = time.perf_counter() - start
+
+    async def _follow_head(self, client: AsyncRpcClient):
+        while not self._stop.is_set():
+            with contextlib.suppress(OSError, asyncio.TimeoutError, http.client.HTTPException, RpcError,
+                                     TypeError, ValueError):
+                self._head = parse_quantity(await client.head_message_index())
+            await asyncio.sleep(READ_HEAD_REFRESH_S)
+
+    async def _schedule(self, backlog: asyncio.Queue):
+        interval = 1 / self.rate
+        due = time.perf_counter()
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            # Enqueue every arrival that fell due, so a late wakeup does not lower the rate
+            while due <= now:
+                try:
+                    backlog.put_nowait(due)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+                due += interval
+            await asyncio.sleep(due - now)
+
+    async def _worker(self, client: AsyncRpcClient, backlog: asyncio.Queue | None, rng: random.Random):
+        while not self._stop.is_set():
+            scheduled = await backlog.get() if backlog else time.perf_counter()
+            kind = rng.choices(self.kinds, self.weights)[0]
+            method, params = read_call(kind, self._head, rng)
+            try:
+                await client.call(method, params)
+            except (OSError, asyncio.TimeoutError, http.client.HTTPException, RpcError, ValueError):
+                self.errors[kind] += 1
+                continue
+            self.latencies[kind].append(time.perf_counter() - scheduled)
+
+    def summary(self) -> dict:
+        """Per read kind and overall: count, rate, errors, latency percentiles and histogram."""
+        def describe(latencies: list[float], errors: int) -> dict:
+            latencies = sorted(latencies)
+            histogram = [0] * (len(READ_LATENCY_BUCKETS_MS) + 1)
+            for latency in latencies:
+                histogram[bisect.bisect_left(READ_LATENCY_BUCKETS_MS, latency * 1000)] += 1
+            return {
+                "reads": len(latencies),
+                "per_s": round(len(latencies) / self.elapsed_s, 1) if self.elapsed_s else 0.0,
+                "errors": errors,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+                "histogram": histogram,
+            }
+
+        return {
+            "offered_per_s": self.rate,
+            "workers": self.workers,
+            "dropped": self.dropped,
+            "histogram_buckets_ms": list(READ_LATENCY_BUCKETS_MS),
+            "total": describe([x for values in self.latencies.values() for x in values], sum(self.errors.values())),
+            "kinds": {kind: describe(self.latencies[kind], self.errors[kind]) for kind in self.kinds},
+        }
+
+    def metrics(self) -> dict[str, float]:
+        total = self.summary()["total"]
+        return {f"reads_{name}": value for name, value in total.items() if name != "histogram"}
+
+
+def digest_slowdown_pct(baseline: dict | None, loaded: dict | None) -> float | None:
+    """How much longer in % the mean digest took under read load; None without both summaries."""
+    if not baseline or not loaded or not baseline["mean_ms"]:
+        return None
+    return round((loaded["mean_ms"] / baseline["mean_ms"] - 1) * 100, 1)
+
+
+def load_main(argv: list[str]) -> int:
+    """`load` subcommand: read RPC load while recordings are digested."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} load",
+        description="Digest each recording once without and once with a concurrent mix of read RPCs, "
+                    "reporting read latency histograms and how much the reads slow ingestion down.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Read kinds for --mix: {', '.join(READ_LOAD_KINDS)}
+
+Examples:
+  %(prog)s 5__stylus                                   # {DEFAULT_READ_RATE:g} reads/s, {DEFAULT_READ_WORKERS} workers
+  %(prog)s --rate 2000 --workers 128 --messages 500 5__stylus
+  %(prog)s --rate 0 --mix eth_call=1,eth_getBalance=1  # Saturate with state reads
+        """,
+    )
+    parser.add_argument("recordings", nargs="*",
+                        help="Recording files or names (default: all recordings)")
+    parser.add_argument("--messages", type=int, default=0,
+                        help="Digest at most this many messages per recording (default: all)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_READ_RATE,
+                        help=f"Target reads per second, 0 for as fast as the workers go "
+                             f"(default: {DEFAULT_READ_RATE:g})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_READ_WORKERS,
+                        help=f"Concurrent read requests in flight (default: {DEFAULT_READ_WORKERS})")
+    parser.add_argument("--mix", type=parse_read_mix, default=parse_read_mix(DEFAULT_READ_MIX),
+                        help=f"Weighted read mix (default: {DEFAULT_READ_MIX})")
+    parser.add_argument("--no-baseline", dest="baseline", action="store_false",
+                        help="Skip the digest without reads; no slowdown is reported")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Write the report JSON here (default: load.json in the log directory)")
+    add_node_arguments(parser)
+    args = parser.parse_args(argv)
+    resolve_node_arguments(parser, args)
+
+    if args.workers < 1 or args.rate < 0:
+        print("Error: --workers must be at least 1 and --rate must not be negative", file=sys.stderr)
+        return 1
+    try:
+        recordings = resolve_recordings(args.recordings)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not recordings:
+        print(f"Error: No recordings found in {RECORDINGS_DIR}", file=sys.stderr)
+        return 1
+
+    variants = ("baseline", "reads") if args.baseline else ("reads",)
+    log_dir = None if args.no_logs else make_log_dir("nm-nitro-load")
+    state = RunnerState()
+    runs = [(recording, variant) for recording in recordings for variant in variants]
+    for recording, variant in runs:
+        state.results.append(TestResult(name=f"{recording.name}:{variant}"))
+    install_signal_handlers(state)
+
+    report: dict[str, dict] = {recording.name: {} for recording in recordings}
+    with open_runner_log(log_dir) as runner_log:
+        runner = ReplayRunner(args, state, runner_log)
+        with phase_timer(state.phases, "build"):
+            build_succeeded = runner.build_nethermind()
+        if not build_succeeded:
+            return 1
+
+        log(f"Read load on {len(recordings)} recording(s): {args.rate:g} reads/s, {args.workers} workers, "
+            f"mix {args.mix}")
+        print("-" * 60)
+        for (recording, variant), result in zip(runs, state.results):
+            if state.interrupted:
+                result.status = TestStatus.SKIPPED
+                continue
+            run_dir = None
+            if log_dir:
+                run_dir = log_dir / variant
+                run_dir.mkdir(exist_ok=True)
+            samples: list[DigestSample] = []
+            read_load = ReadLoad(runner.rpc_url, args.mix, args.rate, args.workers) if variant == "reads" else None
+            runner.replay(result, recording, load_recording_expectations(recording), run_dir, args.messages,
+                          samples=samples, read_load=read_load)
+            if result.status == TestStatus.PASSED:
+                report[recording.name][variant] = summarize_digest_samples(samples)
+                if read_load:
+                    report[recording.name]["read_load"] = read_load.summary()
+
+        print_summary(state)
+        if log_dir:
+            write_summary_json(state, log_dir / "summary.json")
+
+    for name, entry in report.items():
+        slowdown = digest_slowdown_pct(entry.get("baseline"), entry.get("reads"))
+        if slowdown is not None:
+            entry["slowdown_pct"] = slowdown
+
+    print(f"\n{'recording':<28} {'digest':<8} {'msgs/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'slowdown':>9}")
+    for name, entry in report.items():
+        for variant in variants:
+            if variant in entry:
+                stats = entry[variant]
+                slowdown = f"{entry['slowdown_pct']:+8.1f}%" if variant == "reads" and "slowdown_pct" in entry else ""
+                print(f"{name:<28} {variant:<8} {stats['msgs_per_s']:>9.1f} {stats['p50_ms']:>8.2f} "
+                      f"{stats['p99_ms']:>8.2f} {slowdown:>9}")
+
+    bounds = [f"<={bound}" for bound in READ_LATENCY_BUCKETS_MS] + [f">{READ_LATENCY_BUCKETS_MS[-1]}"]
+    for name, entry in report.items():
+        reads = entry.get("read_load")
+        if not reads:
+            continue
+        offered = f"offered {reads['offered_per_s']:g}/s" if reads["offered_per_s"] else "back to back"
+        print(f"\n{name}: reads (ms; {offered}, {reads['workers']} workers, dropped {reads['dropped']})")
+        print(f"{'read':<26} {'n':>7} {'/s':>7} {'err':>5} {'p50':>8} {'p99':>8} {'max':>8}  "
+              + " ".join(f"{bound:>6}" for bound in bounds))
+        for kind, stats in [*reads["kinds"].items(), ("total", reads["total"])]:
+            print(f"{kind:<26} {stats['reads']:>7} {stats['per_s']:>7.1f} {stats['errors']:>5} "
+                  f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}  "
+                  + " ".join(f"{count:>6}" for count in stats["histogram"]))
+
+    output = args.output or (log_dir / "load.json" if log_dir else None)
+    if output:
+        output.write_text(json.dumps({
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "commit": git_output(ROOT_DIR, "rev-parse", "HEAD").strip(),
+            "rate": args.rate,
+            "workers": args.workers,
+            "mix": args.mix,
+            "messages": args.messages,
+            "recordings": report,
+        }, indent=2) + "\n")
+        print(f"\nResults: {output}")
+
+    failed = sum(1 for r in state.results if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT))
+    return 1 if failed or state.interrupted else 0
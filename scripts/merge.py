@@ -0,0 +1,178 @@
+"""
+CI sharding (--shard) and the `merge` subcommand that combines the
+summary.json of every shard into one report.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+
+from common import (
+    RunnerState, TestResult, TestStatus, load_tests_from_file, log, print_summary, push_metrics, write_summary_json,
+)
+
+
+# =============================================================================
+# CI sharding: split the test list across jobs and merge their summaries
+# =============================================================================
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """argparse type for --shard: "i/N" with 1 <= i <= N."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}") from None
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def load_shard_durations(path: Path) -> dict[str, float]:
+    """Test durations recorded in a summary.json, for balancing shards."""
+    with path.open() as f:
+        tests = json.load(f).get("tests", [])
+    return {t["name"]: t["duration_s"] for t in tests
+            if t["status"] not in (TestStatus.PENDING.value, TestStatus.SKIPPED.value)}
+
+
+def shard_tests(tests: list[str], index: int, count: int, durations: dict[str, float]) -> list[str]:
+    """Tests of shard `index` (1-based) out of `count`, in their original order.
+
+    With durations, tests are dealt longest first to the least loaded shard
+    (unknown tests estimated at the mean known duration). Without, tests are
+    dealt round-robin in the order of a hash of their names. Both depend only
+    on the inputs, so every host computes the same partition as long as it
+    sees the same test list and durations.
+    """
+    known = [durations[t] for t in tests if t in durations]
+    if known:
+        default_estimate = statistics.mean(known)
+        ranked = sorted(set(tests), key=lambda t: (-durations.get(t, default_estimate), t))
+        loads = [0.0] * count
+        owner = {}
+        for test in ranked:
+            shard = min(range(count), key=lambda i: (loads[i], i))
+            loads[shard] += durations.get(test, default_estimate)
+            owner[test] = shard
+    else:
+        ranked = sorted(set(tests), key=lambda t: hashlib.sha256(t.encode()).digest())
+        owner = {test: position % count for position, test in enumerate(ranked)}
+    return [t for t in tests if owner[t] == index - 1]
+
+
+def result_from_summary(entry: dict) -> TestResult:
+    """Rebuild a TestResult from its entry in summary.json (see write_summary_json)."""
+    attempts = entry.get("attempts") or []
+    return TestResult(
+        name=entry["name"],
+        status=TestStatus(entry["status"]),
+        exit_code=entry.get("exit_code"),
+        duration_s=entry.get("duration_s", 0.0),
+        error_msg=entry.get("error") or "",
+        log_dir=Path(entry["log_dir"]) if entry.get("log_dir") else None,
+        phases=entry.get("phases") or {},
+        subtests=entry.get("subtests") or {},
+        log_tail=entry.get("log_tail") or {},
+        metrics=entry.get("metrics") or {},
+        resources=entry.get("resources") or {},
+        profile=entry.get("profile") or {},
+        divergence=entry.get("divergence") or {},
+        attempt=attempts[-1]["attempt"] if attempts else 1,
+        attempts=attempts[:-1],
+        flake_rate=entry.get("flake_rate"),
+        quarantined=entry.get("quarantined", False),
+    )
+
+
+def merge_main(argv: list[str]) -> int:
+    """`merge` subcommand: combine the summary.json files of --shard runs into one report."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} merge",
+        description="Merge the summary.json files of sharded runs into one summary and exit code. "
+                    "Fails if a shard is missing, shards overlap, or any non-quarantined test failed. "
+                    "Run phases are summed over shards, except total, which is the slowest shard's.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s shard-*/summary.json --output summary.json
+  %(prog)s /tmp/nm-nitro-compare-* --test-file scripts/comparison_tests.txt
+        """,
+    )
+    parser.add_argument("summaries", nargs="+", type=Path,
+                        help="summary.json files, or run log directories containing one")
+    parser.add_argument("--output", type=Path, default=None, help="Write the merged summary.json here")
+    parser.add_argument("--test-file", type=Path, default=None,
+                        help="Also fail if a test listed in this file is in no shard")
+    parser.add_argument("--pushgateway", default=os.environ.get("PUSHGATEWAY_URL", ""),
+                        help="Prometheus Pushgateway URL to push the merged results to")
+    args = parser.parse_args(argv)
+
+    state = RunnerState()
+    shards = []
+    errors = []
+    seen: dict[str, str] = {}
+    for path in args.summaries:
+        if path.is_dir():
+            path = path / "summary.json"
+        try:
+            with path.open() as f:
+                summary = json.load(f)
+            results = [result_from_summary(entry) for entry in summary["tests"]]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Cannot read {path}: {e}", file=sys.stderr)
+            return 1
+        shard = summary.get("shard") or ""
+        shards.append({"shard": shard or None, "summary": str(path), "total": len(results),
+                       "phases": summary.get("phases", {})})
+        for result in results:
+            if result.name in seen:
+                errors.append(f"{result.name} ran in both {seen[result.name]} and {path}")
+                continue
+            seen[result.name] = str(path)
+            state.results.append(result)
+        for name, seconds in summary.get("phases", {}).items():
+            if name == "total":
+                state.phases[name] = max(state.phases.get(name, 0.0), seconds)
+            else:
+                state.phases[name] = state.phases.get(name, 0.0) + seconds
+
+    counts = {int(s["shard"].split("/")[1]) for s in shards if s["shard"]}
+    if len(counts) > 1:
+        errors.append(f"Summaries come from different shard counts: {sorted(counts)}")
+    elif counts:
+        count = counts.pop()
+        indices = [int(s["shard"].split("/")[0]) for s in shards if s["shard"]]
+        missing = sorted(set(range(1, count + 1)) - set(indices))
+        if missing:
+            errors.append(f"Missing shard(s): {', '.join(f'{i}/{count}' for i in missing)}")
+        if len(indices) != len(set(indices)):
+            errors.append("The same shard was given more than once")
+    if args.test_file:
+        unrun = [t for t in load_tests_from_file(args.test_file) if t not in seen]
+        if unrun:
+            errors.append(f"{len(unrun)} test(s) from {args.test_file} in no shard: {', '.join(unrun[:10])}"
+                          + (" ..." if len(unrun) > 10 else ""))
+
+    print(f"{'shard':<8} {'tests':>6} {'total s':>9}  summary")
+    for shard in shards:
+        print(f"{shard['shard'] or '-':<8} {shard['total']:>6} {shard['phases'].get('total', 0.0):>9.1f}  "
+              f"{shard['summary']}")
+    print_summary(state)
+    for error in errors:
+        log(error, "ERROR")
+
+    if args.output:
+        write_summary_json(state, args.output, {"shards": shards, "errors": errors})
+        print(f"\nResults: {args.output}")
+    if args.pushgateway:
+        push_metrics(args.pushgateway, state)
+
+    failed = sum(1 for r in state.results
+                 if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT) and not r.quarantined)
+    return 1 if failed or errors else 0
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+JSON-RPC clients for the Nethermind.Arbitrum execution API.
+
+RpcClient keeps one keep-alive HTTP connection per thread and supports
+batch requests; AsyncRpcClient keeps a pool of connections so many requests
+can be in flight at once. Both expose the `nitroexecution_*` and
+`arbitrum_*` methods documented in docs/RPC-API.md as Python methods, and
+`call` for anything else (e.g. `eth_*`).
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import http.client
+import itertools
+import json
+import threading
+import urllib.parse
+from typing import Iterable
+
+DEFAULT_TIMEOUT_S = 10.0
+DEFAULT_MAX_CONNECTIONS = 8
+
+# Raised when a keep-alive connection turns out to be closed by the server
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError,
+                            ConnectionAbortedError)
+
+
+class RpcError(Exception):
+    """JSON-RPC error response returned by Nethermind."""
+
+    def __init__(self, method: str, error: dict):
+        self.method = method
+        self.code = error.get("code")
+        super().__init__(f"{method} failed ({self.code}): {error.get('message', error)}")
+
+
+# =============================================================================
+# Request encoding shared by both clients
+# =============================================================================
+
+_request_ids = itertools.count(1)
+
+
+def _encode_call(method: str, params: list | None) -> tuple[int, bytes]:
+    request_id = next(_request_ids)
+    payload = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or []}
+    return request_id, json.dumps(payload).encode()
+
+
+def _encode_batch(calls: list[tuple[str, list | None]]) -> tuple[list[int], bytes]:
+    ids = [next(_request_ids) for _ in calls]
+    payload = [
+        {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or []}
+        for request_id, (method, params) in zip(ids, calls)
+    ]
+    return ids, json.dumps(payload).encode()
+
+
+def _decode_call(method: str, body: bytes):
+    response = json.loads(body)
+    if response.get("error"):
+        raise RpcError(method, response["error"])
+    return response.get("result")
+
+
+def _decode_batch(calls: list[tuple[str, list | None]], ids: list[int], body: bytes, return_errors: bool) -> list:
+    """Results in request order. Errors raise, or are returned as RpcError if `return_errors`."""
+    responses = json.loads(body)
+    if isinstance(responses, dict):
+        # The whole batch was rejected
+        raise RpcError("batch", responses.get("error") or {"message": responses})
+    by_id = {response.get("id"): response for response in responses}
+    results = []
+    for request_id, (method, _) in zip(ids, calls):
+        response = by_id.get(request_id, {"error": {"message": "missing from batch response"}})
+        if response.get("error"):
+            error = RpcError(method, response["error"])
+            if not return_errors:
+                raise error
+            results.append(error)
+        else:
+            results.append(response.get("result"))
+    return results
+
+
+# =============================================================================
+# Typed methods
+# =============================================================================
+
+class ExecutionMethods(abc.ABC):
+    """The execution API as methods on top of `call`.
+
+    For AsyncRpcClient every method returns an awaitable, since `call` does.
+    """
+
+    @abc.abstractmethod
+    def call(self, method: str, params: list | None = None, *, timeout: float | None = None):
+        """Send one request and return its result, raising RpcError for an error response."""
+
+    # nitroexecution namespace: flat parameters, the interface Nitro uses
+
+    def digest_message(self, msg_idx: int, message: dict, message_for_prefetch: dict | None = None,
+                       *, timeout: float | None = None):
+        return self.call("nitroexecution_digestMessage", [msg_idx, message, message_for_prefetch], timeout=timeout)
+
+    def reorg(self, msg_idx_of_first_msg_to_add: int, new_messages: list[dict], old_messages: list[dict] | None = None,
+              *, timeout: float | None = None):
+        return self.call("nitroexecution_reorg", [msg_idx_of_first_msg_to_add, new_messages, old_messages or []],
+                         timeout=timeout)
+
+    def result_at_message_index(self, message_index: int):
+        return self.call("nitroexecution_resultAtMessageIndex", [message_index])
+
+    def head_message_index(self, *, timeout: float | None = None):
+        return self.call("nitroexecution_headMessageIndex", timeout=timeout)
+
+    def message_index_to_block_number(self, message_index: int):
+        return self.call("nitroexecution_messageIndexToBlockNumber", [message_index])
+
+    def block_number_to_message_index(self, block_number: int):
+        return self.call("nitroexecution_blockNumberToMessageIndex", [block_number])
+
+    def set_finality_data(self, safe: dict | None = None, finalized: dict | None = None,
+                          validated: dict | None = None):
+        return self.call("nitroexecution_setFinalityData", [safe, finalized, validated])
+
+    def set_consensus_sync_data(self, sync_data: dict):
+        return self.call("nitroexecution_setConsensusSyncData", [sync_data])
+
+    def mark_feed_start(self, to: int):
+        return self.call("nitroexecution_markFeedStart", [to])
+
+    def trigger_maintenance(self, *, timeout: float | None = None):
+        return self.call("nitroexecution_triggerMaintenance", timeout=timeout)
+
+    def should_trigger_maintenance(self):
+        return self.call("nitroexecution_shouldTriggerMaintenance")
+
+    def maintenance_status(self):
+        return self.call("nitroexecution_maintenanceStatus")
+
+    # arbitrum namespace: wrapped parameters plus development tools
+
+    def digest_init_message(self, initial_l1_base_fee: int | str, serialized_chain_config: str,
+                            *, timeout: float | None = None):
+        message = {"initialL1BaseFee": initial_l1_base_fee, "serializedChainConfig": serialized_chain_config}
+        return self.call("arbitrum_digestInitMessage", [message], timeout=timeout)
+
+    def arbitrum_digest_message(self, index: int, message: dict, message_for_prefetch: dict | None = None,
+                                *, timeout: float | None = None):
+        parameters = {"index": index, "message": message, "messageForPrefetch": message_for_prefetch}
+        return self.call("arbitrum_digestMessage", [parameters], timeout=timeout)
+
+    def arbitrum_reorg(self, msg_idx_of_first_msg_to_add: int, new_messages: list[dict],
+                       old_messages: list[dict] | None = None, *, timeout: float | None = None):
+        parameters = {"number": msg_idx_of_first_msg_to_add, "message": new_messages,
+                      "messageForPrefetch": old_messages or []}
+        return self.call("arbitrum_reorg", [parameters], timeout=timeout)
+
+    def arbitrum_set_finality_data(self, safe: dict | None = None, finalized: dict | None = None,
+                                   validated: dict | None = None):
+        parameters = {"safeFinalityData": safe, "finalizedFinalityData": finalized,
+                      "validatedFinalityData": validated}
+        return self.call("arbitrum_setFinalityData", [parameters])
+
+    def synced(self):
+        return self.call("arbitrum_synced")
+
+    def full_sync_progress_map(self):
+        return self.call("arbitrum_fullSyncProgressMap")
+
+    def arbos_version_for_message_index(self, message_index: int):
+        return self.call("arbitrum_arbOSVersionForMessageIndex", [message_index])
+
+
+# =============================================================================
+# Blocking client
+# =============================================================================
+
+class RpcClient(ExecutionMethods):
+    """Blocking client with one persistent connection per calling thread."""
+
+    def __init__(self, url: str, timeout: float = DEFAULT_TIMEOUT_S):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: list[http.client.HTTPConnection] = []
+        self._connections_lock = threading.Lock()
+
+    def call(self, method: str, params: list | None = None, *, timeout: float | None = None):
+        """Call a JSON-RPC method and return its result."""
+        _, payload = _encode_call(method, params)
+        return _decode_call(method, self._post(payload, timeout))
+
+    def batch(self, calls: Iterable[tuple[str, list | None]], *, timeout: float | None = None,
+              return_errors: bool = False) -> list:
+        """Send several calls in one HTTP request; results come back in call order."""
+        calls = list(calls)
+        if not calls:
+            return []
+        ids, payload = _encode_batch(calls)
+        return _decode_batch(calls, ids, self._post(payload, timeout), return_errors)
+
+    def close(self):
+        """Close the connections of every thread."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> RpcClient:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _drop_connection(self, connection: http.client.HTTPConnection):
+        connection.close()
+        self._local.connection = None
+        with self._connections_lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+    def _post(self, payload: bytes, timeout: float | None) -> bytes:
+        timeout = self.timeout if timeout is None else timeout
+        headers = {"Content-Type": "application/json"}
+        for attempt in range(2):
+            connection = self._connection()
+            reused = connection.sock is not None
+            connection.timeout = timeout
+            if connection.sock:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request("POST", self.path, body=payload, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                self._drop_connection(connection)
+                if reused and attempt == 0:
+                    # The server closed the idle connection; one retry on a fresh one
+                    continue
+                raise
+            except BaseException:
+                self._drop_connection(connection)
+                raise
+            if response.will_close:
+                self._drop_connection(connection)
+            if not body:
+                raise http.client.HTTPException(f"HTTP {response.status} with empty body from {self.url}")
+            return body
+        raise AssertionError("unreachable")
+
+
+# =============================================================================
+# asyncio client
+# =============================================================================
+
+class AsyncRpcClient(ExecutionMethods):
+    """asyncio client keeping up to `max_connections` requests in flight."""
+
+    def __init__(self, url: str, max_connections: int = DEFAULT_MAX_CONNECTIONS, timeout: float = DEFAULT_TIMEOUT_S):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: asyncio.Semaphore | None = None
+
+    async def call(self, method: str, params: list | None = None, *, timeout: float | None = None):
+        """Call a JSON-RPC method and return its result."""
+        _, payload = _encode_call(method, params)
+        return _decode_call(method, await self._post(payload, timeout))
+
+    async def batch(self, calls: Iterable[tuple[str, list | None]], *, timeout: float | None = None,
+                    return_errors: bool = False) -> list:
+        """Send several calls in one HTTP request; results come back in call order."""
+        calls = list(calls)
+        if not calls:
+            return []
+        ids, payload = _encode_batch(calls)
+        return _decode_batch(calls, ids, await self._post(payload, timeout), return_errors)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def __aenter__(self) -> AsyncRpcClient:
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _post(self, payload: bytes, timeout: float | None) -> bytes:
+        timeout = self.timeout if timeout is None else timeout
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        request = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode() + payload
+
+        async with self._slots:
+            for attempt in range(2):
+                reused = bool(self._idle)
+                if reused:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, headers, body = await asyncio.wait_for(self._read_response(reader), timeout)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise ConnectionResetError(f"connection to {self.url} closed: {e}") from e
+                except BaseException:
+                    writer.close()
+                    raise
+                if headers.get("connection", "").lower() == "close":
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer))
+                if not body:
+                    raise http.client.HTTPException(f"HTTP {status} with empty body from {self.url}")
+                return body
+        raise AssertionError("unreachable")
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> tuple[int, dict[str, str], bytes]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise http.client.BadStatusLine(status_line.decode("latin-1"))
+        status = int(parts[1])
+
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while size := int((await reader.readline()).split(b";")[0], 16):
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass  # trailers
+            body = b"".join(chunks)
+        else:
+            body = await reader.read()
+            headers["connection"] = "close"
+        return status, headers, body
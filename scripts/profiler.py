@@ -0,0 +1,133 @@
+"""
+Per-test profiling for --profile: attaches dotnet-counters or dotnet-trace
+to the Nethermind process and stops it within a CPU overhead budget.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import signal
+import subprocess
+import threading
+from pathlib import Path
+import contextlib
+
+from sampler import group_cpu_seconds
+
+
+# =============================================================================
+# Profiling: dotnet-counters / dotnet-trace attached per test
+# =============================================================================
+
+# Diagnostics tools attached to Nethermind with --profile
+PROFILE_TOOLS = {"counters": "dotnet-counters", "trace": "dotnet-trace"}
+DOTNET_TOOLS_DIR = Path.home() / ".dotnet" / "tools"
+DOTNET_COUNTERS_PROVIDERS = "System.Runtime,Microsoft.AspNetCore.Hosting"
+DEFAULT_PROFILE_OVERHEAD_PCT = 5.0
+# Seconds a stopped tool gets to flush its output before it is killed
+PROFILE_FLUSH_TIMEOUT_S = 30
+
+
+def resolve_profile_tool(kind: str) -> str | None:
+    """Path of the diagnostics tool for `kind`, from PATH or the global dotnet tools dir."""
+    name = PROFILE_TOOLS[kind]
+    found = shutil.which(name)
+    if found:
+        return found
+    candidate = DOTNET_TOOLS_DIR / name
+    return str(candidate) if candidate.exists() else None
+
+
+class Profiler:
+    """Runs dotnet-counters or dotnet-trace against Nethermind for one test.
+
+    The collection overhead is estimated as the tool's CPU time relative to
+    Nethermind's since attaching; once it exceeds `overhead_pct` the tool is
+    stopped early and the profile is marked truncated.
+    """
+
+    def __init__(self, kind: str, tool: str, pid: int, out_dir: Path, overhead_pct: float, log):
+        self.kind = kind
+        self.tool = tool
+        self.pid = pid
+        self.out_dir = out_dir
+        self.overhead_pct = overhead_pct
+        self._log = log
+        self.proc: subprocess.Popen | None = None
+        self.truncated = False
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+        self._target_cpu_start = 0.0
+        self._overhead = 0.0
+
+    @property
+    def output_path(self) -> Path:
+        return self.out_dir / ("counters.csv" if self.kind == "counters" else "nethermind.nettrace")
+
+    def _command(self) -> list[str]:
+        if self.kind == "counters":
+            return [self.tool, "collect", "--process-id", str(self.pid), "--format", "csv",
+                    "--counters", DOTNET_COUNTERS_PROVIDERS, "--output", str(self.output_path)]
+        return [self.tool, "collect", "--process-id", str(self.pid), "--profile", "cpu-sampling",
+                "--output", str(self.output_path)]
+
+    def start(self) -> bool:
+        cmd = self._command()
+        self._log(f"Profiling: {' '.join(cmd)}")
+        try:
+            with (self.out_dir / f"{PROFILE_TOOLS[self.kind]}.log").open("wb") as tool_log:
+                self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=tool_log,
+                                             stderr=subprocess.STDOUT, start_new_session=True)
+        except OSError as e:
+            self._log(f"Profiler failed to start: {e}")
+            return False
+        self._target_cpu_start = group_cpu_seconds(self.pid)
+        if self.overhead_pct > 0:
+            self._watchdog = threading.Thread(target=self._watch, name=f"profiler-{self.pid}", daemon=True)
+            self._watchdog.start()
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(1.0):
+            if self.proc.poll() is not None:
+                return
+            target_cpu = group_cpu_seconds(self.pid) - self._target_cpu_start
+            if target_cpu <= 0:
+                continue
+            self._overhead = 100 * group_cpu_seconds(self.proc.pid) / target_cpu
+            if self._overhead > self.overhead_pct:
+                self._log(f"Profiler overhead {self._overhead:.1f}% over budget "
+                          f"({self.overhead_pct:g}%); stopping collection")
+                self.truncated = True
+                self._interrupt()
+                return
+
+    def _interrupt(self):
+        """Ask the tool to finish; both tools flush their output on SIGINT."""
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(self.proc.pid, signal.SIGINT)
+
+    def stop(self) -> dict:
+        """Stop collecting and describe the output for summary.json."""
+        if not self.proc:
+            return {}
+        self._stop.set()
+        if self._watchdog:
+            self._watchdog.join()
+        if self.proc.poll() is None:
+            self._interrupt()
+        try:
+            self.proc.wait(timeout=PROFILE_FLUSH_TIMEOUT_S)
+        except subprocess.TimeoutExpired:
+            self._log(f"{PROFILE_TOOLS[self.kind]} did not flush in time; killing it")
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            self.proc.wait()
+        return {
+            "tool": PROFILE_TOOLS[self.kind],
+            "file": str(self.output_path) if self.output_path.exists() else None,
+            "exit_code": self.proc.returncode,
+            "overhead_pct": round(self._overhead, 2),
+            "truncated": self.truncated,
+        }
@@ -0,0 +1,282 @@
+"""
+Reorg and maintenance latency scenario (`reorg` subcommand): rolls a
+replayed chain back by several depths, re-digests the dropped messages and
+measures how long the RPC stays unavailable.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import http.client
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+from common import (
+    ROOT_DIR, RunnerState, TestResult, TestStatus, git_output, install_signal_handlers, log, make_log_dir,
+    open_runner_log, phase_timer, print_summary, write_summary_json,
+)
+from nitro_rpc import RpcClient, RpcError
+from replay import (
+    RECORDINGS_DIR, REPLAY_DIGEST_TIMEOUT_S, ReplayRunner, load_recording_expectations, resolve_recordings,
+)
+from runner import add_node_arguments, resolve_node_arguments
+
+
+# =============================================================================
+# Reorg and maintenance latency scenario
+# =============================================================================
+
+# The bundled recordings hold 18-47 messages; deeper reorgs need longer recordings
+DEFAULT_REORG_DEPTHS = (1, 4, 16)
+DEFAULT_REORG_MESSAGES = 200
+# The availability probe calls eth_blockNumber this often; slower answers count as a stall
+DEFAULT_PROBE_INTERVAL_S = 0.02
+PROBE_STALL_S = 0.25
+MAINTENANCE_TIMEOUT_S = 600
+
+
+class AvailabilityProbe:
+    """Polls a cheap RPC on its own connection to measure how long Nethermind stops answering.
+
+    A probe that fails or takes longer than PROBE_STALL_S counts as
+    unavailable for its full duration; consecutive ones form one window.
+    """
+
+    def __init__(self, url: str, interval_s: float):
+        self.client = RpcClient(url, timeout=MAINTENANCE_TIMEOUT_S)
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="availability-probe", daemon=True)
+        self.probes = self.failures = 0
+        self.unavailable_s = self.longest_window_s = self.max_latency_s = 0.0
+
+    def __enter__(self) -> AvailabilityProbe:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.client.close()
+
+    def _run(self):
+        window = 0.0
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                self.client.call("eth_blockNumber")
+                ok = True
+            except (OSError, http.client.HTTPException, RpcError):
+                ok = False
+            latency = time.perf_counter() - start
+            self.probes += 1
+            self.failures += not ok
+            self.max_latency_s = max(self.max_latency_s, latency)
+            if not ok or latency > PROBE_STALL_S:
+                window += latency
+                self.unavailable_s += latency
+                self.longest_window_s = max(self.longest_window_s, window)
+            else:
+                window = 0.0
+            self._stop.wait(self.interval_s)
+
+    def metrics(self, prefix: str) -> dict[str, float]:
+        return {
+            f"{prefix}_max_probe_ms": round(self.max_latency_s * 1000, 1),
+            f"{prefix}_unavailable_ms": round(self.unavailable_s * 1000, 1),
+            f"{prefix}_longest_outage_ms": round(self.longest_window_s * 1000, 1),
+        }
+
+
+def load_recording_messages(recording: Path, first: int, last: int) -> dict[int, dict]:
+    """Messages with index in [first, last] from a recording, by index."""
+    messages = {}
+    with recording.open(encoding="utf-8") as f:
+        f.readline()  # init message
+        for line in f:
+            if line.strip():
+                message = json.loads(line)
+                if first <= message["index"] <= last:
+                    messages[message["index"]] = message
+    return messages
+
+
+def parse_depths(value: str) -> list[int]:
+    depths = sorted({int(depth) for depth in value.split(",") if depth.strip()})
+    if not depths or depths[0] < 1:
+        raise argparse.ArgumentTypeError("depths must be positive integers, e.g. 1,8,32")
+    return depths
+
+
+class ReorgRunner(ReplayRunner):
+    """ReplayRunner with the reorg and maintenance scenario run against the replayed chain."""
+
+    def reorg_scenario(self, result: TestResult, recording: Path, depths: list[int], maintenance: bool,
+                       probe_interval_s: float) -> str:
+        """Roll back the digested chain by each depth and digest the dropped messages again.
+
+        Per depth, records the rollback latency (nitroexecution_reorg with no
+        new messages), the re-digest throughput and how long the RPC stopped
+        answering; the re-digested blocks must hash as before. Then, if
+        `maintenance`, times triggerMaintenance until maintenanceStatus
+        reports it finished. Returns the first error, or "".
+        """
+        head = self.rpc.head_message_index()
+        skipped = [depth for depth in depths if depth > head]
+        if skipped:
+            self._log(f"Reorg depth(s) {skipped} reach genesis (head message {head}); skipping")
+            log(f"{recording.name}: skipping reorg depth(s) {', '.join(map(str, skipped))}, "
+                f"deeper than its {head} digested messages", "WARN")
+            depths = [depth for depth in depths if depth <= head]
+        if not depths:
+            return ""
+        messages = load_recording_messages(recording, head - depths[-1] + 1, head)
+        for depth in depths:
+            if self.state.interrupted:
+                return ""
+            first = head - depth + 1
+            indexes = range(first, head + 1)
+            before = self.rpc.batch([("nitroexecution_resultAtMessageIndex", [i]) for i in indexes])
+            old_messages = [messages[i]["message"] for i in indexes]
+
+            with AvailabilityProbe(self.rpc_url, probe_interval_s) as probe:
+                reorg_start = time.perf_counter()
+                self.rpc.reorg(first, [], old_messages, timeout=REPLAY_DIGEST_TIMEOUT_S)
+                rollback_s = time.perf_counter() - reorg_start
+
+                redigest_start = time.perf_counter()
+                for i, expected in zip(indexes, before):
+                    message = messages[i]
+                    digested = self.rpc.digest_message(i, message["message"], message.get("messageForPrefetch"),
+                                                       timeout=REPLAY_DIGEST_TIMEOUT_S)
+                    if digested["blockHash"] != expected["blockHash"]:
+                        return (f"reorg depth {depth}: message {i} re-digested to {digested['blockHash']}, "
+                                f"was {expected['blockHash']}")
+                redigest_s = time.perf_counter() - redigest_start
+
+            prefix = f"reorg_d{depth}"
+            result.metrics[f"{prefix}_rollback_ms"] = round(rollback_s * 1000, 2)
+            result.metrics[f"{prefix}_redigest_msgs_per_s"] = round(depth / redigest_s, 2) if redigest_s > 0 else 0.0
+            result.metrics.update(probe.metrics(prefix))
+            self._log(f"Reorg depth {depth}: rollback {rollback_s * 1000:.1f}ms, re-digest "
+                      f"{redigest_s:.2f}s, longest RPC outage {probe.longest_window_s * 1000:.0f}ms")
+
+        if maintenance and not self.state.interrupted:
+            result.metrics["maintenance_requested"] = float(bool(self.rpc.should_trigger_maintenance()))
+            with AvailabilityProbe(self.rpc_url, probe_interval_s) as probe:
+                maintenance_start = time.perf_counter()
+                self.rpc.trigger_maintenance(timeout=MAINTENANCE_TIMEOUT_S)
+                trigger_s = time.perf_counter() - maintenance_start
+                deadline = time.monotonic() + MAINTENANCE_TIMEOUT_S
+                while self.rpc.maintenance_status().get("isRunning"):
+                    if time.monotonic() > deadline:
+                        return f"maintenance still running after {MAINTENANCE_TIMEOUT_S}s"
+                    time.sleep(probe_interval_s)
+                maintenance_s = time.perf_counter() - maintenance_start
+            result.metrics["maintenance_trigger_ms"] = round(trigger_s * 1000, 2)
+            result.metrics["maintenance_ms"] = round(maintenance_s * 1000, 2)
+            result.metrics.update(probe.metrics("maintenance"))
+        return ""
+
+
+def reorg_main(argv: list[str]) -> int:
+    """`reorg` subcommand: reorg and maintenance latency on recorded chains."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} reorg",
+        description="Digest the first messages of each recording, then roll the chain back by each depth "
+                    "and digest the dropped messages again, measuring rollback latency, re-digest "
+                    "throughput and RPC outages; finally time a maintenance run.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s 5__stylus                      # Default depths on one recording
+  %(prog)s --depths 1,8,32 5__stylus      # Depths beyond a recording's messages are skipped
+  %(prog)s --depths 1,64,512 --messages 600 5__stylus
+  %(prog)s --no-maintenance --output reorg.json
+        """,
+    )
+    parser.add_argument("recordings", nargs="*",
+                        help="Recording files or names (default: all recordings)")
+    parser.add_argument("--messages", type=int, default=DEFAULT_REORG_MESSAGES,
+                        help=f"Messages to digest before reorging (default: {DEFAULT_REORG_MESSAGES})")
+    parser.add_argument("--depths", type=parse_depths, default=list(DEFAULT_REORG_DEPTHS),
+                        help="Comma-separated reorg depths in messages "
+                             f"(default: {','.join(map(str, DEFAULT_REORG_DEPTHS))})")
+    parser.add_argument("--no-maintenance", dest="maintenance", action="store_false",
+                        help="Skip the triggerMaintenance measurement")
+    parser.add_argument("--probe-interval", type=float, default=DEFAULT_PROBE_INTERVAL_S,
+                        help=f"Seconds between availability probes (default: {DEFAULT_PROBE_INTERVAL_S:g})")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Write per-recording metrics JSON here (default: reorg.json in the log directory)")
+    add_node_arguments(parser)
+    args = parser.parse_args(argv)
+    resolve_node_arguments(parser, args)
+
+    try:
+        recordings = resolve_recordings(args.recordings)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not recordings:
+        print(f"Error: No recordings found in {RECORDINGS_DIR}", file=sys.stderr)
+        return 1
+
+    log_dir = None if args.no_logs else make_log_dir("nm-nitro-reorg")
+    state = RunnerState()
+    for recording in recordings:
+        state.results.append(TestResult(name=recording.name))
+    install_signal_handlers(state)
+
+    with open_runner_log(log_dir) as runner_log:
+        runner = ReorgRunner(args, state, runner_log)
+        with phase_timer(state.phases, "build"):
+            build_succeeded = runner.build_nethermind()
+        if not build_succeeded:
+            return 1
+
+        log(f"Reorg scenario on {len(recordings)} recording(s), depths {args.depths}...")
+        print("-" * 60)
+        for recording, result in zip(recordings, state.results):
+            if state.interrupted:
+                result.status = TestStatus.SKIPPED
+                continue
+
+            def scenario(r: TestResult, recording=recording) -> str:
+                return runner.reorg_scenario(r, recording, args.depths, args.maintenance, args.probe_interval)
+
+            runner.replay(result, recording, load_recording_expectations(recording), log_dir, args.messages,
+                          scenario=scenario)
+
+        print_summary(state)
+        if log_dir:
+            write_summary_json(state, log_dir / "summary.json")
+
+    print(f"\n{'recording':<28} {'depth':>6} {'rollback ms':>12} {'redigest/s':>11} {'outage ms':>10}")
+    for result in state.results:
+        for depth in args.depths:
+            prefix = f"reorg_d{depth}"
+            if f"{prefix}_rollback_ms" in result.metrics:
+                print(f"{result.name:<28} {depth:>6} {result.metrics[f'{prefix}_rollback_ms']:>12.1f} "
+                      f"{result.metrics[f'{prefix}_redigest_msgs_per_s']:>11.1f} "
+                      f"{result.metrics[f'{prefix}_longest_outage_ms']:>10.0f}")
+        if "maintenance_ms" in result.metrics:
+            print(f"{result.name:<28} {'maint':>6} {result.metrics['maintenance_ms']:>12.1f} {'':>11} "
+                  f"{result.metrics['maintenance_longest_outage_ms']:>10.0f}")
+
+    output = args.output or (log_dir / "reorg.json" if log_dir else None)
+    if output:
+        output.write_text(json.dumps({
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "commit": git_output(ROOT_DIR, "rev-parse", "HEAD").strip(),
+            "messages": args.messages,
+            "depths": args.depths,
+            "recordings": {r.name: r.metrics for r in state.results if r.status == TestStatus.PASSED},
+        }, indent=2) + "\n")
+        print(f"\nResults: {output}")
+
+    failed = sum(1 for r in state.results if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT))
+    return 1 if failed or state.interrupted else 0
@@ -0,0 +1,570 @@
+"""
+Recording replay: digest recorded Nitro messages straight into Nethermind,
+check the produced block hashes, and locate the first divergent block
+against a reference EL (`replay` subcommand).
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import http.client
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+import contextlib
+import re
+
+from common import (
+    ROOT_DIR, RunnerState, TestResult, TestStatus, install_signal_handlers, log, log_test_status, make_log_dir,
+    open_runner_log, phase_timer, print_summary, render_node_config, write_if_changed, write_summary_json,
+)
+from nitro_rpc import RpcClient, RpcError
+from runner import TestRunner, add_node_arguments, resolve_node_arguments
+
+if TYPE_CHECKING:
+    from load import ReadLoad
+
+
+# =============================================================================
+# Recording replay: drive recorded messages straight into Nethermind
+# =============================================================================
+
+RECORDINGS_DIR = ROOT_DIR / "src/Nethermind.Arbitrum.Test/Recordings"
+RECORDING_TESTS_FILE = ROOT_DIR / "src/Nethermind.Arbitrum.Test/RecordingTests.cs"
+# Same chain the C# recording tests simulate; the init message fills in the rest
+REPLAY_CHAINSPEC_BASE = ROOT_DIR / "src/Nethermind.Arbitrum/Properties/chainspec/arbitrum-local.json"
+REPLAY_DIGEST_TIMEOUT_S = 60.0
+
+# [TestCase("./Recordings/2__stylus.jsonl", 19, "0x...")]
+RECORDING_TEST_CASE = re.compile(r'TestCase\("\./Recordings/([^"]+)",\s*(\d+),\s*"(0x[0-9a-fA-F]{64})"\)')
+EXPECTED_LOG_FIELD = re.compile(r"^\s+(Hash|State Root):\s+(0x[0-9a-fA-F]{64})\s*$")
+
+# Chain config `arbitrum` keys -> chainspec engine.Arbitrum keys
+REPLAY_ENGINE_PARAMS = {
+    "InitialArbOSVersion": "initialArbOSVersion",
+    "InitialChainOwner": "initialChainOwner",
+    "GenesisBlockNum": "genesisBlockNum",
+    "EnableArbOS": "enableArbOS",
+    "AllowDebugPrecompiles": "allowDebugPrecompiles",
+    "DataAvailabilityCommittee": "dataAvailabilityCommittee",
+}
+
+# Headers per eth_getBlockByNumber batch when filling in DigestSample.gas_used
+SAMPLE_GAS_BATCH = 100
+
+
+@dataclass
+class ExpectedBlock:
+    hash: str
+    state_root: str = ""
+
+
+@dataclass
+class RecordingExpectations:
+    """Known-good hashes for one recording."""
+    # Block number -> header, from `<n>__expected.log`
+    blocks: dict[int, ExpectedBlock] = field(default_factory=dict)
+    # Messages digested -> head block, from RecordingTests.cs
+    heads: dict[int, ExpectedBlock] = field(default_factory=dict)
+
+
+@dataclass
+class DigestSample:
+    """One nitroexecution_digestMessage call, as measured by the benchmark."""
+    index: int
+    block: int
+    latency_s: float
+    # Looked up once the timed digest loop is over, see ReplayRunner.fill_sample_gas
+    gas_used: int = 0
+
+
+def _recording_sort_key(path: Path) -> tuple[int, str]:
+    prefix = path.name.split("__", 1)[0]
+    return (int(prefix) if prefix.isdigit() else sys.maxsize, path.name)
+
+
+def resolve_recordings(names: list[str]) -> list[Path]:
+    """Map CLI arguments (paths or names like `2__stylus`) to recording files; all if none given."""
+    if not names:
+        return sorted(RECORDINGS_DIR.glob("*.jsonl"), key=_recording_sort_key)
+    paths = []
+    for name in names:
+        path = Path(name)
+        if not path.exists():
+            path = RECORDINGS_DIR / (name if name.endswith(".jsonl") else f"{name}.jsonl")
+        if not path.exists():
+            raise FileNotFoundError(f"Recording not found: {name}")
+        paths.append(path)
+    return paths
+
+
+def load_expected_log(path: Path) -> dict[int, ExpectedBlock]:
+    """Parse the header hash and state root of every block in an `*__expected.log` dump."""
+    blocks: dict[int, ExpectedBlock] = {}
+    number = None
+    in_header = False
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Block "):
+                number = int(line.split()[1])
+                in_header = False
+            elif line.strip() == "Header:":
+                in_header = True
+            elif not line.startswith("    "):
+                # "  Uncles:", "  Transactions:" ... end the header; transactions have hashes too
+                in_header = False
+            elif in_header and number is not None:
+                match = EXPECTED_LOG_FIELD.match(line)
+                if match and match.group(1) == "Hash":
+                    blocks[number] = ExpectedBlock(match.group(2))
+                elif match and number in blocks:
+                    blocks[number].state_root = match.group(2)
+    return blocks
+
+
+def load_recording_expectations(recording: Path) -> RecordingExpectations:
+    """Collect the expected hashes for `recording` from RecordingTests.cs and its expected log.
+
+    `<n>__expected.log` is only used when `<n>` identifies a single recording.
+    """
+    expectations = RecordingExpectations()
+    if RECORDING_TESTS_FILE.exists():
+        for name, count, block_hash in RECORDING_TEST_CASE.findall(RECORDING_TESTS_FILE.read_text(encoding="utf-8")):
+            if name == recording.name:
+                expectations.heads[int(count)] = ExpectedBlock(block_hash)
+
+    prefix = recording.name.split("__", 1)[0]
+    expected_log = recording.parent / f"{prefix}__expected.log"
+    if expected_log.exists() and len(list(recording.parent.glob(f"{prefix}__*.jsonl"))) == 1:
+        expectations.blocks = load_expected_log(expected_log)
+    return expectations
+
+
+def parse_quantity(value) -> int:
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def decode_chain_config(init_message: dict) -> dict:
+    return json.loads(base64.b64decode(init_message["serializedChainConfig"]))
+
+
+def recording_genesis_block_num(init_message: dict) -> int:
+    return int(decode_chain_config(init_message).get("arbitrum", {}).get("GenesisBlockNum", 0))
+
+
+def render_replay_chainspec(init_message: dict) -> bytes:
+    """Render a chainspec whose genesis matches a recording's init message.
+
+    Nethermind builds genesis from the chainspec at startup and
+    arbitrum_digestInitMessage then only confirms it, so the init message
+    parameters must already be in the chainspec.
+    """
+    chainspec = json.loads(REPLAY_CHAINSPEC_BASE.read_text(encoding="utf-8"))
+    chain_config = decode_chain_config(init_message)
+    engine = chainspec["engine"]["Arbitrum"]
+    for config_key, engine_key in REPLAY_ENGINE_PARAMS.items():
+        if config_key in chain_config.get("arbitrum", {}):
+            engine[engine_key] = chain_config["arbitrum"][config_key]
+    engine["initialL1BaseFee"] = str(parse_quantity(init_message["initialL1BaseFee"]))
+    engine["serializedChainConfig"] = init_message["serializedChainConfig"]
+    chainspec["params"]["networkID"] = hex(int(chain_config["chainId"]))
+    return (json.dumps(chainspec, indent=2, ensure_ascii=False) + "\n").encode()
+
+
+# =============================================================================
+# Divergence locator: first block where Nethermind and a reference EL disagree
+# =============================================================================
+
+# Header fields compared once the first divergent block is known
+DIVERGENCE_HEADER_FIELDS = (
+    "parentHash", "stateRoot", "transactionsRoot", "receiptsRoot", "logsBloom",
+    "gasUsed", "gasLimit", "baseFeePerGas", "timestamp", "extraData", "mixHash", "nonce",
+)
+DIVERGENCE_RECEIPT_FIELDS = ("status", "gasUsed", "cumulativeGasUsed", "contractAddress", "logs")
+# Per-transaction state changes; supported by both geth and Nethermind
+DIVERGENCE_TRACER = {"tracer": "prestateTracer", "tracerConfig": {"diffMode": True}}
+DIVERGENCE_TRACE_TIMEOUT_S = 120
+DIVERGENCE_MAX_DIFFS = 50
+
+
+def _fetch_headers(number: int, *clients: RpcClient) -> list[dict | None]:
+    """Header of block `number` from each client, None where it does not exist."""
+    return [c.call("eth_getBlockByNumber", [hex(number), False]) for c in clients]
+
+
+def find_divergent_block(reference: RpcClient, candidate: RpcClient) -> tuple[int | None, int]:
+    """Binary search the lowest block whose hash differs between the two clients.
+
+    Block hashes chain, so once two chains diverge every later block differs
+    too. Returns (block number or None if the common range matches, highest
+    block both clients have).
+    """
+    head = min(parse_quantity(reference.call("eth_blockNumber")),
+               parse_quantity(candidate.call("eth_blockNumber")))
+
+    def same(number: int) -> bool:
+        ref, cand = _fetch_headers(number, reference, candidate)
+        return bool(ref and cand) and ref["hash"] == cand["hash"]
+
+    if same(head):
+        return None, head
+    if not same(0):
+        return 0, head
+    good, bad = 0, head
+    while bad - good > 1:
+        mid = (good + bad) // 2
+        if same(mid):
+            good = mid
+        else:
+            bad = mid
+    return bad, head
+
+
+def diff_values(reference, candidate, path: str = "", limit: int = DIVERGENCE_MAX_DIFFS,
+                out: list[str] | None = None) -> list[str]:
+    """Flatten the differences between two JSON values into `path: ref != cand` lines."""
+    out = [] if out is None else out
+    if len(out) >= limit:
+        return out
+    if isinstance(reference, dict) and isinstance(candidate, dict):
+        for key in sorted(reference.keys() | candidate.keys()):
+            diff_values(reference.get(key), candidate.get(key), f"{path}.{key}" if path else key, limit, out)
+    elif isinstance(reference, list) and isinstance(candidate, list) and len(reference) == len(candidate):
+        for i, (ref, cand) in enumerate(zip(reference, candidate)):
+            diff_values(ref, cand, f"{path}[{i}]", limit, out)
+    elif reference != candidate:
+        out.append(f"{path}: {json.dumps(reference)} != {json.dumps(candidate)}")
+    return out
+
+
+def _block_receipts(client: RpcClient, number: int, tx_hashes: list[str]) -> list[dict | None]:
+    try:
+        return client.call("eth_getBlockReceipts", [hex(number)]) or []
+    except RpcError:
+        # Older clients: fall back to one receipt per transaction
+        return client.batch([("eth_getTransactionReceipt", [tx]) for tx in tx_hashes], return_errors=True)
+
+
+def _block_traces(client: RpcClient, number: int) -> list:
+    traces = client.call("debug_traceBlockByNumber", [hex(number), DIVERGENCE_TRACER],
+                         timeout=DIVERGENCE_TRACE_TIMEOUT_S)
+    # geth wraps each trace as {"txHash", "result"}; Nethermind may return bare results
+    return [t.get("result", t) if isinstance(t, dict) else t for t in traces or []]
+
+
+def locate_divergence(reference: RpcClient, candidate: RpcClient) -> dict:
+    """Find the first divergent block and explain it: header fields, receipts and per-tx state diffs."""
+    number, head = find_divergent_block(reference, candidate)
+    report: dict = {"common_head": head, "block": number}
+    if number is None:
+        return report
+
+    ref_block, cand_block = _fetch_headers(number, reference, candidate)
+    report["reference_hash"], report["candidate_hash"] = ref_block["hash"], cand_block["hash"]
+    report["state_root_match"] = ref_block["stateRoot"] == cand_block["stateRoot"]
+    report["header_diff"] = [
+        f"{name}: {ref_block.get(name)} != {cand_block.get(name)}"
+        for name in DIVERGENCE_HEADER_FIELDS if ref_block.get(name) != cand_block.get(name)
+    ]
+
+    tx_hashes = ref_block.get("transactions", [])
+    ref_receipts = _block_receipts(reference, number, tx_hashes)
+    cand_receipts = _block_receipts(candidate, number, cand_block.get("transactions", []))
+    report["receipts"] = []
+    for i, (ref, cand) in enumerate(zip(ref_receipts, cand_receipts)):
+        if not isinstance(ref, dict) or not isinstance(cand, dict):
+            continue
+        differing = [name for name in DIVERGENCE_RECEIPT_FIELDS if ref.get(name) != cand.get(name)]
+        if differing:
+            report["receipts"].append({"index": i, "tx": ref.get("transactionHash"), "fields": differing})
+    if len(ref_receipts) != len(cand_receipts):
+        report["receipts"].append({"count": [len(ref_receipts), len(cand_receipts)]})
+
+    try:
+        ref_traces, cand_traces = _block_traces(reference, number), _block_traces(candidate, number)
+    except RpcError as e:
+        report["trace_error"] = str(e)
+        return report
+    report["traces"] = []
+    for i, (ref, cand) in enumerate(zip(ref_traces, cand_traces)):
+        diff = diff_values(ref, cand)
+        if diff:
+            tx = tx_hashes[i] if i < len(tx_hashes) else None
+            report["traces"].append({"index": i, "tx": tx, "diff": diff})
+    first = report["traces"][0] if report["traces"] else (report["receipts"] or [{}])[0]
+    report["first_tx"] = first.get("tx")
+    return report
+
+
+# =============================================================================
+# Replay runner and the `replay` subcommand
+# =============================================================================
+
+class ReplayRunner(TestRunner):
+    """TestRunner that feeds recorded messages straight into Nethermind instead of running a Go test."""
+
+    def replay(self, result: TestResult, recording: Path, expected: RecordingExpectations, log_dir: Path | None,
+               max_messages: int = 0, samples: list[DigestSample] | None = None,
+               scenario: Callable[[TestResult], str] | None = None, read_load: ReadLoad | None = None):
+        """Replay a recording into a fresh Nethermind and check the produced block hashes.
+
+        Messages are streamed from the file one at a time through
+        nitroexecution_digestMessage; replay stops at the first block whose
+        hash differs from `expected`, or after `max_messages` if non-zero.
+        When `samples` is given, a DigestSample is appended per message.
+        A `scenario` runs against the digested chain afterwards and returns
+        an error message, or "" on success. A `read_load` runs while the
+        recording is digested.
+        """
+        state = self.state
+        state.current_test = result.name
+        start = time.time()
+        result.status = TestStatus.RUNNING
+        log_test_status(result.name, TestStatus.RUNNING)
+
+        test_dir = None
+        if log_dir:
+            test_dir = log_dir / recording.stem
+            test_dir.mkdir(exist_ok=True)
+            result.log_dir = test_dir
+
+        self.nethermind_stream = self.test_stream = None
+        try:
+            with phase_timer(result.phases, "config"):
+                try:
+                    with recording.open(encoding="utf-8") as f:
+                        init_message = json.loads(f.readline())
+                    write_if_changed(self.slot.chainspec_path, render_replay_chainspec(init_message))
+                    write_if_changed(self.slot.config_path, render_node_config(self.slot.config_name))
+                    config_error = ""
+                except (OSError, ValueError, KeyError) as e:
+                    config_error = f"Config generation failed: {e}"
+            if config_error:
+                self._log(config_error)
+                result.status = TestStatus.FAILED
+                result.error_msg = config_error
+                result.duration_s = time.time() - start
+                log_test_status(result.name, result.status, result.duration_s, result.error_msg)
+                return
+
+            if not self._boot_nethermind(result, test_dir, start):
+                return
+
+            digested = checked = 0
+            mismatch = ""
+            with phase_timer(result.phases, "digest"), read_load or contextlib.nullcontext():
+                try:
+                    digested, checked, mismatch = self._digest_recording(recording, expected, max_messages, samples)
+                except (OSError, ValueError, KeyError, http.client.HTTPException, RpcError) as e:
+                    mismatch = f"Replay failed: {e}"
+            if samples and not state.interrupted:
+                try:
+                    self.fill_sample_gas(samples)
+                except (OSError, ValueError, KeyError, TypeError, http.client.HTTPException, RpcError) as e:
+                    mismatch = mismatch or f"Gas lookup failed: {e}"
+            digest_s = result.phases["digest"]
+            result.metrics = {
+                "messages": digested,
+                "checked_blocks": checked,
+                "messages_per_s": round(digested / digest_s, 2) if digest_s > 0 else 0.0,
+            }
+            if read_load:
+                result.metrics.update(read_load.metrics())
+            if scenario and not mismatch and not state.interrupted:
+                with phase_timer(result.phases, "scenario"):
+                    try:
+                        mismatch = scenario(result)
+                    except (OSError, ValueError, KeyError, TypeError, http.client.HTTPException, RpcError) as e:
+                        mismatch = f"Scenario failed: {e}"
+            result.duration_s = time.time() - start
+
+            if state.interrupted:
+                result.status = TestStatus.SKIPPED
+            elif mismatch:
+                result.status = TestStatus.FAILED
+                result.error_msg = mismatch
+            else:
+                result.status = TestStatus.PASSED
+                if not checked:
+                    self._log(f"{recording.name}: no expected hashes found, nothing was checked")
+            log_test_status(result.name, result.status, result.duration_s, result.error_msg)
+        finally:
+            self._finish(result)
+
+    def _digest_recording(self, recording: Path, expected: RecordingExpectations, max_messages: int,
+                          samples: list[DigestSample] | None = None) -> tuple[int, int, str]:
+        """Digest `recording` and return (messages digested, blocks checked, first mismatch)."""
+        digested = checked = 0
+        with recording.open(encoding="utf-8") as f:
+            init_message = json.loads(f.readline())
+            genesis_num = recording_genesis_block_num(init_message)
+            genesis = self.rpc.digest_init_message(
+                init_message["initialL1BaseFee"], init_message["serializedChainConfig"],
+                timeout=REPLAY_DIGEST_TIMEOUT_S,
+            )
+            mismatch = self._check_block_hash(genesis_num, genesis["blockHash"], expected.blocks.get(genesis_num))
+            if mismatch:
+                return digested, checked + 1, mismatch
+            checked += genesis_num in expected.blocks
+
+            for position, line in enumerate(f, start=1):
+                if self.state.interrupted or (max_messages and position > max_messages):
+                    break
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                index = message["index"]
+                digest_start = time.perf_counter()
+                result = self.rpc.digest_message(
+                    index, message["message"], message.get("messageForPrefetch"),
+                    timeout=REPLAY_DIGEST_TIMEOUT_S,
+                )
+                latency_s = time.perf_counter() - digest_start
+                digested += 1
+
+                block = genesis_num + index
+                if samples is not None:
+                    samples.append(DigestSample(index, block, latency_s))
+                for expected_block in (expected.blocks.get(block), expected.heads.get(position)):
+                    if expected_block is None:
+                        continue
+                    checked += 1
+                    mismatch = self._check_block_hash(block, result["blockHash"], expected_block)
+                    if mismatch:
+                        return digested, checked, f"message {index}: {mismatch}"
+        return digested, checked, ""
+
+    def fill_sample_gas(self, samples: list[DigestSample]):
+        """Set gas_used of each sample from its block header, in batches after the timed digest loop."""
+        for start in range(0, len(samples), SAMPLE_GAS_BATCH):
+            chunk = samples[start:start + SAMPLE_GAS_BATCH]
+            headers = self.rpc.batch(("eth_getBlockByNumber", [hex(sample.block), False]) for sample in chunk)
+            for sample, header in zip(chunk, headers):
+                sample.gas_used = int(header["gasUsed"], 16)
+
+    def _check_block_hash(self, number: int, actual_hash: str, expected: ExpectedBlock | None) -> str:
+        """Describe how block `number` differs from `expected`, or return "" if it matches."""
+        if expected is None or actual_hash.lower() == expected.hash.lower():
+            return ""
+        mismatch = f"block {number} hash {actual_hash}, expected {expected.hash}"
+        if expected.state_root:
+            # The state root tells an execution divergence apart from a header-only one
+            with contextlib.suppress(OSError, http.client.HTTPException, RpcError, TypeError, KeyError):
+                block = self.rpc.call("eth_getBlockByNumber", [hex(number), False])
+                mismatch += f"; state root {block['stateRoot']}, expected {expected.state_root}"
+        self._log(f"Block hash mismatch: {mismatch}")
+        return mismatch
+
+    def _diagnose_failure(self, result: TestResult):
+        if self.args.reference_rpc:
+            result.divergence = self.locate_divergence(result.log_dir)
+
+    def locate_divergence(self, test_dir: Path | None) -> dict:
+        """Compare the failed replay's chain with --reference-rpc while Nethermind is still up.
+
+        The full report goes to divergence.json in `test_dir`; the returned
+        summary is what summary.json keeps.
+        """
+        if not self.nethermind_alive():
+            return {}
+        self._log(f"Locating divergence against {self.args.reference_rpc}")
+        try:
+            with RpcClient(self.args.reference_rpc) as reference:
+                report = locate_divergence(reference, self.rpc)
+        except (OSError, http.client.HTTPException, RpcError, TypeError, KeyError, ValueError) as e:
+            self._log(f"Divergence locator failed: {e}")
+            return {"error": str(e)}
+
+        summary = {key: report.get(key) for key in ("block", "common_head", "state_root_match", "first_tx")}
+        if test_dir:
+            report_path = test_dir / "divergence.json"
+            report_path.write_text(json.dumps(report, indent=2) + "\n")
+            summary["report"] = str(report_path)
+        if report["block"] is None:
+            self._log(f"No divergence up to common head {report['common_head']}")
+        else:
+            self._log(f"First divergent block {report['block']} (state root "
+                      f"{'matches' if report['state_root_match'] else 'differs'}), "
+                      f"first differing tx {report.get('first_tx')}")
+        return summary
+
+
+def replay_main(argv: list[str]) -> int:
+    """`replay` subcommand: digest recordings directly, without Go or a Nitro checkout."""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} replay",
+        description="Replay recorded Nitro messages into Nethermind and check the block hashes "
+                    f"against RecordingTests.cs and *__expected.log (recordings in {RECORDINGS_DIR}).",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                # Replay every recording
+  %(prog)s 2__stylus 5__stylus            # Replay selected recordings
+  %(prog)s --messages 10 1__arbos32_basefee92  # Stop after the first 10 messages
+  %(prog)s --reference-rpc http://127.0.0.1:8547 2__stylus  # Locate the first divergent block on failure
+        """,
+    )
+    parser.add_argument("recordings", nargs="*",
+                        help="Recording files or names (default: all recordings)")
+    parser.add_argument("--messages", type=int, default=0,
+                        help="Digest at most this many messages per recording (default: all)")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop on first failing recording")
+    parser.add_argument("--reference-rpc", metavar="URL",
+                        help="Execution client that has digested the same recording; on failure, binary "
+                             "search the first block where Nethermind differs and diff its receipts and traces")
+    add_node_arguments(parser)
+    args = parser.parse_args(argv)
+    resolve_node_arguments(parser, args)
+
+    try:
+        recordings = resolve_recordings(args.recordings)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not recordings:
+        print(f"Error: No recordings found in {RECORDINGS_DIR}", file=sys.stderr)
+        return 1
+
+    log_dir = None if args.no_logs else make_log_dir("nm-nitro-replay")
+    state = RunnerState()
+    for recording in recordings:
+        state.results.append(TestResult(name=recording.name))
+    install_signal_handlers(state)
+
+    with open_runner_log(log_dir) as runner_log:
+        runner = ReplayRunner(args, state, runner_log)
+        run_start = time.monotonic()
+        with phase_timer(state.phases, "build"):
+            build_succeeded = runner.build_nethermind()
+        if not build_succeeded:
+            if log_dir:
+                print(f"Logs: {log_dir}")
+            return 1
+
+        log(f"Replaying {len(recordings)} recording(s)...")
+        print("-" * 60)
+        for i, (recording, result) in enumerate(zip(recordings, state.results)):
+            if state.interrupted:
+                result.status = TestStatus.SKIPPED
+                continue
+            runner.replay(result, recording, load_recording_expectations(recording), log_dir, args.messages)
+            if args.fail_fast and result.status == TestStatus.FAILED:
+                log("Stopping due to --fail-fast")
+                for remaining in state.results[i + 1:]:
+                    remaining.status = TestStatus.SKIPPED
+                break
+        state.phases["total"] = time.monotonic() - run_start
+
+        print_summary(state)
+        if log_dir:
+            write_summary_json(state, log_dir / "summary.json")
+
+    if log_dir:
+        print(f"\nLogs: {log_dir}")
+
+    failed = sum(1 for r in state.results if r.status in (TestStatus.FAILED, TestStatus.TIMEOUT))
+    return 1 if failed > 0 else 0
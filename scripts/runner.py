@@ -0,0 +1,1095 @@
+"""
+TestRunner: one Nethermind instance and the Nitro system tests run against
+it, plus the sequential, parallel (--jobs) and pipelined (--pipeline) run
+loops and --retries handling built on it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import hashlib
+import http.client
+import itertools
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import fields
+from pathlib import Path
+from typing import TextIO
+import contextlib
+import re
+
+from blocks import BLOCK_METRICS_FILE, BlockLogParser, write_block_metrics
+from common import (
+    BUILD_FINGERPRINT_PATH, BUILD_OUTPUT_DIR, DEFAULT_DATA_DIR, DEFAULT_HOST, DEFAULT_LOG_TAIL_LINES,
+    DEFAULT_NITRO_PATH, DEFAULT_PORT, GO_LOG_NOISE, LOG_READ_CHUNK, PLUGIN_PROJECT, ROOT_DIR, InstanceSlot,
+    LogStream, RunnerState, TestResult, TestStatus, account_names_for_test, compile_noise_filter,
+    compute_build_fingerprint, compute_nitro_fingerprint, compute_test_addresses, generate_accounts_json,
+    get_cached_chainspec, get_test_accounts, install_signal_handlers, log, log_test_status, make_slot, phase_timer,
+    render_node_config, resolve_log_compression, write_atomic, write_if_changed,
+)
+from nitro_rpc import RpcClient, RpcError
+from profiler import DEFAULT_PROFILE_OVERHEAD_PCT, PROFILE_TOOLS, Profiler, resolve_profile_tool
+from sampler import DEFAULT_SAMPLE_INTERVAL_S, ResourceSampler
+
+
+# =============================================================================
+# Go system test inputs: test binaries, -run filters and accounts
+# =============================================================================
+
+# Readiness: probe backoff bounds and the log lines announcing the RPC endpoint
+READY_PROBE_MIN_S = 0.005
+READY_PROBE_MAX_S = 0.5
+READY_PROBE_METHOD = "nitroexecution_headMessageIndex"
+RPC_STARTED_MARKER = re.compile(rb"JSON ?RPC\s*:|RPC started|Nethermind is ready", re.IGNORECASE)
+GENESIS_SNAPSHOT_DIR = DEFAULT_DATA_DIR / "genesis-snapshots"
+GO_TEST_CACHE_DIR = DEFAULT_DATA_DIR / "go-test-cache"
+# system_tests binaries are large; keep only the most recently used ones
+GO_TEST_CACHE_KEEP = 3
+
+
+# `--- PASS: TestName (1.23s)` lines printed by `go test -v`
+GO_TEST_OUTCOME = re.compile(rb"^\s*--- (PASS|FAIL|SKIP): (\S+)", re.MULTILINE)
+
+
+def go_run_filter(test_name: str) -> str:
+    """Exact -run filter for a test, or for an `A|B` group run in one invocation.
+
+    Comparison tests each build their own chain from genesis, so grouping is
+    only correct for tests the list author knows can share one Nethermind.
+    """
+    names = test_name.split("|")
+    if len(names) == 1:
+        return f"^{re.escape(test_name)}$"
+    return "^(" + "|".join(re.escape(name) for name in names) + ")$"
+
+
+def prune_go_test_cache(keep: int = GO_TEST_CACHE_KEEP):
+    """Delete all but the `keep` most recently used system_tests binaries."""
+    entries = sorted(
+        (p for p in GO_TEST_CACHE_DIR.iterdir() if p.is_dir()),
+        key=lambda p: p.stat().st_mtime, reverse=True,
+    )
+    for stale in entries[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def prepare_test_inputs(tests: list[str]):
+    """Derive accounts and render chainspecs for every test ahead of time.
+
+    Everything lands in the in-memory/on-disk caches, so it can overlap with
+    the dotnet build.
+    """
+    # One batch for every test, so a long list's cache misses share a process pool
+    compute_test_addresses((name for test in tests for name in account_names_for_test(test)),
+                           processes=os.cpu_count() or 1)
+    for test_name in tests:
+        get_cached_chainspec(get_test_accounts(test_name))
+
+
+# =============================================================================
+# Genesis snapshots: reuse a post-genesis DB instead of rebuilding per test
+# =============================================================================
+
+# One system_tests binary per Nitro checkout per run, built by the first worker that needs it
+_go_binaries: dict[str, Path | None] = {}
+_go_binary_lock = threading.Lock()
+
+# Serializes priming of the same snapshot across --jobs workers
+_snapshot_locks: dict[str, threading.Lock] = {}
+_snapshot_locks_guard = threading.Lock()
+
+
+def genesis_snapshot_key(chainspec_path: Path, build_dir: Path = BUILD_OUTPUT_DIR) -> str:
+    """Key a genesis snapshot by chainspec content and the built Nethermind binaries.
+
+    Genesis is built from the chainspec at startup, so two tests with the same
+    chainspec share a post-genesis DB. Binary stats are included so a rebuild
+    never reuses a DB written by older genesis code.
+    """
+    digest = hashlib.sha256(chainspec_path.read_bytes())
+    binaries = [build_dir / "nethermind.dll", *sorted(build_dir.glob("**/Nethermind.Arbitrum*.dll"))]
+    for binary in binaries:
+        if binary.exists():
+            st = binary.stat()
+            digest.update(f"{binary.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def clone_db_tree(src: Path, dst: Path):
+    """Copy a Nethermind DB tree, hardlinking RocksDB's immutable *.sst files.
+
+    Everything else (MANIFEST, CURRENT, WAL, OPTIONS) is mutated in place by
+    RocksDB and must be copied. Falls back to a copy when hardlinks are not
+    possible (e.g. across filesystems).
+    """
+    for root, _dirs, files in os.walk(src):
+        target_dir = dst / Path(root).relative_to(src)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            source = Path(root) / name
+            target = target_dir / name
+            if name.endswith(".sst"):
+                try:
+                    os.link(source, target)
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(source, target)
+
+
+def _snapshot_lock(key: str) -> threading.Lock:
+    with _snapshot_locks_guard:
+        return _snapshot_locks.setdefault(key, threading.Lock())
+
+
+# =============================================================================
+# Test runner: one Nethermind instance and the Go tests run against it
+# =============================================================================
+
+class TestRunner:
+    """Orchestrates test execution with Nethermind lifecycle management."""
+
+    # Shared by all workers writing to the same runner.log
+    _log_lock = threading.Lock()
+
+    def __init__(self, args: argparse.Namespace, state: RunnerState, runner_log: TextIO,
+                 slot: InstanceSlot | None = None):
+        self.args = args
+        self.state = state
+        self.runner_log = runner_log
+        self.slot = slot or make_slot(0, args.nethermind_port)
+        # Keep-alive connection to this slot's Nethermind, reopened after restarts
+        self.rpc = RpcClient(self.rpc_url)
+        self.nethermind_proc: subprocess.Popen | None = None
+        self.nethermind_log_path: Path | None = None
+        self.nethermind_stream: LogStream | None = None
+        self.test_stream: LogStream | None = None
+        # Set by the Nethermind log stream when an "RPC started" line goes by
+        self.rpc_started = threading.Event()
+        self.sampler: ResourceSampler | None = None
+        self.profiler: Profiler | None = None
+        # Block processing reports seen in the current Nethermind's output
+        self.block_log: BlockLogParser | None = None
+        self.startup_error = ""
+        # Seconds until `go test` printed its first "=== RUN" (compile + link)
+        self.go_start = 0.0
+        self.go_build_s: float | None = None
+        # Go test process while run_test runs it, so a --pipeline signal handler can stop it
+        self.go_proc: subprocess.Popen | None = None
+        self.test_start = 0.0
+        # Outcomes of the last run_test, by Go test name
+        self.subtests: dict[str, str] = {}
+        self.env = self._build_env()
+
+    def _build_env(self) -> dict:
+        env = os.environ.copy()
+        env["NETHERMIND_EL_HOST"] = self.args.nethermind_host
+        env["NETHERMIND_EL_PORT"] = str(self.slot.port)
+        if self.args.nitro_path:
+            env["NITRO_PATH"] = self.args.nitro_path
+        return env
+
+    @property
+    def rpc_url(self) -> str:
+        return f"http://{self.args.nethermind_host}:{self.slot.port}"
+
+    def _log(self, msg: str):
+        ts = dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        prefix = f"[{self.slot.tag}] " if self.args.jobs > 1 or self.args.pipeline else ""
+        with self._log_lock:
+            self.runner_log.write(f"[{ts}] {prefix}{msg}\n")
+            self.runner_log.flush()
+
+    def build_nethermind(self) -> bool:
+        """Build Nethermind with Arbitrum plugin, unless the last build is up to date."""
+        fingerprint = compute_build_fingerprint()
+        up_to_date = (
+            not self.args.force_build
+            and (BUILD_OUTPUT_DIR / "nethermind.dll").exists()
+            and BUILD_FINGERPRINT_PATH.exists()
+            and BUILD_FINGERPRINT_PATH.read_text().strip() == fingerprint
+        )
+        if up_to_date:
+            self._log(f"Build inputs unchanged (fingerprint {fingerprint[:12]}), skipping build")
+            log("Build up to date, skipping")
+            self.state.build_done = True
+            return True
+
+        cmd = [
+            "dotnet", "build",
+            str(PLUGIN_PROJECT),
+            "-c", "Debug",
+        ]
+        self._log(f"Building: {' '.join(cmd)}")
+        log("Building Nethermind.Arbitrum (Debug)...")
+
+        proc = subprocess.run(
+            cmd, cwd=str(ROOT_DIR),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        self.runner_log.write(proc.stdout or "")
+        self.runner_log.flush()
+
+        if proc.returncode != 0:
+            self._log(f"Build failed with exit code {proc.returncode}")
+            log("Build FAILED", "ERROR")
+            return False
+
+        self._log("Build completed successfully")
+        log("Build completed")
+        self.state.build_done = True
+        with contextlib.suppress(OSError):
+            write_atomic(BUILD_FINGERPRINT_PATH, fingerprint.encode())
+        return True
+
+    def clean_db(self):
+        """Clean Nethermind database."""
+        db_path = self.slot.db_path
+        self._log(f"Cleaning DB: {db_path}")
+        if db_path.exists():
+            shutil.rmtree(db_path, ignore_errors=True)
+
+    def prepare_db(self, genesis_log_path: Path | None) -> bool:
+        """Reset the instance DB before a test.
+
+        Without --reuse-genesis this is a plain clean. With it, the DB is
+        restored from a post-genesis snapshot matching the generated chainspec;
+        the first test for a given genesis boots Nethermind once to create it.
+        """
+        if not self.args.reuse_genesis:
+            self.clean_db()
+            return True
+
+        key = genesis_snapshot_key(self.slot.chainspec_path, self.slot.build_dir)
+        snapshot_path = GENESIS_SNAPSHOT_DIR / key
+        with _snapshot_lock(key):
+            if not snapshot_path.exists() and not self._create_genesis_snapshot(snapshot_path, genesis_log_path):
+                return False
+        self._restore_genesis_snapshot(snapshot_path)
+        return True
+
+    def _restore_genesis_snapshot(self, snapshot_path: Path):
+        self.clean_db()
+        self._log(f"Restoring genesis snapshot {snapshot_path.name} into {self.slot.db_path}")
+        clone_db_tree(snapshot_path, self.slot.db_path)
+
+    def _create_genesis_snapshot(self, snapshot_path: Path, log_path: Path | None) -> bool:
+        """Boot Nethermind on an empty DB, stop it cleanly and keep the result."""
+        self._begin_genesis_snapshot(snapshot_path)
+        self.start_nethermind(log_path)
+        ready = self.wait_for_ready()
+        clean_exit = self.stop_nethermind()
+        return self._publish_genesis_snapshot(snapshot_path, ready and clean_exit)
+
+    def _begin_genesis_snapshot(self, snapshot_path: Path):
+        self._log(f"Creating genesis snapshot {snapshot_path.name}")
+        log(f"Creating genesis snapshot {snapshot_path.name}...")
+        self.clean_db()
+
+    def _publish_genesis_snapshot(self, snapshot_path: Path, booted_cleanly: bool) -> bool:
+        """Keep the DB of a genesis-only boot as `snapshot_path`."""
+        if not booted_cleanly:
+            self._log("Genesis snapshot not created: Nethermind did not start or stop cleanly")
+            return False
+        if not self.slot.db_path.exists():
+            self._log(f"Genesis snapshot not created: {self.slot.db_path} missing after boot")
+            return False
+
+        # Build aside and rename so a crashed run never leaves a partial snapshot
+        tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp-{os.getpid()}-{self.slot.tag}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        clone_db_tree(self.slot.db_path, tmp_path)
+        try:
+            tmp_path.rename(snapshot_path)
+        except OSError:
+            # Another runner published the same snapshot first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return True
+
+    def generate_config(self, test_name: str, test_dir: Path) -> bool:
+        """Generate Nethermind config for a specific test.
+
+        Same output as generate-system-test-config.sh, rendered in-process and
+        served from a content-addressed cache keyed by accounts and ArbOS
+        parameters.
+        """
+        accounts_path = test_dir / "accounts.json"
+        generate_accounts_json(test_name, accounts_path)
+        self._log(f"Generated accounts for {test_name}: {accounts_path}")
+
+        try:
+            accounts = get_test_accounts(test_name)
+            key, chainspec = get_cached_chainspec(accounts)
+            write_if_changed(self.slot.chainspec_path, chainspec)
+            write_if_changed(self.slot.config_path, render_node_config(self.slot.config_name))
+        except (OSError, ValueError, RuntimeError) as e:
+            self._log(f"Config generation failed: {e}")
+            return False
+
+        self._log(f"Config generated from chainspec {key}: {self.slot.chainspec_path}")
+        return True
+
+    def nethermind_command(self) -> list[str]:
+        port = self.slot.port
+        return [
+            "dotnet", "nethermind.dll",
+            "-c", self.slot.config_name,
+            "--data-dir", str(self.slot.data_dir),
+            "--JsonRpc.UnsecureDevNoRpcAuthentication=true",
+            f"--JsonRpc.Port={port}",
+            f"--JsonRpc.EnginePort={port}",
+            f"--JsonRpc.AdditionalRpcUrls=http://localhost:{port}|http|nitroexecution",
+            f"--Network.P2PPort={self.slot.p2p_port}",
+            f"--Network.DiscoveryPort={self.slot.p2p_port}",
+            f"--Init.LogFileName={self.slot.config_name}.log",
+            "--log", "debug",
+        ]
+
+    def _nethermind_log_stream(self, log_path: Path | None) -> LogStream:
+        """Log stream for Nethermind output that spots "RPC started" and collects block reports."""
+        block_log = self.block_log = BlockLogParser()
+
+        def on_chunk(chunk: bytes):
+            if RPC_STARTED_MARKER.search(chunk):
+                self.rpc_started.set()
+            block_log.feed(chunk)
+
+        self.nethermind_stream = LogStream(
+            log_path, self.args.log_compression, self.args.log_noise,
+            self.args.log_tail_lines, on_chunk,
+        )
+        self.nethermind_log_path = self.nethermind_stream.path
+        return self.nethermind_stream
+
+    def start_nethermind(self, log_path: Path | None) -> bool:
+        """Start Nethermind process."""
+        cmd = self.nethermind_command()
+        self._log(f"Starting Nethermind: {' '.join(cmd)}")
+
+        self.slot.data_dir.mkdir(parents=True, exist_ok=True)
+        self.rpc_started.clear()
+        if self.args.keep_nethermind:
+            # Nethermind outlives the runner, so it cannot write into a pipe we drain
+            self.nethermind_stream = None
+            self.nethermind_log_path = log_path
+            log_file = log_path.open("wb") if log_path else subprocess.DEVNULL
+            self.nethermind_proc = subprocess.Popen(
+                cmd, cwd=str(self.slot.build_dir),
+                stdout=log_file, stderr=subprocess.STDOUT,
+                env=self.env, preexec_fn=os.setsid,
+            )
+            return True
+
+        stream = self._nethermind_log_stream(log_path)
+        self.nethermind_proc = subprocess.Popen(
+            cmd, cwd=str(self.slot.build_dir),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            env=self.env, preexec_fn=os.setsid,
+        )
+        stream.start(self.nethermind_proc.stdout)
+        return True
+
+    def nethermind_alive(self) -> bool:
+        return self.nethermind_proc is not None and self.nethermind_proc.poll() is None
+
+    def wait_for_ready(self) -> bool:
+        """Wait until the nitroexecution RPC of the started Nethermind answers.
+
+        An open port is not enough, so readiness is a successful JSON-RPC probe.
+        Probes back off exponentially from a few milliseconds; an "RPC started"
+        line in the Nethermind output wakes the wait and resets the backoff so
+        the probe fires right when the endpoint comes up. Fails fast if
+        Nethermind exits.
+        """
+        timeout_s = self.args.timeout
+        self.startup_error = ""
+
+        self._log(f"Waiting for Nethermind RPC on {self.rpc_url} (timeout {timeout_s}s)")
+        deadline = time.monotonic() + timeout_s
+        backoff = READY_PROBE_MIN_S
+        last_error = ""
+
+        while time.monotonic() < deadline:
+            if self.state.interrupted:
+                return False
+            if self.nethermind_proc and not self.nethermind_alive():
+                self.startup_error = f"Nethermind exited during startup (code {self.nethermind_proc.returncode})"
+                self._log(self.startup_error)
+                return False
+
+            try:
+                self.rpc.call(READY_PROBE_METHOD, timeout=1.0)
+                self._log("Nethermind RPC is available")
+                return True
+            except (OSError, ValueError, http.client.HTTPException, RpcError) as e:
+                last_error = str(e)
+
+            if self.rpc_started.wait(min(backoff, max(0.0, deadline - time.monotonic()))):
+                self.rpc_started.clear()
+                backoff = READY_PROBE_MIN_S
+            else:
+                backoff = min(backoff * 2, READY_PROBE_MAX_S)
+
+        self._log(f"Timed out waiting for Nethermind on {self.rpc_url} (last probe error: {last_error})")
+        return False
+
+    def ensure_go_test_binary(self, nitro_path: Path, test_env: dict) -> Path | None:
+        """Return a cached `go test -c` build of system_tests, building it if needed.
+
+        Binaries are cached under GO_TEST_CACHE_DIR keyed by the Nitro commit,
+        its dirty files and the Go toolchain. Returns None if the build fails,
+        in which case callers fall back to `go test`.
+        """
+        with _go_binary_lock:
+            memo_key = str(nitro_path)
+            if memo_key in _go_binaries:
+                return _go_binaries[memo_key]
+
+            key = compute_nitro_fingerprint(nitro_path, test_env)
+            binary = GO_TEST_CACHE_DIR / key / "system_tests.test"
+            if binary.exists():
+                self._log(f"Reusing system_tests binary {binary}")
+                os.utime(binary.parent)
+            else:
+                binary.parent.mkdir(parents=True, exist_ok=True)
+                tmp_binary = binary.with_name(f"{binary.name}.tmp-{os.getpid()}")
+                cmd = ["go", "test", "-c", "-o", str(tmp_binary), "./system_tests"]
+                self._log(f"Building system_tests binary: {' '.join(cmd)}")
+                log("Compiling Nitro system_tests binary...")
+                proc = subprocess.run(
+                    cmd, cwd=str(nitro_path), env=test_env,
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                )
+                with self._log_lock:
+                    self.runner_log.write(proc.stdout or "")
+                    self.runner_log.flush()
+                if proc.returncode != 0 or not tmp_binary.exists():
+                    self._log(f"system_tests build failed with exit code {proc.returncode}; using go test")
+                    tmp_binary.unlink(missing_ok=True)
+                    _go_binaries[memo_key] = None
+                    return None
+                tmp_binary.replace(binary)
+                prune_go_test_cache()
+            _go_binaries[memo_key] = binary
+            return binary
+
+    def go_test_command(self, test_name: str) -> tuple[list[str], str, dict] | None:
+        """Command, working directory and environment for a test; None if NITRO_PATH is missing."""
+        nitro_path, test_env = self._go_test_env()
+        if not Path(nitro_path).exists():
+            return None
+        binary = None if self.args.no_go_cache else self.ensure_go_test_binary(Path(nitro_path), test_env)
+        return self._go_test_invocation(test_name, nitro_path, test_env, binary)
+
+    def _go_test_env(self) -> tuple[str, dict]:
+        nitro_path = self.env.get("NITRO_PATH") or os.environ.get("NITRO_PATH") or str(DEFAULT_NITRO_PATH)
+        test_env = self.env.copy()
+        test_env["NITRO_EXECUTION_MODE"] = "comparison"
+        test_env["NITRO_SECONDARY_EL_URL"] = self.rpc_url
+        test_env["CGO_LDFLAGS"] = "-Wl,-no_warn_duplicate_libraries"
+        return nitro_path, test_env
+
+    def _go_test_invocation(self, test_name: str, nitro_path: str, test_env: dict,
+                            binary: Path | None) -> tuple[list[str], str, dict]:
+        run_filter = go_run_filter(test_name)
+        if binary:
+            # `go test` runs test binaries from the package directory
+            cwd = str(Path(nitro_path) / "system_tests")
+            cmd = [
+                str(binary),
+                "-test.run", run_filter,
+                "-test.v", "-test.parallel=1", "-test.timeout", "5m",
+                "-test.count=1",
+            ]
+        else:
+            cwd = nitro_path
+            cmd = [
+                "go", "test", "./system_tests",
+                "-run", run_filter,
+                "-v", "-parallel=1", "-timeout", "5m",
+                "-count=1",
+            ]
+        self._log(f"Running test {test_name}: {' '.join(cmd)}")
+        return cmd, cwd, test_env
+
+    def _go_test_stream(self, log_path: Path | None, go_start: float) -> LogStream:
+        """Log stream for Go output that also records build time and subtest outcomes."""
+        self.go_build_s = None
+        self.subtests = {}
+
+        def on_chunk(chunk: bytes):
+            if self.go_build_s is None and (chunk.startswith(b"=== RUN") or b"\n=== RUN" in chunk):
+                self.go_build_s = time.monotonic() - go_start
+            for outcome in GO_TEST_OUTCOME.finditer(chunk):
+                self.subtests[outcome.group(2).decode()] = outcome.group(1).decode().lower()
+
+        self.test_stream = LogStream(
+            log_path, self.args.log_compression, self.args.go_log_noise,
+            self.args.log_tail_lines, on_chunk,
+        )
+        return self.test_stream
+
+    def run_test(self, test_name: str, log_path: Path | None) -> tuple[int, str]:
+        """Run a single test (or an `A|B` group sharing one invocation)."""
+        self.go_start = go_start = time.monotonic()
+        command = self.go_test_command(test_name)
+        if not command:
+            return 1, "NITRO_PATH not found"
+        cmd, cwd, test_env = command
+
+        stream = self._go_test_stream(log_path, go_start)
+        try:
+            self.go_proc = proc = subprocess.Popen(
+                cmd, cwd=cwd,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                env=test_env,
+            )
+            assert proc.stdout is not None
+            fd = proc.stdout.fileno()
+            while data := os.read(fd, LOG_READ_CHUNK):
+                if self.state.interrupted:
+                    proc.terminate()
+                    proc.stdout.close()
+                    return -1, "interrupted"
+                stream.feed(data)
+
+            proc.stdout.close()
+            exit_code = proc.wait()
+        finally:
+            self.go_proc = None
+            stream.close()
+
+        if stream.suppressed:
+            self._log(f"Suppressed {stream.suppressed} noisy lines from output")
+
+        return exit_code, ""
+
+    def stop_nethermind(self, grace_s: int = 10) -> bool:
+        """Stop Nethermind gracefully. Returns False if it had to be killed."""
+        try:
+            return self._stop_nethermind_process(grace_s)
+        finally:
+            self.rpc.close()
+            if self.nethermind_stream:
+                self.nethermind_stream.join()
+
+    def _stop_nethermind_process(self, grace_s: int) -> bool:
+        if not self.nethermind_alive():
+            return True
+
+        self._log("Stopping Nethermind (SIGTERM)")
+        try:
+            os.killpg(self.nethermind_proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            # Process already exited, nothing to do
+            return True
+
+        try:
+            self.nethermind_proc.wait(timeout=grace_s)
+            return True
+        except subprocess.TimeoutExpired:
+            pass
+
+        self._log("Nethermind did not exit in time; sending SIGKILL")
+        try:
+            os.killpg(self.nethermind_proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            # Process already exited, nothing to do
+            pass
+        return False
+
+    def execute(self, result: TestResult, log_dir: Path | None):
+        """Run one test end to end on this runner's instance and fill in `result`."""
+        try:
+            test_dir = self.prepare(result, log_dir)
+            if test_dir:
+                exit_code, error_msg = self.run_test(result.name, self._test_log_path(test_dir, log_dir))
+                self._record_go_result(result, exit_code, error_msg)
+        finally:
+            self._finish(result)
+
+    def prepare(self, result: TestResult, log_dir: Path | None) -> Path | None:
+        """Everything before the Go test: test dir, config, DB reset and Nethermind boot.
+
+        Returns the test directory once Nethermind is ready. On failure the
+        result is finalized and None is returned; either way the caller owes
+        a `_finish(result)`.
+        """
+        test_dir = self._configure(result, log_dir)
+        if not test_dir or not self._boot_nethermind(result, test_dir if log_dir else None, self.test_start):
+            return None
+        return test_dir
+
+    def _configure(self, result: TestResult, log_dir: Path | None) -> Path | None:
+        """Start `result`, create its test dir and generate the config; None (result finalized) on failure."""
+        test_name = result.name
+        self.state.current_test = test_name
+        self.state.current_start = self.test_start = time.time()
+        result.status = TestStatus.RUNNING
+
+        log_test_status(test_name, TestStatus.RUNNING)
+
+        # Per-test directory
+        if log_dir:
+            test_dir = log_dir / (test_name.replace("|", "+") + (f".attempt{result.attempt}" if result.attempt > 1 else ""))
+            test_dir.mkdir(exist_ok=True)
+            result.log_dir = test_dir
+        else:
+            test_dir = Path("/tmp") / f"nm-nitro-compare-{self.slot.tag}"
+            test_dir.mkdir(exist_ok=True)
+            result.log_dir = None
+
+        self.nethermind_stream = self.test_stream = None
+        # Generate config and reset DB
+        with phase_timer(result.phases, "config"):
+            config_ok = self.generate_config(test_name, test_dir)
+        if not config_ok:
+            result.status = TestStatus.FAILED
+            result.error_msg = "Config generation failed"
+            result.duration_s = time.time() - self.test_start
+            log_test_status(test_name, result.status, result.duration_s, result.error_msg)
+            return None
+        return test_dir
+
+    @staticmethod
+    def _test_log_path(test_dir: Path, log_dir: Path | None) -> Path | None:
+        return test_dir / "nitro-test.log" if log_dir else None
+
+    def _record_go_result(self, result: TestResult, exit_code: int, error_msg: str):
+        """Fill in `result` from a finished Go test run."""
+        go_total = time.monotonic() - self.go_start
+        result.subtests = dict(self.subtests)
+        go_build = go_total if self.go_build_s is None else self.go_build_s
+        result.phases["go_build"] = go_build
+        result.phases["go_test"] = go_total - go_build
+        result.duration_s = time.time() - self.test_start
+        result.exit_code = exit_code
+
+        if self.state.interrupted:
+            result.status = TestStatus.SKIPPED
+        elif exit_code == 0:
+            result.status = TestStatus.PASSED
+        else:
+            result.status = TestStatus.FAILED
+            result.error_msg = error_msg
+
+        log_test_status(result.name, result.status, result.duration_s, result.error_msg)
+
+    def _boot_nethermind(self, result: TestResult, test_dir: Path | None, start: float) -> bool:
+        """Reset the DB, start Nethermind and wait for its RPC.
+
+        On failure, finalizes `result` and returns False. Logs go to `test_dir`
+        when given.
+        """
+        nethermind_log_path, genesis_log_path = self._boot_log_paths(test_dir)
+        with phase_timer(result.phases, "db_reset"):
+            db_ok = self.prepare_db(genesis_log_path)
+        if not db_ok:
+            self._db_reset_failed(result, start)
+            return False
+
+        with phase_timer(result.phases, "nethermind_start"):
+            self.start_nethermind(nethermind_log_path)
+        self._start_sampler(test_dir)
+
+        with phase_timer(result.phases, "ready_wait"):
+            ready = self.wait_for_ready()
+        if not ready:
+            self._startup_failed(result, start)
+            self.stop_nethermind()
+            return False
+        self._start_profiler(test_dir)
+        return True
+
+    @staticmethod
+    def _boot_log_paths(test_dir: Path | None) -> tuple[Path | None, Path | None]:
+        if not test_dir:
+            return None, None
+        return test_dir / "nethermind.log", test_dir / "nethermind-genesis.log"
+
+    def _db_reset_failed(self, result: TestResult, start: float):
+        if self.state.interrupted:
+            result.status = TestStatus.SKIPPED
+        else:
+            result.status = TestStatus.FAILED
+            result.error_msg = "Genesis snapshot creation failed"
+        result.duration_s = time.time() - start
+        log_test_status(result.name, result.status, result.duration_s, result.error_msg)
+
+    def _startup_failed(self, result: TestResult, start: float):
+        if self.state.interrupted:
+            result.status = TestStatus.SKIPPED
+        elif self.startup_error:
+            result.status = TestStatus.FAILED
+            result.error_msg = self.startup_error
+        else:
+            result.status = TestStatus.TIMEOUT
+            result.error_msg = "Nethermind startup timeout"
+        result.duration_s = time.time() - start
+        log_test_status(result.name, result.status, result.duration_s, result.error_msg)
+
+    def _start_sampler(self, test_dir: Path | None):
+        interval = self.args.sample_interval
+        if interval <= 0 or not self.nethermind_proc or not ResourceSampler.available():
+            return
+        series_path = test_dir / "resources.csv" if test_dir else None
+        self.sampler = ResourceSampler(self.nethermind_proc.pid, self.slot.db_path, interval, series_path)
+        self.sampler.start()
+
+    def _start_profiler(self, test_dir: Path | None):
+        kind = self.args.profile
+        if not kind or not test_dir or not self.nethermind_proc:
+            return
+        tool = resolve_profile_tool(kind)
+        if not tool:
+            self._log(f"--profile {kind}: {PROFILE_TOOLS[kind]} not found "
+                      f"(dotnet tool install -g {PROFILE_TOOLS[kind]})")
+            return
+        profiler = Profiler(kind, tool, self.nethermind_proc.pid, test_dir, self.args.profile_overhead, self._log)
+        if profiler.start():
+            self.profiler = profiler
+
+    def _finish(self, result: TestResult):
+        """Common end of a test: collect samples, stop Nethermind and keep failure context."""
+        self._collect_diagnostics(result)
+        if not self.args.keep_nethermind:
+            with phase_timer(result.phases, "teardown"):
+                self.stop_nethermind()
+            self._write_block_metrics(result.log_dir)
+        self._keep_failure_context(result)
+
+    def _collect_diagnostics(self, result: TestResult):
+        """Stop the profiler and sampler, and inspect a failure while Nethermind is still up."""
+        if self.profiler:
+            result.profile = self.profiler.stop()
+            self.profiler = None
+        if result.status == TestStatus.FAILED:
+            self._diagnose_failure(result)
+        if self.sampler:
+            result.resources = self.sampler.stop()
+            self.sampler = None
+
+    def _diagnose_failure(self, result: TestResult):
+        """Hook for subclasses to inspect a failed test's live Nethermind.
+
+        The comparison gate has nothing to add: the Go test process that held
+        the reference chain has exited, and Nitro already logged the mismatch.
+        ReplayRunner locates the divergence against --reference-rpc.
+        """
+
+    def _keep_failure_context(self, result: TestResult):
+        if result.status in (TestStatus.FAILED, TestStatus.TIMEOUT):
+            result.log_tail = self.collect_log_tails()
+        self.state.current_test = ""
+
+    def _write_block_metrics(self, test_dir: Path | None):
+        """Store the block reports of the stopped Nethermind as BLOCK_METRICS_FILE in `test_dir`."""
+        block_log, self.block_log = self.block_log, None
+        if not test_dir or not block_log or not len(block_log):
+            return
+        try:
+            write_block_metrics(test_dir / BLOCK_METRICS_FILE, block_log.columns)
+        except OSError as e:
+            self._log(f"Could not write {BLOCK_METRICS_FILE}: {e}")
+
+    def collect_log_tails(self) -> dict[str, list[str]]:
+        """Last lines of the Go test and Nethermind output of the current test."""
+        tails = {}
+        for name, stream in (("nitro-test", self.test_stream), ("nethermind", self.nethermind_stream)):
+            if stream and stream.tail:
+                tails[name] = stream.tail_lines()
+        return tails
+
+
+# =============================================================================
+# Retries and run loops: sequential, --jobs and --pipeline
+# =============================================================================
+
+def should_retry(result: TestResult, args: argparse.Namespace) -> bool:
+    if result.attempt > args.retries:
+        return False
+    if args.retry_on == "timeout":
+        return result.status == TestStatus.TIMEOUT
+    return result.status in (TestStatus.FAILED, TestStatus.TIMEOUT)
+
+
+def execute_with_retries(runner: TestRunner, result: TestResult, args: argparse.Namespace, log_dir: Path | None):
+    """Run a test, then retry or quarantine it, see settle_result."""
+    runner.execute(result, log_dir)
+    settle_result(runner, result, args, log_dir)
+
+
+def settle_result(runner: TestRunner, result: TestResult, args: argparse.Namespace, log_dir: Path | None):
+    """Rerun a finished test on the same (already built) runner per --retries/--retry-on.
+
+    A retry is a cold restart: the Go system test creates its chain from
+    genesis, so it cannot resume against the Nethermind instance the failed
+    attempt left behind. Each retry gets a fresh DB and a new Nethermind boot,
+    and the time that costs is logged and kept in `metrics`.
+
+    `result` ends up describing the last attempt; earlier ones move to
+    `result.attempts`. A test that still fails is quarantined instead of
+    failing the run when its historical flake rate reaches
+    --quarantine-threshold.
+    """
+    while should_retry(result, args) and not (runner.state.interrupted or runner.state.stop_requested):
+        retry = next_attempt(result, args)
+        runner.execute(retry, log_dir)
+        adopt_retry(result, retry)
+    quarantine_if_flaky(result, args)
+
+
+def next_attempt(result: TestResult, args: argparse.Namespace) -> TestResult:
+    """Fresh result for the next attempt at `result`, carrying its earlier attempts."""
+    log(f"Retrying {result.name} (attempt {result.attempt + 1}/{args.retries + 1}) after {result.status.value}")
+    return TestResult(name=result.name, attempt=result.attempt + 1, flake_rate=result.flake_rate,
+                      attempts=[*result.attempts, result.attempt_record()])
+
+
+def adopt_retry(result: TestResult, retry: TestResult):
+    """Make `result` describe the finished `retry`, logging what its cold restart cost."""
+    restart_s = retry.duration_s - retry.phases.get("go_test", 0.0)
+    retry.metrics["retry_restart_s"] = result.metrics.get("retry_restart_s", 0.0) + restart_s
+    log(f"Retry of {result.name} spent {restart_s:.1f}s on a cold restart (DB reset, Nethermind boot, teardown)")
+    for f in fields(TestResult):
+        setattr(result, f.name, getattr(retry, f.name))
+
+
+def quarantine_if_flaky(result: TestResult, args: argparse.Namespace):
+    threshold = args.quarantine_threshold
+    if (threshold is not None and result.flake_rate is not None and result.flake_rate >= threshold
+            and result.status in (TestStatus.FAILED, TestStatus.TIMEOUT)):
+        result.quarantined = True
+        log(f"Quarantined {result.name}: flake rate {result.flake_rate:.0%} >= {threshold:.0%}")
+
+
+def run_sequential(runner: TestRunner, state: RunnerState, args: argparse.Namespace, log_dir: Path | None):
+    """Run all tests one after another on a single Nethermind instance."""
+    for i, result in enumerate(state.results):
+        if state.interrupted:
+            result.status = TestStatus.SKIPPED
+            log_test_status(result.name, result.status)
+            continue
+
+        execute_with_retries(runner, result, args, log_dir)
+
+        # Fail fast check
+        if args.fail_fast and result.status == TestStatus.FAILED and not result.quarantined:
+            log("Stopping due to --fail-fast")
+            for remaining in state.results[i + 1:]:
+                remaining.status = TestStatus.SKIPPED
+            break
+
+
+def run_parallel(runners: list[TestRunner], state: RunnerState, args: argparse.Namespace, log_dir: Path | None):
+    """Schedule tests across several isolated Nethermind+go test pairs.
+
+    Each runner owns its own port, data dir and config name, so workers never
+    share state. Tests are pulled from a common queue in list order.
+    """
+    pending: queue.Queue[TestResult] = queue.Queue()
+    for result in state.results:
+        pending.put(result)
+
+    def worker(runner: TestRunner):
+        while True:
+            try:
+                result = pending.get_nowait()
+            except queue.Empty:
+                return
+            if state.interrupted or state.stop_requested:
+                result.status = TestStatus.SKIPPED
+                log_test_status(result.name, result.status)
+                continue
+
+            execute_with_retries(runner, result, args, log_dir)
+
+            if (args.fail_fast and result.status == TestStatus.FAILED and not result.quarantined
+                    and not state.stop_requested):
+                log("Stopping due to --fail-fast (waiting for running tests)")
+                state.stop_requested = True
+
+    threads = [
+        threading.Thread(target=worker, args=(runner,), name=f"worker-{runner.slot.tag}", daemon=True)
+        for runner in runners
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        # Join with a timeout so the main thread keeps servicing signals
+        while thread.is_alive():
+            thread.join(timeout=0.5)
+
+
+def run_pipelined(runners: list[TestRunner], state: RunnerState, args: argparse.Namespace, log_dir: Path | None):
+    """Run tests one at a time while the next test is prepared on a second instance.
+
+    The two runners alternate: while test N's Go process runs against one
+    Nethermind, test N+1's config, DB reset and Nethermind boot happen on the
+    other, and test N-1's teardown finishes in the background. The event loop
+    only schedules: each step is the blocking TestRunner method run through
+    asyncio.to_thread. A retry is queued as the next pipeline item, so each
+    instance only ever serves one test at a time.
+    """
+    def on_signal(sig, frame):
+        # Runs on the loop's thread as soon as the signal lands, so a Go test it stops
+        # is recorded as interrupted; loop.add_signal_handler callbacks can come later
+        state.interrupted = True
+        for runner in runners:
+            proc = runner.go_proc
+            if proc and proc.poll() is None:
+                proc.terminate()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    try:
+        asyncio.run(_run_pipelined(runners, state, args, log_dir))
+    finally:
+        install_signal_handlers(state)
+
+
+async def _run_pipelined(runners: list[TestRunner], state: RunnerState, args: argparse.Namespace,
+                         log_dir: Path | None):
+    # Attempts still to run, each with the result it reports into
+    pending: deque[tuple[TestResult, TestResult]] = deque((result, result) for result in state.results)
+    next_runner = itertools.cycle(runners)
+    # Teardown of each runner's last test; its next preparation waits for it
+    finishing: dict[int, asyncio.Task] = {}
+    # Teardown of the latest attempt per result, so attempts are adopted in order
+    settling: dict[int, asyncio.Task] = {}
+    teardowns: list[asyncio.Task] = []
+
+    async def prepare(runner: TestRunner, attempt: TestResult) -> Path | None:
+        if runner.slot.index in finishing:
+            await finishing.pop(runner.slot.index)
+        return await asyncio.to_thread(runner.prepare, attempt, log_dir)
+
+    async def finish(runner: TestRunner, attempt: TestResult, result: TestResult, earlier: asyncio.Task | None):
+        await asyncio.to_thread(runner._finish, attempt)
+        if earlier:
+            await earlier
+        if attempt is not result:
+            adopt_retry(result, attempt)
+
+    def start_next() -> tuple[TestRunner, TestResult, TestResult, asyncio.Task] | None:
+        if not pending or state.interrupted or state.stop_requested:
+            return None
+        attempt, result = pending.popleft()
+        runner = next(next_runner)
+        return runner, attempt, result, asyncio.create_task(prepare(runner, attempt))
+
+    def schedule_finish(runner: TestRunner, attempt: TestResult, result: TestResult):
+        task = asyncio.create_task(finish(runner, attempt, result, settling.get(id(result))))
+        finishing[runner.slot.index] = settling[id(result)] = task
+        teardowns.append(task)
+
+    preparing = start_next()
+    try:
+        while preparing:
+            runner, attempt, result, task = preparing
+            test_dir = await task
+            preparing = start_next()
+
+            retry = None
+            try:
+                if test_dir and state.interrupted:
+                    attempt.status = TestStatus.SKIPPED
+                    log_test_status(attempt.name, attempt.status)
+                elif test_dir:
+                    test_log_path = runner._test_log_path(test_dir, log_dir)
+                    exit_code, error_msg = await asyncio.to_thread(runner.run_test, attempt.name, test_log_path)
+                    runner._record_go_result(attempt, exit_code, error_msg)
+            finally:
+                if should_retry(attempt, args) and not (state.interrupted or state.stop_requested):
+                    retry = next_attempt(attempt, args)
+                    pending.appendleft((retry, result))
+                else:
+                    quarantine_if_flaky(attempt, args)
+                schedule_finish(runner, attempt, result)
+
+            if (args.fail_fast and not retry and attempt.status == TestStatus.FAILED and not attempt.quarantined
+                    and not state.stop_requested):
+                log("Stopping due to --fail-fast")
+                state.stop_requested = True
+            if state.interrupted or state.stop_requested:
+                break
+            if preparing is None:
+                preparing = start_next()
+    finally:
+        skipped = None
+        if preparing:
+            # The next test is already booting: let it come up, then stop it unrun
+            runner, skipped, _, task = preparing
+            await asyncio.wait([task])
+            if skipped.status == TestStatus.RUNNING:
+                skipped.status = TestStatus.SKIPPED
+            teardowns.append(asyncio.create_task(asyncio.to_thread(runner._finish, skipped)))
+        if teardowns:
+            # Every Nethermind is stopped before any teardown error propagates
+            done, _ = await asyncio.wait(teardowns)
+            for task in done:
+                task.result()
+        if skipped and skipped.status == TestStatus.SKIPPED and skipped.attempt == 1:
+            log_test_status(skipped.name, skipped.status)
+        for remaining in state.results:
+            if remaining.status == TestStatus.PENDING:
+                remaining.status = TestStatus.SKIPPED
+                log_test_status(remaining.name, remaining.status)
+
+
+# =============================================================================
+# Command line options of the subcommands that boot Nethermind
+# =============================================================================
+
+def add_node_arguments(parser: argparse.ArgumentParser):
+    """Options shared by every mode that boots Nethermind through TestRunner."""
+    parser.add_argument("--nethermind-host", default=DEFAULT_HOST, help="Nethermind RPC host")
+    parser.add_argument("--nethermind-port", type=int, default=DEFAULT_PORT, help="Nethermind RPC port")
+    parser.add_argument("--timeout", type=int, default=120, help="Nethermind startup timeout (seconds)")
+    parser.add_argument("--keep-nethermind", action="store_true", help="Leave Nethermind running after tests")
+    parser.add_argument("--no-logs", action="store_true", help="Disable file logging")
+    parser.add_argument("--reuse-genesis", action="store_true",
+                        help="Boot once per distinct genesis and restore tests from a hardlinked "
+                             f"post-genesis DB snapshot (cached in {GENESIS_SNAPSHOT_DIR})")
+    parser.add_argument("--force-build", action="store_true",
+                        help="Always run dotnet build, even if the build inputs fingerprint matches")
+    parser.add_argument("--log-compression", choices=["none", "auto", "zstd", "gzip"], default="none",
+                        help="Per-test log compression, adding .zst/.gz to the log names; auto picks zstd "
+                             "if installed, else gzip (default: none)")
+    parser.add_argument("--log-tail-lines", type=int, default=DEFAULT_LOG_TAIL_LINES,
+                        help=f"Output lines per stream kept for failed tests in summary.json "
+                             f"(default: {DEFAULT_LOG_TAIL_LINES})")
+    parser.add_argument("--log-filter", action="append", default=[], metavar="REGEX",
+                        help="Drop output lines matching REGEX from per-test logs (repeatable)")
+    parser.add_argument("--sample-interval", type=float, default=DEFAULT_SAMPLE_INTERVAL_S,
+                        help="Seconds between CPU/RSS/threads/FDs/DB size samples of Nethermind, written "
+                             "to resources.csv per test (default: 0, no sampling)")
+    parser.add_argument("--profile", choices=sorted(PROFILE_TOOLS),
+                        help="Attach dotnet-counters or dotnet-trace to Nethermind for each test; "
+                             "output is stored in the test's log directory")
+    parser.add_argument("--profile-overhead", type=float, default=DEFAULT_PROFILE_OVERHEAD_PCT, metavar="PCT",
+                        help="Stop profiling a test once the tool's CPU time exceeds PCT%% of Nethermind's; "
+                             f"0 disables the budget (default: {DEFAULT_PROFILE_OVERHEAD_PCT:g})")
+    # Go-side settings TestRunner reads; modes without Go tests keep these defaults
+    parser.set_defaults(jobs=1, pipeline=False, nitro_path="", no_go_cache=False)
+    # Only replay takes --reference-rpc: system tests keep their chain inside the Go process,
+    # so there is no second node that could serve the same chain
+    parser.set_defaults(reference_rpc=None)
+
+
+def resolve_node_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """Validate and precompile the options added by add_node_arguments."""
+    try:
+        args.log_compression = resolve_log_compression(args.log_compression)
+        args.log_noise = compile_noise_filter(args.log_filter)
+        args.go_log_noise = compile_noise_filter(GO_LOG_NOISE + args.log_filter)
+    except (RuntimeError, re.error) as e:
+        parser.error(str(e))
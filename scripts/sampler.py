@@ -0,0 +1,181 @@
+"""
+Resource sampling for --sample-interval: CPU, RSS, I/O and DB size of the
+Nethermind process group, polled from /proc (or psutil) on a background
+thread while a test runs.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+import contextlib
+
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+# =============================================================================
+# Resource sampling
+# =============================================================================
+
+# Resource sampling of the Nethermind process group; off unless --sample-interval is given,
+# since walking the DB tree for its size adds I/O to the run being measured
+DEFAULT_SAMPLE_INTERVAL_S = 0.0
+RESOURCE_SERIES_COLUMNS = ("t_s", "cpu_s", "rss_mb", "threads", "fds", "db_mb")
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _dir_size(root: Path) -> int:
+    """Total size of the regular files below `root`; 0 if it does not exist."""
+    total = 0
+    stack = [str(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                with contextlib.suppress(OSError):
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def _sample_group_procfs(pgid: int) -> tuple[float, int, int, int]:
+    """(CPU seconds, RSS bytes, threads, open FDs) summed over a process group, from /proc."""
+    cpu = rss = threads = fds = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                # The command name may contain spaces; fields after it are fixed
+                fields = f.read().rsplit(b")", 1)[1].split()
+            if int(fields[2]) != pgid:
+                continue
+            cpu += int(fields[11]) + int(fields[12])
+            threads += int(fields[17])
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                rss += int(f.read().split()[1]) * _PAGE_SIZE
+            fds += len(os.listdir(f"/proc/{pid}/fd"))
+        except (OSError, IndexError, ValueError):
+            # Process exited between listing and reading
+            continue
+    return cpu / _CLOCK_TICKS, rss, threads, fds
+
+
+def _sample_group_psutil(pid: int) -> tuple[float, int, int, int]:
+    """Same as _sample_group_procfs, via psutil (root process and its descendants)."""
+    cpu = 0.0
+    rss = threads = fds = 0
+    try:
+        root = psutil.Process(pid)
+        processes = [root, *root.children(recursive=True)]
+    except psutil.Error:
+        return cpu, rss, threads, fds
+    for process in processes:
+        try:
+            with process.oneshot():
+                times = process.cpu_times()
+                cpu += times.user + times.system
+                rss += process.memory_info().rss
+                threads += process.num_threads()
+                if hasattr(process, "num_fds"):
+                    fds += process.num_fds()
+        except psutil.Error:
+            continue
+    return cpu, rss, threads, fds
+
+
+def group_cpu_seconds(pgid: int) -> float:
+    """CPU seconds used so far by a process group."""
+    sample = _sample_group_psutil if PSUTIL_AVAILABLE else _sample_group_procfs
+    return sample(pgid)[0]
+
+
+class ResourceSampler:
+    """Samples the Nethermind process group and its DB size on a background thread.
+
+    Each sample is appended to a CSV time series as it is taken, so memory use
+    does not grow with test length; only the peaks are kept.
+    """
+
+    def __init__(self, pid: int, db_path: Path, interval_s: float, series_path: Path | None):
+        self.pid = pid
+        self.db_path = db_path
+        self.interval_s = interval_s
+        self.series_path = series_path
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start = time.monotonic()
+        self._samples = 0
+        self._cpu_start: float | None = None
+        self._cpu_last = 0.0
+        self._db_start = 0
+        self._db_last = 0
+        self._peaks = {"rss_mb": 0.0, "threads": 0, "fds": 0, "db_mb": 0.0}
+
+    @staticmethod
+    def available() -> bool:
+        return PSUTIL_AVAILABLE or Path("/proc/self/stat").exists()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"sampler-{self.pid}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict[str, float]:
+        """Stop sampling and return the peaks for summary.json."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval_s + 5)
+        if not self._samples:
+            return {}
+        return {
+            "samples": self._samples,
+            "peak_rss_mb": round(self._peaks["rss_mb"], 1),
+            "peak_threads": self._peaks["threads"],
+            "peak_fds": self._peaks["fds"],
+            "cpu_s": round(self._cpu_last - (self._cpu_start or 0.0), 2),
+            "peak_db_mb": round(self._peaks["db_mb"], 1),
+            "db_growth_mb": round((self._db_last - self._db_start) / 2**20, 1),
+        }
+
+    def _sample(self) -> tuple[float, int, int, int]:
+        if PSUTIL_AVAILABLE:
+            return _sample_group_psutil(self.pid)
+        return _sample_group_procfs(self.pid)
+
+    def _run(self):
+        with contextlib.ExitStack() as stack:
+            series = None
+            if self.series_path:
+                series = stack.enter_context(self.series_path.open("w", encoding="utf-8", buffering=1))
+                series.write(",".join(RESOURCE_SERIES_COLUMNS) + "\n")
+            while True:
+                cpu, rss, threads, fds = self._sample()
+                db_size = _dir_size(self.db_path)
+                if self._cpu_start is None:
+                    self._cpu_start, self._db_start = cpu, db_size
+                self._cpu_last, self._db_last = cpu, db_size
+                self._samples += 1
+
+                rss_mb, db_mb = rss / 2**20, db_size / 2**20
+                for key, value in (("rss_mb", rss_mb), ("threads", threads), ("fds", fds), ("db_mb", db_mb)):
+                    self._peaks[key] = max(self._peaks[key], value)
+                if series:
+                    series.write(f"{time.monotonic() - self._start:.2f},{cpu:.2f},{rss_mb:.1f},"
+                                 f"{threads},{fds},{db_mb:.1f}\n")
+
+                if self._stop.wait(self.interval_s):
+                    break
@@ -0,0 +1,58 @@
+import os
+
+import ab
+
+FAST = [1.0, 1.1, 0.9, 1.05, 0.95]
+SLOW = [2.0, 2.1, 1.9, 2.05, 1.95]
+
+
+def test_permutation_p_value_separates_distinct_samples():
+    assert ab.permutation_p_value(FAST, SLOW) < 0.05
+
+
+def test_permutation_p_value_of_equal_samples_is_high():
+    assert ab.permutation_p_value(FAST, list(reversed(FAST))) > 0.5
+
+
+def test_permutation_p_value_is_reproducible():
+    assert ab.permutation_p_value(FAST, SLOW, permutations=500) == ab.permutation_p_value(FAST, SLOW, permutations=500)
+
+
+def test_permutation_p_value_needs_two_runs_per_side():
+    assert ab.permutation_p_value([1.0], SLOW) == 1.0
+
+
+def test_compare_ab_flags_significant_regressions_by_metric_direction():
+    samples = {
+        "w": {
+            "duration_s": {"a": FAST, "b": SLOW},
+            "phase.digest": {"a": SLOW, "b": FAST},
+            "messages_per_s": {"a": SLOW, "b": FAST},
+        },
+    }
+
+    rows, regressions = ab.compare_ab(samples, alpha=0.05, max_regression_pct=10.0)
+
+    assert [row["metric"] for row in rows] == ["duration_s", "phase.digest", "messages_per_s"]
+    assert all(row["significant"] for row in rows)
+    assert [r.split(":")[0] for r in regressions] == ["w duration_s", "w messages_per_s"]
+
+
+def test_prune_ab_worktrees_keeps_the_most_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(ab, "AB_WORKTREE_DIR", tmp_path / "ab-worktrees")
+    # Not a git repo, so the git worktree calls fail and the directories are removed directly
+    monkeypatch.setattr(ab, "ROOT_DIR", tmp_path)
+    for age, name in enumerate(["newest", "newer", "older", "oldest"]):
+        worktree = ab.AB_WORKTREE_DIR / name
+        (worktree / "build").mkdir(parents=True)
+        os.utime(worktree, (1_000_000 - age, 1_000_000 - age))
+
+    ab.prune_ab_worktrees(keep=2)
+
+    assert sorted(p.name for p in ab.AB_WORKTREE_DIR.iterdir()) == ["newer", "newest"]
+
+
+def test_prune_ab_worktrees_without_worktrees_is_a_no_op(tmp_path, monkeypatch):
+    monkeypatch.setattr(ab, "AB_WORKTREE_DIR", tmp_path / "missing")
+
+    ab.prune_ab_worktrees()
@@ -0,0 +1,90 @@
+import gzip
+import os
+
+import blocks
+
+# What ArbitrumProcessingStats logs, colours included, with unrelated debug output around it
+LOG = (
+    b"18 Oct 13:00:00 | Received new block\n"
+    b"18 Oct 13:00:00 | Processed          1234         | \x1b[92m      25.3\x1b[37m ms  | elapsed 1 ms\n"
+    b"18 Oct 13:00:00 |  Block        \x1b[93m   1.23\x1b[37m MGas    |        5   txs"
+    b" | \xf0\x9f\xa6\x80 stylus   2 (x)\n"
+    b"18 Oct 13:00:01 | Processed          1235...  1239 |    1,020.5 ms  | elapsed 2 ms\n"
+    b"18 Oct 13:00:01 |  Blocks  x5           2.00 MGas    |    1,007   txs\n"
+)
+ROWS = {
+    "first": [1234, 1235], "last": [1234, 1239], "processing_ms": [25.3, 1020.5], "mgas": [1.23, 2.0],
+    "txs": [5, 1007], "stylus_calls": [2, 0],
+}
+
+
+def as_lists(columns) -> dict[str, list]:
+    return {name: list(values) for name, values in columns.items()}
+
+
+def test_block_log_parser_reads_single_and_multi_block_reports():
+    parser = blocks.BlockLogParser()
+    parser.feed(LOG)
+
+    assert len(parser) == 2
+    assert as_lists(parser.columns) == ROWS
+
+
+def test_block_log_parser_pairs_lines_fed_in_separate_chunks():
+    parser = blocks.BlockLogParser()
+    for line in LOG.splitlines(keepends=True):
+        parser.feed(line)
+
+    assert as_lists(parser.columns) == ROWS
+
+
+def test_block_log_parser_ignores_block_line_without_processed_line():
+    parser = blocks.BlockLogParser()
+    parser.feed(b" Block   1.00 MGas | 1 txs\n")
+
+    assert len(parser) == 0
+
+
+def test_block_metrics_file_round_trips(tmp_path):
+    parser = blocks.BlockLogParser()
+    parser.feed(LOG)
+    path = tmp_path / blocks.BLOCK_METRICS_FILE
+
+    blocks.write_block_metrics(path, parser.columns)
+
+    assert path.read_bytes().startswith(blocks.BLOCK_METRICS_MAGIC)
+    assert as_lists(blocks.read_block_metrics(path)) == ROWS
+
+
+def test_load_block_metrics_indexes_plain_log_of_older_runs(tmp_path):
+    (tmp_path / "nethermind.log").write_bytes(LOG)
+
+    assert as_lists(blocks.load_block_metrics(tmp_path)) == ROWS
+    assert (tmp_path / blocks.BLOCK_METRICS_FILE).exists()
+
+
+def test_load_block_metrics_reindexes_when_log_is_newer(tmp_path):
+    log_path = tmp_path / "nethermind.log.gz"
+    with gzip.open(log_path, "wb") as f:
+        f.write(LOG)
+    index = tmp_path / blocks.BLOCK_METRICS_FILE
+    blocks.write_block_metrics(index, blocks.BlockLogParser().columns)
+    os.utime(index, (0, 0))
+
+    assert as_lists(blocks.load_block_metrics(tmp_path)) == ROWS
+
+
+def test_load_block_metrics_without_log_or_index(tmp_path):
+    assert blocks.load_block_metrics(tmp_path) is None
+
+
+def test_summary_and_throughput_curve():
+    parser = blocks.BlockLogParser()
+    parser.feed(LOG)
+
+    summary = blocks.summarize_block_metrics(parser.columns)
+    curve = blocks.block_throughput_curve(parser.columns, bucket=1000)
+
+    assert (summary["reports"], summary["blocks"], summary["txs"]) == (2, 6, 1012)
+    assert summary["max_ms"] == 1020.5
+    assert curve == {1000: (1.23 + 2.0) / (25.3 + 1020.5) * 1000}
@@ -0,0 +1,252 @@
+import base64
+import gzip
+import json
+
+import pytest
+
+import common
+
+ACCOUNTS = {"0x26E554a8acF9003b83495c7f45F06edCB803d4e3": {"balance": common.DEFAULT_TEST_BALANCE}}
+
+
+def test_make_slot_keeps_the_single_instance_layout_for_worker_zero():
+    slot = common.make_slot(0, 20551)
+
+    assert (slot.port, slot.p2p_port) == (20551, common.DEFAULT_P2P_PORT)
+    assert slot.config_name == common.DEFAULT_CONFIG_NAME
+    assert slot.data_dir == common.DEFAULT_DATA_DIR
+
+
+def test_make_slot_gives_each_worker_its_own_port_dir_and_config():
+    slots = [common.make_slot(i, 20551) for i in range(4)]
+
+    for attribute in ("port", "p2p_port", "config_name", "data_dir", "chainspec_path", "config_path"):
+        assert len({getattr(slot, attribute) for slot in slots}) == len(slots), attribute
+    assert [slot.tag for slot in slots] == ["w0", "w1", "w2", "w3"]
+
+
+def test_render_chainspec_fills_in_template():
+    chainspec = json.loads(common.render_chainspec(ACCOUNTS, arbos_version=40, max_code_size="0xc000"))
+
+    assert chainspec["accounts"] == ACCOUNTS
+    assert chainspec["params"]["maxCodeSize"] == "0xc000"
+    mix_hash = chainspec["genesis"]["seal"]["ethereum"]["mixHash"]
+    assert mix_hash == "0x0000000000000000000000000000000000000000000000280000000000000000"
+    arbitrum = chainspec["engine"]["Arbitrum"]
+    assert arbitrum["initialArbOSVersion"] == 40
+    chain_config = json.loads(base64.b64decode(arbitrum["serializedChainConfig"]))
+    assert chain_config["chainId"] == common.SYSTEM_TEST_CHAIN_ID
+    assert chain_config["arbitrum"]["InitialArbOSVersion"] == 40
+
+
+def test_render_chainspec_rejects_decimal_max_code_size():
+    with pytest.raises(ValueError, match="hex"):
+        common.render_chainspec(ACCOUNTS, common.DEFAULT_ARBOS_VERSION, "24576")
+
+
+def test_render_node_config_points_at_generated_chainspec():
+    config = json.loads(common.render_node_config("arbitrum-system-test-w2"))
+
+    assert config["Init"]["ChainSpecPath"] == "chainspec/arbitrum-system-test-w2.json"
+    # Every worker uses the same path relative to its own --data-dir
+    assert config["Init"]["BaseDbPath"] == f"nethermind_db/{common.DEFAULT_CONFIG_NAME}"
+
+
+def test_get_cached_chainspec_renders_once_per_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(common, "CONFIG_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(common, "_chainspec_cache", {})
+
+    key, content = common.get_cached_chainspec(ACCOUNTS)
+    other_key, _ = common.get_cached_chainspec(ACCOUNTS, max_code_size="0xc000")
+
+    assert (tmp_path / f"{key}.json").read_bytes() == content
+    assert other_key != key
+    monkeypatch.setattr(common, "_chainspec_cache", {})
+    assert common.get_cached_chainspec(ACCOUNTS) == (key, content)
+
+
+@pytest.mark.parametrize("compression, name", [("none", "nethermind.log"), ("gzip", "nethermind.log.gz")])
+def test_log_stream_names_file_after_compression(tmp_path, compression, name):
+    stream = common.LogStream(tmp_path / "nethermind.log", compression)
+    stream.feed(b"line\n")
+    stream.close()
+
+    assert stream.path == tmp_path / name
+    assert [p.name for p in tmp_path.iterdir()] == [name]
+
+
+def test_resolve_log_compression_keeps_explicit_choice():
+    assert common.resolve_log_compression("none") == "none"
+    assert common.resolve_log_compression("gzip") == "gzip"
+    assert common.resolve_log_compression("auto") == ("zstd" if common.ZSTD_AVAILABLE else "gzip")
+
+
+def test_log_stream_filters_noise_and_keeps_tail(tmp_path):
+    chunks = []
+    stream = common.LogStream(tmp_path / "go.log", "gzip", noise=common.compile_noise_filter([r"ld: warning"]),
+                              tail_lines=2, on_chunk=chunks.append)
+    stream.feed(b"first\nld: warning: x\nsec")
+    stream.feed(b"ond\nthird\nunterminated")
+    stream.close()
+
+    with gzip.open(stream.path) as f:
+        assert f.read() == b"first\nsecond\nthird\nunterminated\n"
+    assert b"".join(chunks) == b"first\nsecond\nthird\nunterminated\n"
+    assert stream.suppressed == 1
+    assert stream.tail_lines() == ["third", "unterminated"]
+
+
+def test_log_stream_without_path_only_keeps_tail():
+    stream = common.LogStream(None, "gzip", tail_lines=1)
+    stream.feed(b"a\nb\n")
+    stream.close()
+
+    assert stream.path is None
+    assert stream.tail_lines() == ["b"]
+
+
+@pytest.fixture
+def address_cache(tmp_path, monkeypatch):
+    """Fresh on-disk and in-memory account cache; returns the cache file path."""
+    path = tmp_path / "test-accounts.json"
+    monkeypatch.setattr(common, "ACCOUNT_CACHE_PATH", path)
+    monkeypatch.setattr(common, "_address_cache", None)
+    return path
+
+
+def test_compute_test_addresses_derives_misses_and_persists_them(address_cache):
+    addresses = common.compute_test_addresses(["Owner", "User1", "User1"])
+
+    assert list(addresses) == ["Owner", "User1"]
+    assert addresses["Owner"] == common.PRECOMPUTED_ADDRESSES["Owner"]
+    cached = json.loads(address_cache.read_text())["addresses"]
+    assert cached["User1"] == addresses["User1"] == common._derive_test_address("User1")
+
+
+def test_compute_test_addresses_reads_the_cache_without_deriving(address_cache, monkeypatch):
+    address_cache.write_text(json.dumps({"addresses": {"User1": "0xCached"}}))
+
+    def derive(name):
+        raise AssertionError(f"derived {name}")
+
+    monkeypatch.setattr(common, "_derive_test_address", derive)
+
+    assert common.compute_test_addresses(["User1", "Faucet"]) == {
+        "User1": "0xCached", "Faucet": common.PRECOMPUTED_ADDRESSES["Faucet"],
+    }
+
+
+@pytest.mark.parametrize("content", ["{not json", "[]", '{"other": {}}', '{"addresses": ["User1"]}',
+                                     '{"addresses": {"User1": 5}}'])
+def test_compute_test_addresses_ignores_and_rewrites_a_corrupt_cache(address_cache, content):
+    address_cache.write_text(content)
+
+    addresses = common.compute_test_addresses(["User1"])
+
+    assert addresses["User1"] == common._derive_test_address("User1")
+    assert json.loads(address_cache.read_text())["addresses"]["User1"] == addresses["User1"]
+
+
+def test_compute_test_addresses_in_a_process_pool_matches_serial_derivation(address_cache, monkeypatch):
+    monkeypatch.setattr(common, "PARALLEL_DERIVATION_THRESHOLD", 4)
+    names = [f"User{i}" for i in range(8)]
+
+    addresses = common.compute_test_addresses(names, processes=2)
+
+    assert addresses == {name: common._derive_test_address(name) for name in names}
+
+
+def test_build_funded_accounts_strips_the_prefix_and_funds_each_account(address_cache):
+    accounts = common.build_funded_accounts(["Owner", "Faucet"], balance="0x1")
+
+    assert accounts == {
+        address[2:]: {"balance": "0x1"} for address in common.PRECOMPUTED_ADDRESSES.values()
+    }
+
+
+def test_account_names_for_test_merges_a_group_without_duplicates():
+    assert common.account_names_for_test("TestA|TestB") == ["Owner", "Faucet"]
+
+
+def test_prometheus_metrics_count_quarantined_failures_apart_from_failed():
+    state = common.RunnerState(results=[
+        common.TestResult(name="TestA", status=common.TestStatus.FAILED),
+        common.TestResult(name="TestB", status=common.TestStatus.FAILED, quarantined=True),
+        common.TestResult(name="TestC", status=common.TestStatus.TIMEOUT, quarantined=True),
+    ])
+
+    text = common.format_prometheus_metrics(state)
+
+    assert 'nethermind_comparison_tests{status="failed"} 1\n' in text
+    assert 'nethermind_comparison_tests{status="timeout"} 0\n' in text
+    assert 'nethermind_comparison_tests{status="quarantined"} 2\n' in text
+
+
+def test_prometheus_metrics_render_statuses_phases_and_escaped_labels(monkeypatch):
+    monkeypatch.setattr(common.time, "time", lambda: 1_700_000_000.4)
+    state = common.RunnerState(phases={"build": 12.5}, results=[
+        common.TestResult(name='TestA|Test"B"', status=common.TestStatus.PASSED, duration_s=3.25,
+                          phases={"go_test": 2.0}),
+        common.TestResult(name="Test\\C\nD", status=common.TestStatus.TIMEOUT, duration_s=120.0),
+        common.TestResult(name="TestSkipped", status=common.TestStatus.SKIPPED),
+        common.TestResult(name="TestPending"),
+    ])
+
+    lines = common.format_prometheus_metrics(state).splitlines()
+    samples = [line for line in lines if not line.startswith("#")]
+
+    assert samples == [
+        'nethermind_comparison_tests{status="passed"} 1',
+        'nethermind_comparison_tests{status="failed"} 0',
+        'nethermind_comparison_tests{status="timeout"} 1',
+        'nethermind_comparison_tests{status="skipped"} 1',
+        'nethermind_comparison_tests{status="quarantined"} 0',
+        'nethermind_comparison_run_phase_seconds{phase="build"} 12.500',
+        r'nethermind_comparison_test_duration_seconds{test="TestA|Test\"B\"",status="passed"} 3.250',
+        r'nethermind_comparison_test_duration_seconds{test="Test\\C\nD",status="timeout"} 120.000',
+        r'nethermind_comparison_test_phase_seconds{test="TestA|Test\"B\"",phase="go_test"} 2.000',
+        "nethermind_comparison_last_run_timestamp_seconds 1700000000",
+    ]
+    # Every metric is declared once, before its samples
+    names = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+    assert names == sorted(set(names), key=names.index)
+    assert all(line.split()[3] == "gauge" for line in lines if line.startswith("# TYPE"))
+
+
+class FakeResponse:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+@pytest.mark.parametrize("shard, path", [
+    ("", f"/metrics/job/{common.PUSHGATEWAY_JOB}"),
+    ("2/4", f"/metrics/job/{common.PUSHGATEWAY_JOB}/shard/2_of_4"),
+])
+def test_push_metrics_replaces_the_job_group_of_each_shard(monkeypatch, shard, path):
+    requests = []
+
+    def urlopen(request, timeout):
+        requests.append(request)
+        return FakeResponse()
+
+    monkeypatch.setattr(common.urllib.request, "urlopen", urlopen)
+    state = common.RunnerState(shard=shard, results=[common.TestResult(name="TestA", status=common.TestStatus.PASSED)])
+
+    assert common.push_metrics("http://pushgateway:9091/", state)
+
+    (request,) = requests
+    assert request.full_url == f"http://pushgateway:9091{path}"
+    assert request.get_method() == "PUT"
+    assert request.data == common.format_prometheus_metrics(state).encode()
+
+
+def test_push_metrics_failure_is_not_fatal(monkeypatch):
+    def urlopen(request, timeout):
+        raise ConnectionRefusedError("connection refused")
+
+    monkeypatch.setattr(common.urllib.request, "urlopen", urlopen)
+
+    assert not common.push_metrics("http://pushgateway:9091", common.RunnerState())
@@ -0,0 +1,83 @@
+import common
+import history as run_history
+
+PASSED, FAILED = common.TestStatus.PASSED, common.TestStatus.FAILED
+
+
+def record_runs(history: run_history.TestHistory, test: str, outcomes: list[str]):
+    """Record one run per outcome; "fp" is a failed attempt that passed on retry."""
+    for i, outcome in enumerate(outcomes):
+        if outcome == "fp":
+            first_attempt = common.TestResult(name=test, status=FAILED).attempt_record()
+            result = common.TestResult(name=test, status=PASSED, attempt=2, attempts=[first_attempt])
+        else:
+            result = common.TestResult(name=test, status=PASSED if outcome == "p" else FAILED)
+        history.record(f"run-{i:03d}", [result])
+
+
+def stats(duration_s: float, last_status: common.TestStatus = PASSED) -> run_history.TestHistoryStats:
+    return run_history.TestHistoryStats(expected_duration_s=duration_s, last_status=last_status.value, runs=1)
+
+
+def test_flake_rate_counts_flips_between_single_attempt_runs(tmp_path):
+    history = run_history.TestHistory(tmp_path / "history.db")
+    record_runs(history, "TestFlaky", ["p", "f", "p", "p", "f"])
+    record_runs(history, "TestStable", ["p"] * 5)
+    record_runs(history, "TestBroken", ["f"] * 5)
+
+    rates = history.flake_rates(["TestFlaky", "TestStable", "TestBroken"])
+
+    assert rates["TestFlaky"] == 3 / 4
+    assert rates["TestStable"] == 0.0
+    assert rates["TestBroken"] == 0.0
+
+
+def test_flake_rate_counts_runs_that_passed_on_retry(tmp_path):
+    history = run_history.TestHistory(tmp_path / "history.db")
+    record_runs(history, "TestRetried", ["p", "fp", "p", "p", "p"])
+
+    assert history.flake_rates(["TestRetried"])["TestRetried"] == 1 / 4
+
+
+def test_flake_rate_needs_min_runs(tmp_path):
+    history = run_history.TestHistory(tmp_path / "history.db")
+    record_runs(history, "TestNew", ["p", "f"] * 2)
+
+    assert run_history.FLAKE_MIN_RUNS > 4
+    assert history.flake_rates(["TestNew", "TestUnknown"]) == {}
+
+
+def test_stats_keeps_latest_status_and_median_duration(tmp_path):
+    history = run_history.TestHistory(tmp_path / "history.db")
+    for run_id, (status, duration_s) in enumerate([(PASSED, 10.0), (PASSED, 30.0), (FAILED, 20.0)]):
+        history.record(str(run_id), [common.TestResult(name="TestA", status=status, duration_s=duration_s)])
+    history.record("skipped", [common.TestResult(name="TestA", status=common.TestStatus.SKIPPED)])
+
+    result = history.stats(["TestA", "TestUnknown"])
+
+    assert result == {"TestA": run_history.TestHistoryStats(expected_duration_s=20.0, last_status="failed", runs=3)}
+
+
+def test_order_by_history_puts_last_failures_first_then_longest():
+    tests = ["TestShort", "TestLong", "TestFailed", "TestMedium"]
+    history_stats = {
+        "TestShort": stats(1.0),
+        "TestLong": stats(60.0),
+        "TestFailed": stats(5.0, FAILED),
+        "TestMedium": stats(10.0),
+    }
+
+    assert run_history.order_by_history(tests, history_stats) == ["TestFailed", "TestLong", "TestMedium", "TestShort"]
+
+
+def test_order_by_history_estimates_unknown_tests_at_mean_and_keeps_file_order_on_ties():
+    tests = ["TestNewA", "TestSlow", "TestFast", "TestNewB"]
+    history_stats = {"TestSlow": stats(30.0), "TestFast": stats(10.0)}
+
+    assert run_history.order_by_history(tests, history_stats) == ["TestSlow", "TestNewA", "TestNewB", "TestFast"]
+
+
+def test_order_by_history_without_history_keeps_file_order():
+    tests = ["TestB", "TestA", "TestC"]
+
+    assert run_history.order_by_history(tests, {}) == tests
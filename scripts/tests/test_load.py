@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import random
+import time
+
+import pytest
+
+import load
+from nitro_rpc import RpcError
+
+
+def test_parse_read_mix_drops_zero_weights_and_defaults_to_one():
+    assert load.parse_read_mix("eth_call=2, eth_getBalance, headMessageIndex=0") == {
+        "eth_call": 2.0, "eth_getBalance": 1.0,
+    }
+
+
+@pytest.mark.parametrize("value", ["eth_sendRawTransaction=1", "eth_call=x", "eth_call=0"])
+def test_parse_read_mix_rejects_unknown_kinds_bad_weights_and_empty_mixes(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        load.parse_read_mix(value)
+
+
+@pytest.mark.parametrize("kind", load.READ_LOAD_KINDS)
+def test_read_call_only_asks_for_messages_up_to_the_head(kind):
+    rng = random.Random(0)
+
+    for _ in range(50):
+        method, params = load.read_call(kind, 3, rng)
+        if method in ("nitroexecution_resultAtMessageIndex", "arbitrum_messageIndexToBlockNumber"):
+            assert 0 <= params[0] <= 3
+
+
+def test_read_load_summary_buckets_latencies_and_rates_per_kind():
+    read_load = load.ReadLoad("http://127.0.0.1:1", {"eth_call": 1, "eth_getBalance": 1}, rate=100, workers=4)
+    read_load.latencies = {"eth_call": [0.0005, 0.003, 0.004, 2.0], "eth_getBalance": [0.001]}
+    read_load.errors = {"eth_call": 1, "eth_getBalance": 0}
+    read_load.elapsed_s = 2.0
+
+    summary = read_load.summary()
+
+    eth_call = summary["kinds"]["eth_call"]
+    assert eth_call["histogram"] == [1, 0, 2, 0, 0, 0, 0, 0, 0, 0, 1]
+    assert (eth_call["reads"], eth_call["per_s"], eth_call["errors"]) == (4, 2.0, 1)
+    assert (eth_call["p50_ms"], eth_call["max_ms"]) == (3.5, 2000.0)
+    assert summary["total"]["histogram"] == [2, 0, 2, 0, 0, 0, 0, 0, 0, 0, 1]
+    assert (summary["total"]["reads"], summary["total"]["errors"]) == (5, 1)
+    assert read_load.metrics()["reads_p50_ms"] == 3.0
+
+
+@pytest.mark.parametrize("baseline, loaded, expected", [
+    ({"mean_ms": 4.0}, {"mean_ms": 5.0}, 25.0),
+    ({"mean_ms": 3.0}, {"mean_ms": 2.9}, -3.3),
+    ({"mean_ms": 0.0}, {"mean_ms": 5.0}, None),
+    (None, {"mean_ms": 5.0}, None),
+    ({"mean_ms": 4.0}, None, None),
+])
+def test_digest_slowdown_pct_compares_mean_digest_latency(baseline, loaded, expected):
+    assert load.digest_slowdown_pct(baseline, loaded) == expected
+
+
+class FakeAsyncRpcClient:
+    """Answers every read after yielding to the loop; eth_getBalance fails."""
+
+    def __init__(self, url, max_connections):
+        self.calls = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def head_message_index(self):
+        return "0x5"
+
+    async def call(self, method, params=None):
+        await asyncio.sleep(0)
+        if method == "eth_getBalance":
+            raise RpcError(method, {"code": -32000, "message": "unavailable"})
+        return "0x1"
+
+
+def test_read_load_issues_the_mix_and_counts_failed_reads_as_errors(monkeypatch):
+    monkeypatch.setattr(load, "AsyncRpcClient", FakeAsyncRpcClient)
+
+    with load.ReadLoad("http://127.0.0.1:1", {"eth_call": 1, "eth_getBalance": 1}, rate=0, workers=2) as read_load:
+        time.sleep(0.1)
+
+    assert read_load.latencies["eth_call"] and not read_load.latencies["eth_getBalance"]
+    assert read_load.errors["eth_getBalance"] > 0
+    assert read_load.errors["eth_call"] == 0
+    assert read_load.elapsed_s > 0
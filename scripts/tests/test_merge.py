@@ -0,0 +1,100 @@
+import argparse
+import json
+
+import pytest
+
+import common
+import merge
+
+TESTS = [f"Test{i:02d}" for i in range(20)]
+
+
+def write_shard(path, shard: str, results: list[common.TestResult], total_s: float = 1.0):
+    state = common.RunnerState(results=results, phases={"build": 1.0, "total": total_s}, shard=shard)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    common.write_summary_json(state, path)
+    return path
+
+
+def passed(name: str) -> common.TestResult:
+    return common.TestResult(name=name, status=common.TestStatus.PASSED, duration_s=1.0)
+
+
+def failed(name: str, quarantined: bool = False) -> common.TestResult:
+    return common.TestResult(name=name, status=common.TestStatus.FAILED, quarantined=quarantined,
+                             flake_rate=0.5 if quarantined else None)
+
+
+@pytest.mark.parametrize("durations", [{}, {t: float(i % 7) for i, t in enumerate(TESTS[:12])}])
+def test_shard_tests_partitions_list_in_file_order(durations):
+    shards = [merge.shard_tests(TESTS, i, 3, durations) for i in (1, 2, 3)]
+
+    assert sorted(t for shard in shards for t in shard) == TESTS
+    assert all(shard == [t for t in TESTS if t in shard] for shard in shards)
+    assert shards == [merge.shard_tests(list(TESTS), i, 3, dict(durations)) for i in (1, 2, 3)]
+
+
+def test_shard_tests_balances_by_duration_longest_first():
+    durations = {"TestA": 10.0, "TestB": 6.0, "TestC": 5.0, "TestD": 1.0}
+    tests = ["TestD", "TestC", "TestB", "TestA"]
+
+    assert merge.shard_tests(tests, 1, 2, durations) == ["TestD", "TestA"]
+    assert merge.shard_tests(tests, 2, 2, durations) == ["TestC", "TestB"]
+
+
+@pytest.mark.parametrize("value", ["0/2", "3/2", "1", "a/b"])
+def test_parse_shard_rejects_invalid_values(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        merge.parse_shard(value)
+
+
+def test_result_from_summary_round_trips_attempts(tmp_path):
+    retried = passed("TestRetried")
+    retried.attempts = [failed("TestRetried").attempt_record()]
+    retried.attempt = 2
+    path = write_shard(tmp_path / "summary.json", "", [retried])
+
+    entry = json.loads(path.read_text())["tests"][0]
+    result = merge.result_from_summary(entry)
+
+    assert (result.status, result.attempt, result.flaky) == (common.TestStatus.PASSED, 2, True)
+    assert result.attempts == retried.attempts
+
+
+def test_merge_main_combines_shards(tmp_path, capsys):
+    first = write_shard(tmp_path / "1" / "summary.json", "1/2", [passed("TestA"), failed("TestB", quarantined=True)],
+                        total_s=5.0)
+    second = write_shard(tmp_path / "2" / "summary.json", "2/2", [passed("TestC")], total_s=3.0)
+    test_file = tmp_path / "tests.txt"
+    test_file.write_text("TestA\nTestB\nTestC\n")
+    output = tmp_path / "merged.json"
+
+    exit_code = merge.merge_main([str(first), str(second.parent), "--test-file", str(test_file),
+                                  "--output", str(output)])
+
+    merged = json.loads(output.read_text())
+    assert exit_code == 0
+    assert [t["name"] for t in merged["tests"]] == ["TestA", "TestB", "TestC"]
+    assert merged["phases"] == {"build": 2.0, "total": 5.0}
+    assert merged["quarantined"] == ["TestB"]
+    assert merged["errors"] == []
+
+
+@pytest.mark.parametrize("shards, error", [
+    ([("1/3", ["TestA"]), ("2/3", ["TestB"])], "Missing shard(s): 3/3"),
+    ([("1/2", ["TestA"]), ("2/2", ["TestA"])], "TestA ran in both"),
+    ([("1/2", ["TestA"]), ("2/3", ["TestB"])], "different shard counts"),
+])
+def test_merge_main_fails_on_inconsistent_shards(tmp_path, capsys, shards, error):
+    paths = [str(write_shard(tmp_path / str(i) / "summary.json", shard, [passed(t) for t in tests]))
+             for i, (shard, tests) in enumerate(shards)]
+    output = tmp_path / "merged.json"
+
+    assert merge.merge_main([*paths, "--output", str(output)]) == 1
+    assert any(error in message for message in json.loads(output.read_text())["errors"])
+
+
+def test_merge_main_fails_on_unquarantined_failure(tmp_path, capsys):
+    path = write_shard(tmp_path / "summary.json", "1/1", [failed("TestA")])
+
+    assert merge.merge_main([str(path)]) == 1
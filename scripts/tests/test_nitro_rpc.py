@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import nitro_rpc
+
+CALLS = [("eth_blockNumber", None), ("eth_chainId", [])]
+
+
+def encode(*responses) -> bytes:
+    return json.dumps(list(responses)).encode()
+
+
+def test_decode_batch_returns_results_in_request_order():
+    body = encode({"id": 2, "result": "0x1"}, {"id": 1, "result": "0x2a"})
+
+    assert nitro_rpc._decode_batch(CALLS, [1, 2], body, return_errors=False) == ["0x2a", "0x1"]
+
+
+def test_decode_batch_raises_first_error():
+    body = encode({"id": 1, "result": "0x2a"}, {"id": 2, "error": {"code": -32601, "message": "not found"}})
+
+    with pytest.raises(nitro_rpc.RpcError, match="eth_chainId") as error:
+        nitro_rpc._decode_batch(CALLS, [1, 2], body, return_errors=False)
+    assert error.value.code == -32601
+
+
+def test_decode_batch_returns_errors_in_place():
+    body = encode({"id": 1, "error": {"code": -32000, "message": "boom"}})
+
+    first, second = nitro_rpc._decode_batch(CALLS, [1, 2], body, return_errors=True)
+
+    assert isinstance(first, nitro_rpc.RpcError) and first.code == -32000
+    assert isinstance(second, nitro_rpc.RpcError) and "missing from batch response" in str(second)
+
+
+def test_decode_batch_raises_when_whole_batch_is_rejected():
+    body = json.dumps({"id": None, "error": {"code": -32600, "message": "invalid request"}}).encode()
+
+    with pytest.raises(nitro_rpc.RpcError, match="batch"):
+        nitro_rpc._decode_batch(CALLS, [1, 2], body, return_errors=True)
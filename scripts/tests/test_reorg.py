@@ -0,0 +1,150 @@
+import argparse
+import io
+import json
+
+import pytest
+
+import common
+import reorg
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class ScriptedProbeClient:
+    """eth_blockNumber answers taking scripted seconds; None fails. Stops the probe when done."""
+
+    def __init__(self, clock: FakeClock, script: list[float | None], probe: reorg.AvailabilityProbe):
+        self.clock = clock
+        self.script = list(script)
+        self.probe = probe
+
+    def call(self, method, params=None, *, timeout=None):
+        latency = self.script.pop(0)
+        self.clock.now += latency if latency is not None else 0.5
+        if not self.script:
+            self.probe._stop.set()
+        if latency is None:
+            raise ConnectionRefusedError("connection refused")
+        return "0x10"
+
+    def close(self):
+        pass
+
+
+def probe_with(script: list[float | None], monkeypatch) -> reorg.AvailabilityProbe:
+    clock = FakeClock()
+    monkeypatch.setattr(reorg.time, "perf_counter", clock.perf_counter)
+    probe = reorg.AvailabilityProbe("http://127.0.0.1:1", interval_s=0)
+    probe.client = ScriptedProbeClient(clock, script, probe)
+    probe._run()
+    return probe
+
+
+def test_availability_probe_counts_failures_and_stalls_as_one_outage_window(monkeypatch):
+    probe = probe_with([0.001, None, 0.3, 0.002, 0.4, 0.001], monkeypatch)
+
+    assert (probe.probes, probe.failures) == (6, 1)
+    assert probe.metrics("reorg_d4") == {
+        "reorg_d4_max_probe_ms": 500.0,
+        "reorg_d4_unavailable_ms": 1200.0,
+        "reorg_d4_longest_outage_ms": 800.0,
+    }
+
+
+def test_availability_probe_of_a_responsive_node_reports_no_outage(monkeypatch):
+    probe = probe_with([0.001, 0.002, reorg.PROBE_STALL_S], monkeypatch)
+
+    assert probe.metrics("m") == {"m_max_probe_ms": 250.0, "m_unavailable_ms": 0.0, "m_longest_outage_ms": 0.0}
+
+
+def test_parse_depths_sorts_and_deduplicates():
+    assert reorg.parse_depths("16, 1,4,4") == [1, 4, 16]
+    with pytest.raises(argparse.ArgumentTypeError):
+        reorg.parse_depths("0,4")
+
+
+def test_default_depths_fit_the_bundled_recordings():
+    shortest = min(sum(1 for line in path.open() if line.strip()) - 1 for path in reorg.resolve_recordings([]))
+
+    assert max(reorg.DEFAULT_REORG_DEPTHS) <= shortest
+
+
+class ChainStub:
+    """Execution RPC of a chain whose block hash at message i is hex(i) (or `redigest_hash` once reorged)."""
+
+    def __init__(self, head: int, redigest_hash: str | None = None):
+        self.head = head
+        self.redigest_hash = redigest_hash
+        self.reorgs: list[tuple[int, int]] = []
+
+    def head_message_index(self):
+        return self.head
+
+    def batch(self, calls):
+        return [{"blockHash": hex(params[0])} for _, params in calls]
+
+    def reorg(self, first, new_messages, old_messages, timeout=None):
+        self.reorgs.append((first, len(old_messages)))
+
+    def digest_message(self, index, message, prefetch=None, timeout=None):
+        return {"blockHash": self.redigest_hash or hex(index)}
+
+
+class NoProbe:
+    longest_window_s = 0.0
+
+    def __init__(self, url, interval_s):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def metrics(self, prefix):
+        return {f"{prefix}_longest_outage_ms": 0.0}
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(reorg, "AvailabilityProbe", NoProbe)
+    path = tmp_path / "9__test.jsonl"
+    lines = [{"index": 0, "message": "init"}] + [{"index": i, "message": {"n": i}} for i in range(1, 11)]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return path
+
+
+def reorg_runner(rpc: ChainStub) -> reorg.ReorgRunner:
+    args = argparse.Namespace(nethermind_host="127.0.0.1", nethermind_port=20551, nitro_path="", jobs=1,
+                              pipeline=False)
+    runner = reorg.ReorgRunner(args, common.RunnerState(), io.StringIO())
+    runner.rpc = rpc
+    return runner
+
+
+def test_reorg_scenario_skips_depths_beyond_the_digested_messages_and_says_so(recording, capsys):
+    rpc = ChainStub(head=10)
+    result = common.TestResult(name=recording.name)
+
+    error = reorg_runner(rpc).reorg_scenario(result, recording, [1, 4, 16], maintenance=False, probe_interval_s=0)
+
+    assert error == ""
+    assert rpc.reorgs == [(10, 1), (7, 4)]
+    assert {name.split("_")[1] for name in result.metrics} == {"d1", "d4"}
+    assert "skipping reorg depth(s) 16" in capsys.readouterr().out
+
+
+def test_reorg_scenario_fails_when_a_redigested_block_hashes_differently(recording):
+    result = common.TestResult(name=recording.name)
+
+    error = reorg_runner(ChainStub(head=10, redigest_hash="0xbad")).reorg_scenario(
+        result, recording, [4], maintenance=False, probe_interval_s=0)
+
+    assert error == "reorg depth 4: message 7 re-digested to 0xbad, was 0x7"
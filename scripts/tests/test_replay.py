@@ -0,0 +1,110 @@
+import replay
+
+EXPECTED_LOG = """\
+Block 7
+  Header:
+    Hash: 0x{header:064x}
+    Number: 7
+    State Root: 0x{state:064x}
+  Uncles:
+  Transactions:
+    Hash:      0x{tx:064x}
+    From:      0x52eda38e4e9cbcc76047c4ed427db4457e0c0a9b
+  Withdrawals:
+Block 8
+  Header:
+    Hash: 0x{next_header:064x}
+  Transactions:
+"""
+
+
+def test_load_expected_log_keeps_header_hashes_and_state_roots(tmp_path):
+    path = tmp_path / "9__expected.log"
+    path.write_text(EXPECTED_LOG.format(header=1, state=2, tx=3, next_header=4))
+
+    blocks = replay.load_expected_log(path)
+
+    assert blocks == {
+        7: replay.ExpectedBlock(f"0x{1:064x}", f"0x{2:064x}"),
+        8: replay.ExpectedBlock(f"0x{4:064x}"),
+    }
+
+
+def test_load_expected_log_reads_checked_in_dump():
+    blocks = replay.load_expected_log(replay.RECORDINGS_DIR / "1__expected.log")
+
+    assert sorted(blocks) == list(range(19))
+    assert blocks[0].hash == "0xbd9f2163899efb7c39f945c9a7744b2c3ff12cfa00fe573dcb480a436c0803a8"
+    assert blocks[0].state_root == "0xb84a102579f7025e9f5589291127d05dfdd9522766bc0f95591fa925bd8e525a"
+
+
+def test_load_recording_expectations_combines_test_cases_and_expected_log():
+    expectations = replay.load_recording_expectations(replay.RECORDINGS_DIR / "1__arbos32_basefee92.jsonl")
+
+    assert len(expectations.blocks) == 19
+    assert len(expectations.heads) == 1
+
+
+class StubRpc:
+    """Chain of `length` blocks whose hashes change from block `diverges_at` on; counts header lookups."""
+
+    def __init__(self, length: int, diverges_at: int | None = None, tag: str = "ref"):
+        self.length = length
+        self.diverges_at = diverges_at
+        self.tag = tag
+        self.header_calls = 0
+
+    def value(self, number: int, name: str) -> str:
+        forked = self.diverges_at is not None and number >= self.diverges_at
+        return f"{self.tag if forked else 'common'}-{name}"
+
+    def call(self, method, params=None, **kwargs):
+        if method == "eth_blockNumber":
+            return hex(self.length - 1)
+        if method == "eth_getBlockByNumber":
+            self.header_calls += 1
+            number = int(params[0], 16)
+            if number >= self.length:
+                return None
+            return {
+                "hash": self.value(number, str(number)), "number": params[0],
+                "stateRoot": self.value(number, "root"), "gasUsed": "0x5208",
+                "transactions": [f"0x{number:064x}"],
+            }
+        if method == "eth_getBlockReceipts":
+            number = int(params[0], 16)
+            status = "0x0" if self.tag == "cand" and number == self.diverges_at else "0x1"
+            return [{"transactionHash": f"0x{number:064x}", "status": status, "gasUsed": "0x5208"}]
+        if method == "debug_traceBlockByNumber":
+            return [{"txHash": f"0x{int(params[0], 16):064x}", "result": {"post": {"0xabc": {"balance": self.tag}}}}]
+        raise AssertionError(f"unexpected call {method}")
+
+
+def test_find_divergent_block_binary_searches_the_first_differing_hash():
+    reference = StubRpc(1000)
+    candidate = StubRpc(1000, diverges_at=613, tag="cand")
+
+    assert replay.find_divergent_block(reference, candidate) == (613, 999)
+    # Head, genesis and ~log2(1000) probes, each asking both clients
+    assert candidate.header_calls <= 2 + 10
+
+
+def test_find_divergent_block_of_matching_chains_reports_the_common_head():
+    assert replay.find_divergent_block(StubRpc(50), StubRpc(80)) == (None, 49)
+
+
+def test_find_divergent_block_at_genesis():
+    assert replay.find_divergent_block(StubRpc(10), StubRpc(10, diverges_at=0, tag="cand")) == (0, 9)
+
+
+def test_locate_divergence_reports_header_receipt_and_state_differences():
+    report = replay.locate_divergence(StubRpc(20), StubRpc(20, diverges_at=7, tag="cand"))
+
+    assert report["block"] == 7
+    assert report["common_head"] == 19
+    assert (report["reference_hash"], report["candidate_hash"]) == ("common-7", "cand-7")
+    assert report["state_root_match"] is False
+    assert report["header_diff"] == ["stateRoot: common-root != cand-root"]
+    assert report["receipts"] == [{"index": 0, "tx": f"0x{7:064x}", "fields": ["status"]}]
+    assert report["traces"] == [{"index": 0, "tx": f"0x{7:064x}", "diff": ['post.0xabc.balance: "ref" != "cand"']}]
+    assert report["first_tx"] == f"0x{7:064x}"
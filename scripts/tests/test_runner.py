@@ -0,0 +1,437 @@
+import argparse
+import io
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import common
+import runner
+
+PASSED, FAILED, SKIPPED = common.TestStatus.PASSED, common.TestStatus.FAILED, common.TestStatus.SKIPPED
+
+
+def make_args(**overrides) -> argparse.Namespace:
+    """Gate options as run_comparison parses them, without optional features."""
+    args = argparse.Namespace(
+        nethermind_host="127.0.0.1", nethermind_port=20551, nitro_path="", timeout=5, jobs=1, pipeline=False,
+        keep_nethermind=False, retries=0, retry_on="any", quarantine_threshold=None, fail_fast=False,
+        log_compression="none", log_noise=None, log_tail_lines=common.DEFAULT_LOG_TAIL_LINES,
+    )
+    vars(args).update(overrides)
+    return args
+
+
+def make_state(*tests: str, flake_rate: float | None = None) -> common.RunnerState:
+    return common.RunnerState(results=[common.TestResult(name=test, flake_rate=flake_rate) for test in tests])
+
+
+class ScriptedRunner(runner.TestRunner):
+    """TestRunner whose Go tests exit with scripted codes, without starting Nethermind or go.
+
+    `exit_codes` maps each test to the exit codes of its attempts and is
+    shared by every runner of a run; `events` records (step, slot, test).
+    """
+
+    def __init__(self, args, state, index: int, exit_codes: dict[str, list[int]], events: list[tuple]):
+        super().__init__(args, state, io.StringIO(), common.make_slot(index, args.nethermind_port))
+        self.exit_codes = exit_codes
+        self.events = events
+        self.serving = ""
+
+    def prepare(self, result, log_dir):
+        assert not self.serving, f"{self.slot.tag} prepared {result.name} while serving {self.serving}"
+        self.serving = result.name
+        self.events.append(("prepare", self.slot.tag, result.name))
+        self.test_start = time.time()
+        result.status = common.TestStatus.RUNNING
+        return Path(f"/tmp/{result.name}")
+
+    def run_test(self, test_name, log_path):
+        self.go_start = time.monotonic()
+        self.events.append(("run", self.slot.tag, test_name))
+        return self.exit_codes[test_name].pop(0), ""
+
+    def _finish(self, result):
+        self.events.append(("finish", self.slot.tag, result.name))
+        self.serving = ""
+
+
+@pytest.fixture
+def restore_signal_handlers():
+    """The run loops install SIGINT/SIGTERM handlers that would outlive the test."""
+    handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+    yield
+    for sig, handler in handlers.items():
+        signal.signal(sig, handler)
+
+
+def run_pipeline(state, exit_codes, runner_class=ScriptedRunner, **overrides) -> list[tuple]:
+    args = make_args(pipeline=True, **overrides)
+    events: list[tuple] = []
+    runners = [runner_class(args, state, i, exit_codes, events) for i in range(2)]
+    runner.run_pipelined(runners, state, args, None)
+    return events
+
+
+def test_go_run_filter_matches_only_the_named_test():
+    pattern = re.compile(runner.go_run_filter("TestTransfer"))
+
+    assert pattern.search("TestTransfer")
+    assert not pattern.search("TestTransferTo")
+    assert not pattern.search("SubTestTransfer")
+
+
+def test_go_run_filter_runs_a_group_in_one_invocation():
+    pattern = re.compile(runner.go_run_filter("TestA|TestB"))
+
+    assert pattern.search("TestA")
+    assert pattern.search("TestB")
+    assert not pattern.search("TestAB")
+
+
+def test_go_run_filter_escapes_regex_characters():
+    assert runner.go_run_filter("TestX.Y") == r"^TestX\.Y$"
+
+
+def git(repo: Path, *args: str):
+    subprocess.run(["git", "-C", str(repo), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   check=True, capture_output=True)
+
+
+@pytest.fixture
+def nitro_checkout(tmp_path) -> Path:
+    repo = tmp_path / "nitro"
+    (repo / "system_tests").mkdir(parents=True)
+    (repo / "system_tests" / "common_test.go").write_text("package arbtest\n")
+    git(repo, "init", "-q")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "initial")
+    return repo
+
+
+def test_nitro_fingerprint_is_stable_for_an_unchanged_checkout(nitro_checkout):
+    key = common.compute_nitro_fingerprint(nitro_checkout, dict(os.environ))
+
+    assert common.compute_nitro_fingerprint(nitro_checkout, dict(os.environ)) == key
+
+
+def test_nitro_fingerprint_changes_with_commits_edits_untracked_files_and_linker_flags(nitro_checkout):
+    env = dict(os.environ)
+    source = nitro_checkout / "system_tests" / "common_test.go"
+    keys = [common.compute_nitro_fingerprint(nitro_checkout, env)]
+
+    source.write_text("package arbtest\n\nconst x = 1\n")
+    keys.append(common.compute_nitro_fingerprint(nitro_checkout, env))
+    git(nitro_checkout, "commit", "-q", "-am", "edit")
+    keys.append(common.compute_nitro_fingerprint(nitro_checkout, env))
+    (nitro_checkout / "system_tests" / "new_test.go").write_text("package arbtest\n")
+    keys.append(common.compute_nitro_fingerprint(nitro_checkout, env))
+    keys.append(common.compute_nitro_fingerprint(nitro_checkout, {**env, "CGO_LDFLAGS": "-Wl,-no_warn"}))
+
+    assert len(set(keys)) == len(keys)
+
+
+def test_prune_go_test_cache_keeps_the_most_recently_used_binaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "GO_TEST_CACHE_DIR", tmp_path)
+    for age in range(5):
+        entry = tmp_path / f"key{age}"
+        entry.mkdir()
+        (entry / "system_tests.test").write_bytes(b"binary")
+        os.utime(entry, (1_000_000 - age, 1_000_000 - age))
+
+    runner.prune_go_test_cache(keep=3)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["key0", "key1", "key2"]
+
+
+def test_ensure_go_test_binary_reuses_a_cached_binary_without_building(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "GO_TEST_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(runner, "_go_binaries", {})
+    monkeypatch.setattr(runner, "compute_nitro_fingerprint", lambda nitro_path, env: "cafe")
+    binary = tmp_path / "cafe" / "system_tests.test"
+    binary.parent.mkdir()
+    binary.write_bytes(b"binary")
+    os.utime(binary.parent, (1_000_000, 1_000_000))
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("system_tests was rebuilt")
+
+    monkeypatch.setattr(runner.subprocess, "run", no_build)
+    test_runner = runner.TestRunner(make_args(), common.RunnerState(), io.StringIO())
+
+    assert test_runner.ensure_go_test_binary(tmp_path / "nitro", {}) == binary
+    # Marked as recently used, so pruning keeps it
+    assert binary.parent.stat().st_mtime > 1_000_000
+
+
+def test_clone_db_tree_hardlinks_only_immutable_tables(tmp_path):
+    src = tmp_path / "db"
+    (src / "state").mkdir(parents=True)
+    (src / "state" / "000001.sst").write_bytes(b"table")
+    (src / "state" / "MANIFEST-000002").write_bytes(b"manifest")
+
+    runner.clone_db_tree(src, tmp_path / "clone")
+
+    clone = tmp_path / "clone" / "state"
+    assert (clone / "000001.sst").stat().st_ino == (src / "state" / "000001.sst").stat().st_ino
+    assert (clone / "MANIFEST-000002").stat().st_ino != (src / "state" / "MANIFEST-000002").stat().st_ino
+    assert (clone / "MANIFEST-000002").read_bytes() == b"manifest"
+
+
+def test_genesis_snapshot_key_changes_with_chainspec_and_binaries(tmp_path):
+    chainspec = tmp_path / "chainspec.json"
+    chainspec.write_text("{}")
+    build_dir = tmp_path / "build"
+    build_dir.mkdir()
+
+    key = runner.genesis_snapshot_key(chainspec, build_dir)
+    (build_dir / "nethermind.dll").write_bytes(b"dll")
+    rebuilt_key = runner.genesis_snapshot_key(chainspec, build_dir)
+    chainspec.write_text('{"accounts": {}}')
+
+    assert key != rebuilt_key
+    assert runner.genesis_snapshot_key(chainspec, build_dir) not in (key, rebuilt_key)
+
+
+def test_pipeline_prepares_the_next_test_on_the_other_instance_while_one_runs(restore_signal_handlers):
+    next_prepared = threading.Event()
+
+    class OverlapRunner(ScriptedRunner):
+        def prepare(self, result, log_dir):
+            if result.name == "TestB":
+                next_prepared.set()
+            return super().prepare(result, log_dir)
+
+        def run_test(self, test_name, log_path):
+            if test_name == "TestA":
+                assert next_prepared.wait(5), "TestB was not prepared while TestA ran"
+            return super().run_test(test_name, log_path)
+
+    state = make_state("TestA", "TestB", "TestC")
+    events = run_pipeline(state, {"TestA": [0], "TestB": [1], "TestC": [0]}, OverlapRunner)
+
+    assert [r.status for r in state.results] == [PASSED, FAILED, PASSED]
+    assert [(slot, test) for step, slot, test in events if step == "run"] == [
+        ("w0", "TestA"), ("w1", "TestB"), ("w0", "TestC"),
+    ]
+    assert sorted(e[1:] for e in events if e[0] == "prepare") == sorted(e[1:] for e in events if e[0] == "finish")
+
+
+def test_pipeline_queues_a_retry_as_the_next_item(restore_signal_handlers):
+    state = make_state("TestA", "TestB")
+    events = run_pipeline(state, {"TestA": [1, 0], "TestB": [0]}, retries=2)
+
+    test_a, test_b = state.results
+    assert (test_a.status, test_a.attempt, test_a.flaky) == (PASSED, 2, True)
+    assert [a["status"] for a in test_a.attempts] == ["failed"]
+    assert "retry_restart_s" in test_a.metrics
+    assert test_b.status == PASSED
+    assert [test for step, _, test in events if step == "run"] == ["TestA", "TestB", "TestA"]
+
+
+def test_pipeline_fail_fast_stops_the_already_prepared_test_unrun(restore_signal_handlers):
+    state = make_state("TestA", "TestB", "TestC")
+    events = run_pipeline(state, {"TestA": [1], "TestB": [0], "TestC": [0]}, fail_fast=True)
+
+    assert [r.status for r in state.results] == [FAILED, SKIPPED, SKIPPED]
+    assert [test for step, _, test in events if step == "run"] == ["TestA"]
+    assert ("finish", "w1", "TestB") in events
+
+
+@pytest.mark.parametrize("status, retry_on, attempt, expected", [
+    (FAILED, "any", 1, True),
+    (common.TestStatus.TIMEOUT, "any", 1, True),
+    (PASSED, "any", 1, False),
+    (FAILED, "any", 3, False),
+    (FAILED, "timeout", 1, False),
+    (common.TestStatus.TIMEOUT, "timeout", 1, True),
+])
+def test_should_retry_follows_retries_and_retry_on(status, retry_on, attempt, expected):
+    result = common.TestResult(name="TestA", status=status, attempt=attempt)
+
+    assert runner.should_retry(result, make_args(retries=2, retry_on=retry_on)) is expected
+
+
+def settle(exit_codes: list[int], flake_rate: float | None = None, **overrides) -> tuple[common.TestResult, list]:
+    args = make_args(**overrides)
+    state = make_state("TestA", flake_rate=flake_rate)
+    events: list[tuple] = []
+    runner.execute_with_retries(ScriptedRunner(args, state, 0, {"TestA": exit_codes}, events), state.results[0],
+                                args, None)
+    return state.results[0], [e for e in events if e[0] == "run"]
+
+
+def test_retries_a_failing_test_up_to_retries_times():
+    result, runs = settle([1, 1, 1, 0], retries=2)
+
+    assert len(runs) == 3
+    assert (result.status, result.attempt) == (FAILED, 3)
+    assert [a["attempt"] for a in result.attempts] == [1, 2]
+    assert not result.flaky
+
+
+def test_stops_retrying_once_a_test_passes():
+    result, runs = settle([1, 0, 1], retries=3)
+
+    assert len(runs) == 2
+    assert (result.status, result.attempt, result.flaky) == (PASSED, 2, True)
+    assert result.metrics["retry_restart_s"] >= 0
+
+
+def test_retry_on_timeout_does_not_retry_a_failure():
+    result, runs = settle([1, 0], retries=2, retry_on="timeout")
+
+    assert len(runs) == 1
+    assert result.status == FAILED
+
+
+@pytest.mark.parametrize("flake_rate, threshold, exit_codes, quarantined", [
+    (0.5, 0.3, [1], True),
+    (0.3, 0.3, [1], True),
+    (0.1, 0.3, [1], False),
+    (None, 0.3, [1], False),
+    (0.5, None, [1], False),
+    (0.5, 0.3, [0], False),
+])
+def test_quarantines_only_failures_at_or_above_the_threshold(flake_rate, threshold, exit_codes, quarantined):
+    result, _ = settle(exit_codes, flake_rate=flake_rate, quarantine_threshold=threshold)
+
+    assert result.quarantined is quarantined
+
+
+def test_quarantine_applies_to_the_last_attempt():
+    result, runs = settle([1, 1], flake_rate=0.5, retries=1, quarantine_threshold=0.3)
+
+    assert len(runs) == 2
+    assert (result.status, result.quarantined) == (FAILED, True)
+
+
+def run_sequentially(exit_codes: dict[str, list[int]], flake_rate: float | None = None,
+                     **overrides) -> common.RunnerState:
+    args = make_args(**overrides)
+    state = make_state(*exit_codes, flake_rate=flake_rate)
+    runner.run_sequential(ScriptedRunner(args, state, 0, exit_codes, []), state, args, None)
+    return state
+
+
+def test_fail_fast_stops_after_a_failure_that_survives_its_retries():
+    state = run_sequentially({"TestA": [1, 1], "TestB": [0]}, retries=1, fail_fast=True)
+
+    assert [r.status for r in state.results] == [FAILED, SKIPPED]
+
+
+def test_fail_fast_ignores_a_test_that_passed_on_retry():
+    state = run_sequentially({"TestA": [1, 0], "TestB": [0]}, retries=1, fail_fast=True)
+
+    assert [r.status for r in state.results] == [PASSED, PASSED]
+
+
+def test_fail_fast_ignores_quarantined_failures():
+    state = run_sequentially({"TestA": [1], "TestB": [0]}, flake_rate=0.5, quarantine_threshold=0.3,
+                             fail_fast=True)
+
+    assert [(r.status, r.quarantined) for r in state.results] == [(FAILED, True), (PASSED, False)]
+
+
+def test_pipeline_fail_fast_ignores_a_test_that_passed_on_retry(restore_signal_handlers):
+    state = make_state("TestA", "TestB", "TestC")
+    run_pipeline(state, {"TestA": [1, 0], "TestB": [0], "TestC": [0]}, retries=1, fail_fast=True)
+
+    assert [r.status for r in state.results] == [PASSED, PASSED, PASSED]
+
+
+class RecordingEvent(threading.Event):
+    """Event that records each wait's timeout and returns at once instead of sleeping."""
+
+    def __init__(self):
+        super().__init__()
+        self.timeouts: list[float] = []
+
+    def wait(self, timeout=None):
+        self.timeouts.append(round(timeout, 6))
+        return super().wait(0)
+
+
+class StubRpc:
+    """Refuses the readiness probe until `ready_after` calls, running `on_probe` after each refusal."""
+
+    def __init__(self, ready_after: int, on_probe=None):
+        self.ready_after = ready_after
+        self.on_probe = on_probe
+        self.calls = 0
+
+    def call(self, method, params=None, *, timeout=None):
+        assert method == runner.READY_PROBE_METHOD
+        self.calls += 1
+        if self.calls > self.ready_after:
+            return "0x0"
+        if self.on_probe:
+            self.on_probe(self.calls)
+        raise ConnectionRefusedError("connection refused")
+
+
+def ready_runner(rpc: StubRpc, **overrides) -> runner.TestRunner:
+    test_runner = runner.TestRunner(make_args(**overrides), common.RunnerState(), io.StringIO())
+    test_runner.rpc = rpc
+    test_runner.rpc_started = RecordingEvent()
+    return test_runner
+
+
+def test_wait_for_ready_backs_off_exponentially_up_to_the_cap():
+    test_runner = ready_runner(StubRpc(ready_after=10))
+
+    assert test_runner.wait_for_ready()
+    assert test_runner.rpc_started.timeouts == [0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.5, 0.5, 0.5]
+
+
+def test_wait_for_ready_probes_right_away_when_nethermind_logs_rpc_started():
+    test_runner = ready_runner(StubRpc(ready_after=6))
+    stream = test_runner._nethermind_log_stream(None)
+
+    def log_rpc_started(calls: int):
+        if calls == 4:
+            stream.feed(b"2026-10-18 14:00:00|JSON RPC     : http://127.0.0.1:20551 ; http://localhost:20551\n")
+
+    test_runner.rpc.on_probe = log_rpc_started
+
+    assert test_runner.wait_for_ready()
+    # The marker resets the backoff to its minimum
+    assert test_runner.rpc_started.timeouts == [0.005, 0.01, 0.02, 0.04, 0.005, 0.01]
+    stream.close()
+
+
+def test_log_lines_without_the_marker_do_not_wake_the_wait():
+    test_runner = ready_runner(StubRpc(ready_after=0))
+    stream = test_runner._nethermind_log_stream(None)
+    stream.feed(b"Initializing plugins\nLoading chainspec\n")
+    stream.close()
+
+    assert not test_runner.rpc_started.is_set()
+
+
+def test_wait_for_ready_fails_fast_when_nethermind_exits():
+    class ExitedProcess:
+        returncode = 134
+
+        def poll(self):
+            return self.returncode
+
+    test_runner = ready_runner(StubRpc(ready_after=100))
+    test_runner.nethermind_proc = ExitedProcess()
+
+    assert not test_runner.wait_for_ready()
+    assert test_runner.startup_error == "Nethermind exited during startup (code 134)"
+    assert test_runner.rpc.calls == 0
+
+
+def test_wait_for_ready_gives_up_at_the_timeout():
+    test_runner = ready_runner(StubRpc(ready_after=10**9), timeout=0)
+
+    assert not test_runner.wait_for_ready()
+    assert test_runner.startup_error == ""